@@ -0,0 +1,416 @@
+"""Pre-aggregated donation analytics.
+
+``compact`` folds new rows of the ``donations`` ledger into:
+
+- ``donation_rollups``: sum, count and distinct donors per campaign per
+  hour and per day (``donation_rollup_donors`` remembers who was counted);
+- ``campaign_donors``: per campaign and donor totals, for top-donor lists.
+
+Progress is a donation-id watermark in ``rollup_watermarks``. Each chunk
+claims its id range by moving the watermark first, in the same transaction
+as the rollup writes, so every donation is folded in exactly once and a
+second compactor (one runs in every worker) rolls back instead of
+double-counting. A run only folds ids the previous run had already seen:
+on PostgreSQL ids can commit out of order, and the delay gives transactions
+that were open when their ids were handed out time to commit.
+
+The app runs the compactor every ANALYTICS_COMPACT_INTERVAL seconds. By hand:
+
+    python analytics.py compact   # fold in everything committed so far
+    python analytics.py rebuild   # empty the rollups and refold the ledger
+"""
+import argparse
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import bindparam, case, delete, func, insert, select, tuple_, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from archive import donation_source
+from db import AsyncSessionLocal, async_engine, env_flag
+from models import (
+    CampaignDonor,
+    CharityCampaign,
+    Donation,
+    DonationRollup,
+    DonationRollupDonor,
+    RollupWatermark,
+    User,
+)
+
+logger = logging.getLogger("charity.analytics")
+
+ANALYTICS_COMPACTOR = env_flag("ANALYTICS_COMPACTOR", True)
+ANALYTICS_COMPACT_INTERVAL = float(os.getenv("ANALYTICS_COMPACT_INTERVAL", "10"))
+# Donation ids per transaction. Membership lookups bind 4 parameters per
+# donation and bucket, so keep this well below driver parameter limits.
+COMPACT_CHUNK_SIZE = int(os.getenv("ANALYTICS_COMPACT_CHUNK_SIZE", "2000"))
+
+GRANULARITIES = ("hour", "day")
+WATERMARK = "donations"
+
+
+class StaleWatermark(Exception):
+    """Another compactor moved the watermark first."""
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+async def claim_range(db: AsyncSession, expected_last_id: int, new_last_id: int) -> None:
+    result = await db.execute(
+        update(RollupWatermark.__table__)
+        .where(
+            RollupWatermark.name == WATERMARK,
+            RollupWatermark.last_id == expected_last_id,
+        )
+        .values(last_id=new_last_id)
+    )
+    if result.rowcount != 1:
+        raise StaleWatermark()
+
+
+async def fold(db: AsyncSession, rows) -> None:
+    rollups = defaultdict(lambda: [0, 0])  # (campaign, granularity, bucket) -> [sum, count]
+    members = set()  # (campaign, granularity, bucket, user)
+    donors = {}  # (campaign, user) -> [sum, count, first, last]
+    for campaign_id, user_id, amount, created_at in rows:
+        for granularity in GRANULARITIES:
+            key = (campaign_id, granularity, bucket_start(created_at, granularity))
+            rollups[key][0] += amount
+            rollups[key][1] += 1
+            members.add(key + (user_id,))
+        donor = donors.setdefault((campaign_id, user_id), [0, 0, created_at, created_at])
+        donor[0] += amount
+        donor[1] += 1
+        donor[2] = min(donor[2], created_at)
+        donor[3] = max(donor[3], created_at)
+    if not rows:
+        return
+
+    # Distinct donors: only users not yet counted in a bucket add to it
+    member_columns = (
+        DonationRollupDonor.campaign_id,
+        DonationRollupDonor.granularity,
+        DonationRollupDonor.bucket_start,
+        DonationRollupDonor.user_id,
+    )
+    counted = set(
+        (
+            await db.execute(
+                select(*member_columns).where(tuple_(*member_columns).in_(list(members)))
+            )
+        ).all()
+    )
+    new_members = members - counted
+    added_donors = defaultdict(int)
+    for campaign_id, granularity, start, _ in new_members:
+        added_donors[(campaign_id, granularity, start)] += 1
+    if new_members:
+        await db.execute(
+            insert(DonationRollupDonor),
+            [
+                {"campaign_id": c, "granularity": g, "bucket_start": b, "user_id": u}
+                for c, g, b, u in new_members
+            ],
+        )
+
+    rollup_columns = (
+        DonationRollup.campaign_id, DonationRollup.granularity, DonationRollup.bucket_start
+    )
+    existing = set(
+        (
+            await db.execute(
+                select(*rollup_columns).where(tuple_(*rollup_columns).in_(list(rollups)))
+            )
+        ).all()
+    )
+    table = DonationRollup.__table__
+    updates = [
+        {
+            "b_campaign_id": campaign_id,
+            "b_granularity": granularity,
+            "b_bucket_start": start,
+            "b_total": total,
+            "b_count": count,
+            "b_donors": added_donors[(campaign_id, granularity, start)],
+        }
+        for (campaign_id, granularity, start), (total, count) in sorted(rollups.items())
+        if (campaign_id, granularity, start) in existing
+    ]
+    if updates:
+        await db.execute(
+            update(table)
+            .where(
+                table.c.campaign_id == bindparam("b_campaign_id"),
+                table.c.granularity == bindparam("b_granularity"),
+                table.c.bucket_start == bindparam("b_bucket_start"),
+            )
+            .values(
+                total_amount=table.c.total_amount + bindparam("b_total"),
+                donation_count=table.c.donation_count + bindparam("b_count"),
+                donor_count=table.c.donor_count + bindparam("b_donors"),
+            ),
+            updates,
+        )
+    inserts = [
+        {
+            "campaign_id": campaign_id,
+            "granularity": granularity,
+            "bucket_start": start,
+            "total_amount": total,
+            "donation_count": count,
+            "donor_count": added_donors[(campaign_id, granularity, start)],
+        }
+        for (campaign_id, granularity, start), (total, count) in rollups.items()
+        if (campaign_id, granularity, start) not in existing
+    ]
+    if inserts:
+        await db.execute(insert(DonationRollup), inserts)
+
+    donor_columns = (CampaignDonor.campaign_id, CampaignDonor.user_id)
+    existing = set(
+        (
+            await db.execute(
+                select(*donor_columns).where(tuple_(*donor_columns).in_(list(donors)))
+            )
+        ).all()
+    )
+    table = CampaignDonor.__table__
+    updates = [
+        {
+            "b_campaign_id": campaign_id,
+            "b_user_id": user_id,
+            "b_total": total,
+            "b_count": count,
+            "b_first": first,
+            "b_last": last,
+        }
+        for (campaign_id, user_id), (total, count, first, last) in sorted(donors.items())
+        if (campaign_id, user_id) in existing
+    ]
+    if updates:
+        await db.execute(
+            update(table)
+            .where(
+                table.c.campaign_id == bindparam("b_campaign_id"),
+                table.c.user_id == bindparam("b_user_id"),
+            )
+            .values(
+                total_amount=table.c.total_amount + bindparam("b_total"),
+                donation_count=table.c.donation_count + bindparam("b_count"),
+                first_donated_at=case(
+                    (table.c.first_donated_at > bindparam("b_first"), bindparam("b_first")),
+                    else_=table.c.first_donated_at,
+                ),
+                last_donated_at=case(
+                    (table.c.last_donated_at < bindparam("b_last"), bindparam("b_last")),
+                    else_=table.c.last_donated_at,
+                ),
+            ),
+            updates,
+        )
+    inserts = [
+        {
+            "campaign_id": campaign_id,
+            "user_id": user_id,
+            "total_amount": total,
+            "donation_count": count,
+            "first_donated_at": first,
+            "last_donated_at": last,
+        }
+        for (campaign_id, user_id), (total, count, first, last) in donors.items()
+        if (campaign_id, user_id) not in existing
+    ]
+    if inserts:
+        await db.execute(insert(CampaignDonor), inserts)
+
+
+async def compact(db: AsyncSession, through: Optional[int] = None) -> int:
+    """Fold donations into the rollups; returns how many were folded.
+
+    ``through`` overrides the upper id, skipping the one-run delay.
+    """
+    watermark = (
+        await db.execute(
+            select(RollupWatermark.last_id, RollupWatermark.seen_max_id).where(
+                RollupWatermark.name == WATERMARK
+            )
+        )
+    ).first()
+    if watermark is None:
+        db.add(RollupWatermark(name=WATERMARK, last_id=0, seen_max_id=0))
+        await db.commit()
+        watermark = (0, 0)
+    last_id, seen_max_id = watermark
+    upper = seen_max_id if through is None else through
+
+    # Archived donations keep their ids, so a range moved to the archive
+    # before it was folded (or during a rebuild) is still read.
+    donations = donation_source(include_archived=True)
+    folded = 0
+    while last_id < upper:
+        chunk_end = min(upper, last_id + COMPACT_CHUNK_SIZE)
+        await claim_range(db, last_id, chunk_end)
+        rows = (
+            await db.execute(
+                select(
+                    donations.c.campaign_id,
+                    donations.c.user_id,
+                    donations.c.amount,
+                    donations.c.created_at,
+                ).where(donations.c.id > last_id, donations.c.id <= chunk_end)
+            )
+        ).all()
+        await fold(db, rows)
+        await db.commit()
+        last_id = chunk_end
+        folded += len(rows)
+
+    max_id = await db.scalar(select(func.max(Donation.id))) or 0
+    await db.execute(
+        update(RollupWatermark.__table__)
+        .where(RollupWatermark.name == WATERMARK, RollupWatermark.last_id == last_id)
+        .values(seen_max_id=max_id)
+    )
+    await db.commit()
+    return folded
+
+
+async def rebuild(db: AsyncSession) -> int:
+    for model in (DonationRollupDonor, DonationRollup, CampaignDonor, RollupWatermark):
+        await db.execute(delete(model))
+    await db.commit()
+    max_id = await db.scalar(select(func.max(Donation.id))) or 0
+    return await compact(db, through=max_id)
+
+
+async def run_compactor() -> None:
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                folded = await compact(db)
+            if folded:
+                logger.info("Folded %d donations into analytics rollups", folded)
+        except (StaleWatermark, IntegrityError, OperationalError):
+            # Another worker's compactor holds or moved the watermark
+            pass
+        except Exception:
+            logger.exception("Analytics compaction failed")
+        await asyncio.sleep(ANALYTICS_COMPACT_INTERVAL)
+
+
+async def campaign_series(
+    db: AsyncSession, campaign_id: int, granularity: str, since: datetime, until: datetime
+):
+    """Buckets in [since, until) with a running total since the campaign began."""
+    in_campaign = (
+        DonationRollup.campaign_id == campaign_id,
+        DonationRollup.granularity == granularity,
+    )
+    before = await db.scalar(
+        select(func.coalesce(func.sum(DonationRollup.total_amount), 0)).where(
+            *in_campaign, DonationRollup.bucket_start < since
+        )
+    )
+    running_total = func.sum(DonationRollup.total_amount).over(
+        order_by=DonationRollup.bucket_start
+    )
+    return (
+        await db.execute(
+            select(
+                DonationRollup.bucket_start,
+                DonationRollup.total_amount,
+                DonationRollup.donation_count,
+                DonationRollup.donor_count,
+                (running_total + before).label("running_total"),
+            )
+            .where(
+                *in_campaign,
+                DonationRollup.bucket_start >= since,
+                DonationRollup.bucket_start < until,
+            )
+            .order_by(DonationRollup.bucket_start)
+        )
+    ).all()
+
+
+async def top_donors(db: AsyncSession, campaign_id: int, limit: int):
+    return (
+        await db.execute(
+            select(
+                User.email,
+                CampaignDonor.total_amount,
+                CampaignDonor.donation_count,
+                CampaignDonor.first_donated_at,
+                CampaignDonor.last_donated_at,
+            )
+            .join(User, User.id == CampaignDonor.user_id)
+            .where(CampaignDonor.campaign_id == campaign_id)
+            .order_by(CampaignDonor.total_amount.desc(), CampaignDonor.user_id)
+            .limit(limit)
+        )
+    ).all()
+
+
+async def top_campaigns(db: AsyncSession, since: datetime, until: datetime, limit: int):
+    total = func.sum(DonationRollup.total_amount).label("total")
+    return (
+        await db.execute(
+            select(
+                DonationRollup.campaign_id,
+                CharityCampaign.title,
+                total,
+                func.sum(DonationRollup.donation_count).label("donations"),
+            )
+            .join(CharityCampaign, CharityCampaign.id == DonationRollup.campaign_id)
+            .where(
+                DonationRollup.granularity == "day",
+                DonationRollup.bucket_start >= bucket_start(since, "day"),
+                DonationRollup.bucket_start < until,
+            )
+            .group_by(DonationRollup.campaign_id, CharityCampaign.title)
+            .order_by(total.desc())
+            .limit(limit)
+        )
+    ).all()
+
+
+async def rollup_progress(db: AsyncSession) -> tuple[int, int]:
+    """(last donation id folded in, highest donation id)."""
+    last_id = await db.scalar(
+        select(RollupWatermark.last_id).where(RollupWatermark.name == WATERMARK)
+    )
+    max_id = await db.scalar(select(func.max(Donation.id)))
+    return last_id or 0, max_id or 0
+
+
+async def run_command(command: str) -> int:
+    async with AsyncSessionLocal() as db:
+        if command == "rebuild":
+            folded = await rebuild(db)
+        else:
+            max_id = await db.scalar(select(func.max(Donation.id))) or 0
+            folded = await compact(db, through=max_id)
+    await async_engine.dispose()
+    return folded
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Maintain donation analytics rollups.")
+    parser.add_argument("command", choices=["compact", "rebuild"])
+    args = parser.parse_args()
+    folded = asyncio.run(run_command(args.command))
+    print(f"Folded {folded} donation(s) into the rollups.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Archival of closed campaigns' donations and comments.
+
+Rows of campaigns closed more than ``ARCHIVE_AFTER_DAYS`` ago are moved, ids
+and all, from ``donations`` and ``comments`` into ``donations_archive`` and
+``comments_archive``, in batches of ``ARCHIVE_BATCH_SIZE`` with one
+transaction each. That keeps the hot tables and their indexes to the rows
+that open campaigns' pages actually read. Both hot tables use
+``AUTOINCREMENT`` on SQLite, so a new row never takes an archived row's id.
+The campaign's ``total_amount`` and ``donor_count`` stay on the campaign, so
+pages and listings never need the archive; ``totals.py verify`` and analytics
+rebuilds count archived donations too.
+
+Admin views read the archive only when asked (``?archived=1``), through
+``donation_source`` and ``comment_source``. Run this module from cron:
+
+    python archive.py              # archive campaigns closed over ARCHIVE_AFTER_DAYS ago
+    python archive.py --days 0     # archive every closed campaign now
+"""
+import argparse
+import os
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import FromClause, Table, delete, exists, insert, or_, select, union_all, update
+from sqlalchemy.orm import Session
+
+from db import SessionLocal
+from models import ArchivedComment, ArchivedDonation, CharityCampaign, Comment, Donation
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "5000"))
+
+# (hot table, archive table); every hot column has an archive column
+ARCHIVED_TABLES = (
+    (Donation.__table__, ArchivedDonation.__table__),
+    (Comment.__table__, ArchivedComment.__table__),
+)
+
+
+@dataclass
+class ArchiveReport:
+    campaigns: int = 0
+    donations: int = 0
+    comments: int = 0
+
+
+def union_source(hot: Table, archive: Table, include_archived: bool) -> FromClause:
+    if not include_archived:
+        return hot
+    return union_all(
+        select(*hot.c),
+        select(*(archive.c[column.name] for column in hot.c)),
+    ).subquery(f"{hot.name}_all")
+
+
+def donation_source(include_archived: bool) -> FromClause:
+    """``donations``, or a subquery with the same columns over both tables."""
+    return union_source(Donation.__table__, ArchivedDonation.__table__, include_archived)
+
+
+def comment_source(include_archived: bool) -> FromClause:
+    return union_source(Comment.__table__, ArchivedComment.__table__, include_archived)
+
+
+def move_rows(db: Session, hot: Table, archive: Table, campaign_id: int, now: datetime) -> int:
+    moved = 0
+    while True:
+        ids = db.scalars(
+            select(hot.c.id)
+            .where(hot.c.campaign_id == campaign_id)
+            .order_by(hot.c.id)
+            .limit(ARCHIVE_BATCH_SIZE)
+        ).all()
+        if not ids:
+            return moved
+        # Exactly the rows this statement deleted are archived: a row
+        # committed meanwhile, even with an id inside the batch's range, or
+        # one deleted meanwhile, is neither lost nor archived twice.
+        rows = db.execute(delete(hot).where(hot.c.id.in_(ids)).returning(*hot.c)).mappings().all()
+        if rows:
+            db.execute(insert(archive), [{**row, "archived_at": now} for row in rows])
+        db.commit()
+        moved += len(rows)
+
+
+def due_campaigns(db: Session, cutoff: datetime) -> list[int]:
+    return list(
+        db.scalars(
+            select(CharityCampaign.id)
+            .where(
+                CharityCampaign.status == "closed",
+                CharityCampaign.closed_at <= cutoff,
+                or_(
+                    exists().where(Donation.campaign_id == CharityCampaign.id),
+                    exists().where(Comment.campaign_id == CharityCampaign.id),
+                ),
+            )
+            .order_by(CharityCampaign.id)
+        )
+    )
+
+
+def archive_closed(db: Session, after_days: int = ARCHIVE_AFTER_DAYS) -> ArchiveReport:
+    now = datetime.utcnow()
+    report = ArchiveReport()
+    for campaign_id in due_campaigns(db, now - timedelta(days=after_days)):
+        moved = {hot.name: move_rows(db, hot, archive, campaign_id, now) for hot, archive in ARCHIVED_TABLES}
+        db.execute(
+            update(CharityCampaign.__table__)
+            .where(CharityCampaign.id == campaign_id)
+            .values(archived_at=now)
+        )
+        db.commit()
+        report.campaigns += 1
+        report.donations += moved["donations"]
+        report.comments += moved["comments"]
+    return report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Archive donations and comments of closed campaigns.")
+    parser.add_argument(
+        "--days",
+        type=int,
+        default=ARCHIVE_AFTER_DAYS,
+        help=f"archive campaigns closed at least this many days ago (default {ARCHIVE_AFTER_DAYS})",
+    )
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        report = archive_closed(db, args.days)
+    finally:
+        db.close()
+
+    print(
+        f"Archived {report.donations} donation(s) and {report.comments} comment(s) "
+        f"from {report.campaigns} campaign(s)."
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
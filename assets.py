@@ -0,0 +1,52 @@
+"""Static files with fingerprinted URLs.
+
+Templates link assets through ``static_url("css/app.css")``, which returns
+``/static/css/app.<hash>.css``, the hash taken from the file's contents.
+Such a URL can never point at other contents, so it is served with
+``Cache-Control: immutable`` and a one-year max-age; a changed file gets a
+new URL. Unhashed or outdated URLs (a page rendered before a deploy) still
+get the current file, marked ``no-cache``.
+"""
+import functools
+import hashlib
+import os
+import re
+
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+
+STATIC_DIR = "static"
+STATIC_URL_PREFIX = "/static"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+FINGERPRINT = re.compile(r"^(?P<stem>.+)\.(?P<hash>[0-9a-f]{12})(?P<suffix>\.\w+)$")
+
+
+@functools.lru_cache(maxsize=256)
+def file_hash(path: str, mtime_ns: int) -> str:
+    # Keyed by mtime too, so an edited file is rehashed in development
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+def asset_hash(name: str) -> str:
+    path = os.path.join(STATIC_DIR, name)
+    return file_hash(path, os.stat(path).st_mtime_ns)
+
+
+def static_url(name: str) -> str:
+    stem, suffix = os.path.splitext(name)
+    return f"{STATIC_URL_PREFIX}/{stem}.{asset_hash(name)}{suffix}"
+
+
+class FingerprintedStaticFiles(StaticFiles):
+    async def get_response(self, path: str, scope) -> Response:
+        match = FINGERPRINT.match(path)
+        if match:
+            path = match["stem"] + match["suffix"]
+        # The parent class checks the path stays inside STATIC_DIR
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            immutable = match is not None and asset_hash(path) == match["hash"]
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if immutable else "no-cache"
+        return response
@@ -1,24 +1,132 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from typing import Optional
 
 from fastapi import Depends, HTTPException, Request, status
-import bcrypt
-from sqlalchemy.orm import Session
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from db import get_db
+from cache import TTLCache
+from db import get_async_db
+from metrics import record_hash
 from models import User
+from passwords import hash_password_sync, hash_rounds, verify_password_sync
 
-def get_password_hash(password: str) -> str:
-    return bcrypt.hashpw(bytes(password, 'utf-8'), bcrypt.gensalt())
+# Password hashing
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 1)))
+# Hashing jobs allowed to run or wait at once; beyond that requests get 503.
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", str(HASH_WORKERS * 4)))
 
+# Authenticated user lookups. Invalidation is per process, so other workers
+# may use a changed email or role for up to USER_CACHE_TTL seconds; admin
+# checks that guard writes read the role afresh (see is_admin).
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(bytes(plain_password, 'utf-8'), hashed_password)
+_hash_pool: Optional[ProcessPoolExecutor] = None
+_hash_jobs = 0
 
 
-def get_current_user(
+def get_hash_pool() -> ProcessPoolExecutor:
+    global _hash_pool
+    if _hash_pool is None:
+        _hash_pool = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+    return _hash_pool
+
+
+def shutdown_hash_pool() -> None:
+    global _hash_pool
+    if _hash_pool is not None:
+        _hash_pool.shutdown(wait=True, cancel_futures=True)
+        _hash_pool = None
+
+
+async def run_hash_job(fn, *args):
+    # bcrypt is pure CPU; run it in worker processes so a login burst neither
+    # blocks the event loop nor competes with it for the GIL.
+    global _hash_jobs
+    if _hash_jobs >= HASH_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please try again shortly.",
+            headers={"Retry-After": "1"},
+        )
+    _hash_jobs += 1
+    started = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_hash_pool(), fn, *args)
+    finally:
+        _hash_jobs -= 1
+        record_hash(time.perf_counter() - started)
+
+
+async def hash_password(password: str) -> str:
+    return await run_hash_job(hash_password_sync, password, BCRYPT_ROUNDS)
+
+
+async def check_password(plain_password: str, hashed_password: str | bytes) -> bool:
+    return await run_hash_job(verify_password_sync, plain_password, hashed_password)
+
+
+def password_needs_rehash(hashed_password: str | bytes) -> bool:
+    return hash_rounds(hashed_password) != BCRYPT_ROUNDS
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The parts of a User that request handlers and templates need."""
+
+    id: int
+    email: str
+    role: str
+
+
+user_cache = TTLCache(max_entries=USER_CACHE_MAX_ENTRIES, ttl=USER_CACHE_TTL)
+
+
+def invalidate_user(user_id: int) -> None:
+    user_cache.delete(user_id)
+
+
+# ORM updates and deletes (e.g. a role change) drop the cached principal.
+# Bulk UPDATE statements bypass these hooks; call invalidate_user yourself.
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target: User) -> None:
+    invalidate_user(target.id)
+
+
+async def load_principal(db: AsyncSession, user_id: int) -> Optional[Principal]:
+    principal = user_cache.get(user_id)
+    if principal is None:
+        user = await db.get(User, user_id)
+        if user is None:
+            return None
+        principal = Principal(id=user.id, email=user.email, role=user.role)
+        user_cache.set(user_id, principal)
+    return principal
+
+
+async def is_admin(db: AsyncSession, user: Principal) -> bool:
+    """Whether the user is an admin now, not as of the cached principal."""
+    if user.role != "admin":
+        # A promotion shows once the cached entry expires
+        return False
+    role = await db.scalar(select(User.role).where(User.id == user.id))
+    if role != user.role:
+        invalidate_user(user.id)
+    return role == "admin"
+
+
+async def get_current_user(
     request: Request,
-    db: Session = Depends(get_db),
-) -> User:
+    db: AsyncSession = Depends(get_async_db),
+) -> Principal:
     user_id: Optional[int] = request.session.get("user_id")
     if user_id is None:
         raise HTTPException(
@@ -26,7 +134,7 @@ def get_current_user(
             detail="Not authenticated",
         )
 
-    user = db.get(User, user_id)
+    user = await load_principal(db, user_id)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -35,8 +143,11 @@ def get_current_user(
     return user
 
 
-def require_admin(current_user: User = Depends(get_current_user)) -> User:
-    if current_user.role != "admin":
+async def require_admin(
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+) -> Principal:
+    if not await is_admin(db, current_user):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Admin access required",
@@ -44,11 +155,10 @@ def require_admin(current_user: User = Depends(get_current_user)) -> User:
     return current_user
 
 
-def get_current_user_optional(
-    request: Request, db: Session = Depends(get_db)
-) -> Optional[User]:
+async def get_current_user_optional(
+    request: Request, db: AsyncSession = Depends(get_async_db)
+) -> Optional[Principal]:
     user_id = request.session.get("user_id")
     if not user_id:
         return None
-    return db.get(User, user_id)
-
+    return await load_principal(db, user_id)
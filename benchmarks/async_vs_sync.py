@@ -0,0 +1,197 @@
+"""Compare the async request path against an equivalent sync one.
+
+Serves main.app plus sync (threadpool + Session) copies of the homepage and
+campaign page under /_sync, seeds a throwaway SQLite database, and drives
+both variants with the same number of concurrent clients through a real
+uvicorn process:
+
+    python -m benchmarks.async_vs_sync --concurrency 64 --requests 3000
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+if __name__ == "__main__":
+    # Never seed the configured database; the uvicorn child inherits this.
+    os.environ["DATABASE_URL"] = os.getenv("BENCH_DATABASE_URL") or "sqlite:///" + os.path.join(
+        tempfile.mkdtemp(prefix="charity-bench-"), "bench.db"
+    )
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import HTMLResponse
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, defer, joinedload
+
+import main
+from db import SessionLocal, get_db
+from models import CharityCampaign, Comment, Donation, User
+from routes.campaign import (
+    CAMPAIGNS_PAGE_SIZE,
+    COMMENTS_PAGE_SIZE,
+    DESCRIPTION_EXCERPT_LENGTH,
+    excerpt_text,
+    templates,
+)
+
+sync_router = APIRouter(prefix="/_sync", include_in_schema=False)
+
+
+@sync_router.get("/", response_class=HTMLResponse)
+def sync_index(request: Request, db: Session = Depends(get_db)):
+    rows = db.execute(
+        select(
+            CharityCampaign,
+            func.substr(
+                CharityCampaign.description, 1, DESCRIPTION_EXCERPT_LENGTH + 1
+            ),
+        )
+        .options(defer(CharityCampaign.description))
+        .where(CharityCampaign.status == "open")
+        .order_by(CharityCampaign.created_at.desc(), CharityCampaign.id.desc())
+        .limit(CAMPAIGNS_PAGE_SIZE)
+    ).all()
+    return templates.TemplateResponse(
+        "campaigns_list.html",
+        {
+            "request": request,
+            "user": None,
+            "campaigns": [(c, excerpt_text(e)) for c, e in rows],
+            "next_url": None,
+        },
+    )
+
+
+@sync_router.get("/campaigns/{campaign_id}", response_class=HTMLResponse)
+def sync_campaign_detail(campaign_id: int, request: Request, db: Session = Depends(get_db)):
+    campaign = db.get(CharityCampaign, campaign_id)
+    if campaign is None:
+        raise HTTPException(status_code=404)
+    comments = db.scalars(
+        select(Comment)
+        .options(joinedload(Comment.user).load_only(User.email))
+        .where(Comment.campaign_id == campaign_id)
+        .order_by(Comment.created_at.desc(), Comment.id.desc())
+        .limit(COMMENTS_PAGE_SIZE)
+    ).all()
+    return templates.TemplateResponse(
+        "campaign_detail.html",
+        {
+            "request": request,
+            "user": None,
+            "campaign": campaign,
+            "comments": comments,
+            "next_comments_cursor": None,
+        },
+    )
+
+
+app = main.app
+app.include_router(sync_router)
+
+
+def seed(campaigns: int, comments_per_campaign: int) -> None:
+    db = SessionLocal()
+    try:
+        user = User(email="bench@example.com", hashed_password="x", role="admin")
+        db.add(user)
+        db.flush()
+        for i in range(campaigns):
+            campaign = CharityCampaign(
+                title=f"Campaign {i}",
+                description="Lorem ipsum dolor sit amet. " * 100,
+                created_by_id=user.id,
+            )
+            db.add(campaign)
+            db.flush()
+            db.add_all(
+                Comment(content=f"Comment {j}", user_id=user.id, campaign_id=campaign.id)
+                for j in range(comments_per_campaign)
+            )
+            db.add(Donation(user_id=user.id, campaign_id=campaign.id, amount=10))
+        db.commit()
+    finally:
+        db.close()
+
+
+async def drive(base_url: str, paths: list[str], concurrency: int, total: int) -> dict:
+    import httpx
+
+    latencies: list[float] = []
+    remaining = total
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            response = await client.get(random.choice(paths))
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def wait_for_server(base_url: str, timeout: float = 20) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(base_url + "/", timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    raise RuntimeError("uvicorn did not start")
+
+
+def run() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--campaigns", type=int, default=200)
+    parser.add_argument("--comments", type=int, default=50)
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args()
+
+    seed(args.campaigns, args.comments)
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.async_vs_sync:app",
+         "--port", str(args.port), "--log-level", "warning"],
+        env=os.environ.copy(),
+    )
+    try:
+        wait_for_server(base_url)
+        detail_ids = range(1, args.campaigns + 1)
+        variants = {
+            "async": ["/"] + [f"/campaigns/{i}" for i in detail_ids],
+            "sync": ["/_sync/"] + [f"/_sync/campaigns/{i}" for i in detail_ids],
+        }
+        print(f"{'mode':<8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for mode, paths in variants.items():
+            asyncio.run(drive(base_url, paths, args.concurrency, args.concurrency * 4))
+            stats = asyncio.run(drive(base_url, paths, args.concurrency, args.requests))
+            print(f"{mode:<8}{stats['rps']:>10.1f}{stats['p50_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,93 @@
+"""Cold-start time: how long a new worker takes before it can serve.
+
+Measures, as the median of several fresh processes:
+
+- import: ``python -c "import main"``, the part a preloading master pays once
+- first response: from starting ``uvicorn main:app`` until ``GET /`` answers
+  200, on a database that was migrated beforehand (as entrypoint.sh does)
+
+    python -m benchmarks.cold_start            # print timings
+    python -m benchmarks.cold_start --check    # exit 1 if over target
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+# Most of the import is FastAPI, pydantic and SQLAlchemy themselves (~0.6s of
+# ~1.1s measured); the targets leave headroom over that for slower machines.
+IMPORT_TARGET_SECONDS = 1.5
+FIRST_RESPONSE_TARGET_SECONDS = 2.5
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_import(env: dict) -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import main"], env=env, check=True)
+    return time.perf_counter() - started
+
+
+def time_first_response(env: dict, timeout: float = 30) -> float:
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.TransportError:
+                pass
+            time.sleep(0.01)
+        raise RuntimeError(f"no response within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure worker cold-start time.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--check", action="store_true", help="exit 1 if over target")
+    args = parser.parse_args()
+
+    env = dict(
+        os.environ,
+        DATABASE_URL="sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="charity-cold-"), "cold.db"),
+        MIGRATE_ON_STARTUP="0",
+        ANALYTICS_COMPACTOR="0",
+    )
+    subprocess.run([sys.executable, "-m", "migrations"], env=env, check=True, stdout=subprocess.DEVNULL)
+
+    results = [
+        ("import", [time_import(env) for _ in range(args.runs)], IMPORT_TARGET_SECONDS),
+        ("first response", [time_first_response(env) for _ in range(args.runs)], FIRST_RESPONSE_TARGET_SECONDS),
+    ]
+    failed = False
+    for name, samples, target in results:
+        median = statistics.median(samples)
+        over = median > target
+        failed |= over
+        print(
+            f"{name:>15}: median {median:.2f}s, min {min(samples):.2f}s, "
+            f"max {max(samples):.2f}s (target {target:.1f}s){'  OVER TARGET' if over else ''}"
+        )
+    return 1 if failed and args.check else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
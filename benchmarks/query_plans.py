@@ -0,0 +1,159 @@
+"""Fail if a hot query falls back to a full table scan.
+
+Seeds a throwaway SQLite database, sends one request to each hot route,
+records every SELECT the app runs, then asks SQLite for each one's
+``EXPLAIN QUERY PLAN``. A plan step that scans a table without an index
+(``SCAN donations``) is a failure, unless the table is listed in
+``ALLOWED_SCANS``. Walking an index in order (``SCAN donations USING INDEX
+...``) passes: that is how keyset pages read their first rows.
+
+    python -m benchmarks.query_plans          # exit 1 on full scans
+    python -m benchmarks.query_plans -v       # print every plan
+"""
+import argparse
+import asyncio
+import os
+import re
+import sys
+import tempfile
+from dataclasses import dataclass, field
+
+if __name__ == "__main__":
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(
+        tempfile.mkdtemp(prefix="charity-plans-"), "plans.db"
+    )
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+    os.environ.setdefault("ANALYTICS_COMPACTOR", "0")
+
+import httpx
+
+from benchmarks.seed import BENCH_PASSWORD, seed, user_email
+
+# Tables a hot query may scan in full, each with the reason
+ALLOWED_SCANS: dict[str, str] = {}
+
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+@dataclass
+class Captured:
+    route: str
+    statement: str
+    parameters: tuple
+    plan: list[str] = field(default_factory=list)
+
+
+def hot_routes(campaign_id: int) -> list[tuple[str, str, dict]]:
+    return [
+        ("GET", "/", {}),
+        ("GET", f"/campaigns/{campaign_id}", {}),
+        ("GET", f"/campaigns/{campaign_id}/comments", {}),
+        ("GET", f"/campaigns/{campaign_id}/totals", {}),
+        ("POST", f"/campaigns/{campaign_id}/donate", {"amount": 5}),
+        ("POST", f"/campaigns/{campaign_id}/comments", {"content": "Query plan check"}),
+        ("GET", "/me/donations", {}),
+        ("GET", "/me/donations/by-campaign", {}),
+        ("GET", "/api/v1/campaigns", {}),
+        ("GET", f"/api/v1/campaigns/{campaign_id}", {}),
+        ("GET", "/search?q=help", {}),
+        ("GET", "/admin/campaigns", {}),
+        ("GET", f"/admin/analytics?campaign_id={campaign_id}", {}),
+    ]
+
+
+async def capture(campaign_id: int) -> list[Captured]:
+    from sqlalchemy import event
+
+    import main
+    from db import async_engine
+
+    captured: list[Captured] = []
+    route = ""
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            captured.append(Captured(route, statement, tuple(parameters or ())))
+
+    # The first user is the admin, so admin pages are covered too
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://plans") as client:
+        response = await client.post(
+            "/login", data={"email": user_email(1), "password": BENCH_PASSWORD}
+        )
+        if response.status_code != 303:
+            raise RuntimeError(f"login failed: {response.status_code}")
+        event.listen(async_engine.sync_engine, "before_cursor_execute", on_execute)
+        try:
+            for method, path, data in hot_routes(campaign_id):
+                route = f"{method} {path}"
+                response = await client.request(method, path, data=data or None)
+                if response.status_code >= 400:
+                    raise RuntimeError(f"{route} answered {response.status_code}")
+        finally:
+            event.remove(async_engine.sync_engine, "before_cursor_execute", on_execute)
+    await async_engine.dispose()
+    return captured
+
+
+def explain(queries: list[Captured]) -> None:
+    from db import engine
+
+    with engine.connect() as conn:
+        for query in queries:
+            rows = conn.exec_driver_sql(
+                "EXPLAIN QUERY PLAN " + query.statement, query.parameters
+            ).all()
+            query.plan = [row[-1] for row in rows]
+
+
+def full_scans(query: Captured) -> list[str]:
+    scans = []
+    for step in query.plan:
+        match = FULL_SCAN.match(step)
+        if match and match.group(1) not in ALLOWED_SCANS:
+            scans.append(match.group(1))
+    return scans
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Check hot queries for full table scans.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args()
+
+    from analytics import run_command
+    from db import SessionLocal, engine
+    from models import CharityCampaign
+
+    # Enough rows that SQLite's planner prefers indexes where they exist
+    seed(users=200, campaigns=200, donations=20_000, comments=5_000)
+    asyncio.run(run_command("compact"))
+    with SessionLocal() as db:
+        campaign_id = db.query(CharityCampaign.id).filter(CharityCampaign.status == "open").first()[0]
+    # ANALYZE gives the planner the statistics a long-running database has
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+    queries = asyncio.run(capture(campaign_id))
+    explain(queries)
+
+    failures = 0
+    seen = set()
+    for query in queries:
+        if query.statement in seen:
+            continue
+        seen.add(query.statement)
+        scans = full_scans(query)
+        if scans or args.verbose:
+            status = f"FULL SCAN of {', '.join(scans)}" if scans else "ok"
+            print(f"[{status}] {query.route}")
+            print("    " + " ".join(query.statement.split()))
+            for step in query.plan:
+                print(f"      {step}")
+        failures += bool(scans)
+
+    print(f"{len(seen)} distinct queries checked, {failures} with full table scans")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
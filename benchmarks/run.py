@@ -0,0 +1,330 @@
+"""Throughput, latency and query-count benchmark for every router.
+
+Seeds a throwaway SQLite database (see benchmarks.seed), then drives the app
+with concurrent clients twice: in process through httpx's ASGI transport, and
+over HTTP against a local uvicorn process. Queries per request come from a
+separate sequential pass with the page cache cleared before each request.
+
+    python -m benchmarks.run                    # compare with baseline.json
+    python -m benchmarks.run --save-baseline    # record a new baseline
+    python -m benchmarks.run --check            # exit 1 on regressions
+
+Needs httpx (benchmarks/requirements.txt).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+if __name__ == "__main__":
+    # Never seed the configured database; the uvicorn child inherits this.
+    os.environ["DATABASE_URL"] = os.getenv("BENCH_DATABASE_URL") or "sqlite:///" + os.path.join(
+        tempfile.mkdtemp(prefix="charity-bench-"), "bench.db"
+    )
+    # Every simulated client shares one address; measure the app, not the limiter
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+
+import httpx
+
+from benchmarks.seed import BENCH_PASSWORD, seed, user_email
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+QUERY_SAMPLE_REQUESTS = 20
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: Callable[[random.Random], str]
+    data: Optional[Callable[[random.Random], dict]] = None
+    authenticated: bool = False
+    # Fraction of --requests to send; bcrypt-bound endpoints get fewer.
+    weight: float = 1.0
+
+
+def build_scenarios(open_ids: list[int], users: int) -> list[Scenario]:
+    return [
+        Scenario("GET /", "GET", lambda rng: "/"),
+        Scenario(
+            "GET /campaigns/{id}", "GET",
+            lambda rng: f"/campaigns/{rng.choice(open_ids)}",
+        ),
+        Scenario(
+            "POST /campaigns/{id}/donate", "POST",
+            lambda rng: f"/campaigns/{rng.choice(open_ids)}/donate",
+            data=lambda rng: {"amount": rng.randint(1, 100)},
+            authenticated=True,
+        ),
+        Scenario(
+            "POST /login", "POST", lambda rng: "/login",
+            data=lambda rng: {
+                "email": user_email(rng.randint(1, users)),
+                "password": BENCH_PASSWORD,
+            },
+            weight=0.05,
+        ),
+        Scenario("GET /me/donations", "GET", lambda rng: "/me/donations", authenticated=True),
+        Scenario("GET /api/v1/campaigns", "GET", lambda rng: "/api/v1/campaigns"),
+    ]
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, int(len(sorted_values) * fraction) - 1))
+    return sorted_values[index]
+
+
+def make_client(base_url: str, transport) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=base_url,
+        transport=transport,
+        limits=httpx.Limits(max_connections=None),
+        timeout=120,
+    )
+
+
+async def log_in(client: httpx.AsyncClient) -> None:
+    response = await client.post(
+        "/login", data={"email": user_email(1), "password": BENCH_PASSWORD}
+    )
+    if response.status_code != 303:
+        raise RuntimeError(f"benchmark login failed: {response.status_code}")
+
+
+async def request(client: httpx.AsyncClient, scenario: Scenario, rng: random.Random) -> httpx.Response:
+    data = scenario.data(rng) if scenario.data else None
+    return await client.request(scenario.method, scenario.path(rng), data=data)
+
+
+async def drive(client: httpx.AsyncClient, scenario: Scenario, concurrency: int, total: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    remaining = total
+
+    async def worker(worker_id: int) -> None:
+        nonlocal remaining, errors
+        rng = random.Random(worker_id)
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                response = await request(client, scenario, rng)
+            except httpx.TransportError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+async def run_mode(base_url: str, transport, scenarios: list[Scenario], args) -> dict:
+    from db import async_engine
+
+    results = {}
+    for scenario in scenarios:
+        total = max(args.concurrency, int(args.requests * scenario.weight))
+        async with make_client(base_url, transport) as client:
+            if scenario.authenticated:
+                await log_in(client)
+            # Warm-up pass so pools, caches and the hash workers are primed
+            await drive(client, scenario, args.concurrency, args.concurrency)
+            results[scenario.name] = await drive(client, scenario, args.concurrency, total)
+    await async_engine.dispose()
+    return results
+
+
+async def count_queries(scenarios: list[Scenario]) -> dict:
+    from sqlalchemy import event
+
+    import main
+    from db import async_engine
+    from page_cache import page_cache
+
+    executed = 0
+
+    def on_execute(*_args) -> None:
+        nonlocal executed
+        executed += 1
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", on_execute)
+    transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+    counts = {}
+    try:
+        for scenario in scenarios:
+            rng = random.Random(0)
+            async with make_client("http://bench", transport) as client:
+                if scenario.authenticated:
+                    await log_in(client)
+                executed = 0
+                for _ in range(QUERY_SAMPLE_REQUESTS):
+                    page_cache.clear()
+                    await request(client, scenario, rng)
+                counts[scenario.name] = executed / QUERY_SAMPLE_REQUESTS
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", on_execute)
+        # Pooled connections belong to this event loop; don't carry them over.
+        await async_engine.dispose()
+    return counts
+
+
+def wait_for_server(base_url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(base_url + "/", timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    raise RuntimeError("uvicorn did not start")
+
+
+def run_uvicorn(scenarios: list[Scenario], args) -> dict:
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port),
+         "--log-level", "warning", "--no-access-log", "--timeout-keep-alive", "60"],
+        env=os.environ.copy(),
+    )
+    try:
+        wait_for_server(base_url)
+        return asyncio.run(run_mode(base_url, None, scenarios, args))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    print(f"\nAgainst baseline (tolerance {tolerance:.0%}):")
+    for mode, scenarios in results["modes"].items():
+        for name, current in scenarios.items():
+            previous = baseline.get("modes", {}).get(mode, {}).get(name)
+            if previous is None:
+                continue
+            rps_change = current["rps"] / previous["rps"] - 1
+            p99_change = current["p99_ms"] / previous["p99_ms"] - 1
+            queries_now = results["queries"].get(name)
+            queries_before = baseline.get("queries", {}).get(name)
+            flags = []
+            if rps_change < -tolerance:
+                flags.append("req/s")
+            if p99_change > tolerance:
+                flags.append("p99")
+            if queries_before is not None and queries_now is not None and queries_now > queries_before:
+                flags.append("queries")
+            label = f"{mode:<10}{name:<30}"
+            print(f"{label}req/s {rps_change:+7.1%}  p99 {p99_change:+7.1%}"
+                  + (f"  REGRESSION: {', '.join(flags)}" if flags else ""))
+            if flags:
+                regressions.append(f"{mode} {name}: {', '.join(flags)}")
+    return regressions
+
+
+def print_results(results: dict) -> None:
+    header = f"{'mode':<10}{'endpoint':<30}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}{'queries':>9}"
+    print(header)
+    print("-" * len(header))
+    for mode, scenarios in results["modes"].items():
+        for name, stats in scenarios.items():
+            queries = results["queries"].get(name, float("nan"))
+            print(f"{mode:<10}{name:<30}{stats['rps']:>9.1f}{stats['p50_ms']:>9.1f}"
+                  f"{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}{stats['errors']:>8}{queries:>9.1f}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark every router.")
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--campaigns", type=int, default=500)
+    parser.add_argument("--donations", type=int, default=100_000)
+    parser.add_argument("--comments", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2_000)
+    parser.add_argument("--modes", default="inprocess,uvicorn")
+    parser.add_argument("--port", type=int, default=8098)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    seed(args.users, args.campaigns, args.donations, args.comments)
+    print(f"Seeded in {time.perf_counter() - started:.1f}s ({os.environ['DATABASE_URL']})")
+
+    from db import SessionLocal
+    from models import CharityCampaign
+
+    db = SessionLocal()
+    try:
+        open_ids = [cid for (cid,) in db.query(CharityCampaign.id).filter(CharityCampaign.status == "open")]
+    finally:
+        db.close()
+    scenarios = build_scenarios(open_ids, args.users)
+
+    import main as app_main
+    from auth import shutdown_hash_pool
+
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "dataset": {
+                "users": args.users,
+                "campaigns": args.campaigns,
+                "donations": args.donations,
+                "comments": args.comments,
+            },
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+        },
+        "queries": asyncio.run(count_queries(scenarios)),
+        "modes": {},
+    }
+    modes = args.modes.split(",")
+    if "inprocess" in modes:
+        # Unhandled errors become 500s (counted as errors) instead of aborting the run
+        transport = httpx.ASGITransport(app=app_main.app, raise_app_exceptions=False)
+        results["modes"]["inprocess"] = asyncio.run(run_mode("http://bench", transport, scenarios, args))
+        shutdown_hash_pool()
+    if "uvicorn" in modes:
+        results["modes"]["uvicorn"] = run_uvicorn(scenarios, args)
+
+    print_results(results)
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+    if args.baseline.exists():
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        if regressions and args.check:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
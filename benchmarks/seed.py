@@ -0,0 +1,106 @@
+"""Bulk-load a synthetic dataset for benchmarking.
+
+Rows go in through Core ``insert()`` executemany batches on the sync engine,
+then campaign totals are rebuilt from the ledger. Expects an empty database
+so users and campaigns get ids 1..N. Every user's password is
+``BENCH_PASSWORD``; user 1 is the admin.
+
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.seed --donations 1000000
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+BENCH_PASSWORD = "bench-password"
+BATCH_SIZE = 10_000
+
+
+def user_email(user_id: int) -> str:
+    return f"user{user_id}@example.com"
+
+
+def insert_batched(db, model, rows) -> None:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            db.execute(insert(model), batch)
+            batch = []
+    if batch:
+        db.execute(insert(model), batch)
+
+
+def seed(users: int, campaigns: int, donations: int, comments: int, seed_value: int = 1) -> None:
+    from auth import BCRYPT_ROUNDS
+    from db import SessionLocal, engine
+    from migrations import migrate
+    from models import CharityCampaign, Comment, Donation, User
+    from passwords import hash_password_sync
+    from totals import rebuild_totals
+
+    migrate(engine)
+    rng = random.Random(seed_value)
+    now = datetime.utcnow()
+    password_hash = hash_password_sync(BENCH_PASSWORD, BCRYPT_ROUNDS)
+
+    def moment() -> datetime:
+        return now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600))
+
+    db = SessionLocal()
+    try:
+        insert_batched(db, User, (
+            {
+                "email": user_email(i),
+                "hashed_password": password_hash,
+                "role": "admin" if i == 1 else "user",
+            }
+            for i in range(1, users + 1)
+        ))
+        insert_batched(db, CharityCampaign, (
+            {
+                "title": f"Campaign {i}",
+                "description": " ".join(["Help us reach the goal."] * rng.randint(5, 200)),
+                "created_at": moment(),
+                "created_by_id": 1,
+                "status": "open" if rng.random() < 0.8 else "closed",
+            }
+            for i in range(1, campaigns + 1)
+        ))
+        insert_batched(db, Donation, (
+            {
+                "user_id": rng.randint(1, users),
+                "campaign_id": rng.randint(1, campaigns),
+                "amount": rng.randint(1, 500),
+                "created_at": moment(),
+            }
+            for _ in range(donations)
+        ))
+        insert_batched(db, Comment, (
+            {
+                "content": f"Comment {i}",
+                "user_id": rng.randint(1, users),
+                "campaign_id": rng.randint(1, campaigns),
+                "created_at": moment(),
+            }
+            for i in range(comments)
+        ))
+        db.commit()
+        rebuild_totals(db)
+    finally:
+        db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Seed a synthetic benchmark dataset.")
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--campaigns", type=int, default=500)
+    parser.add_argument("--donations", type=int, default=100_000)
+    parser.add_argument("--comments", type=int, default=20_000)
+    args = parser.parse_args()
+    seed(args.users, args.campaigns, args.donations, args.comments)
+
+
+if __name__ == "__main__":
+    main()
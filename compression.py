@@ -0,0 +1,175 @@
+"""Response compression.
+
+``CompressionMiddleware`` compresses text, JSON and NDJSON responses of at
+least ``COMPRESSION_MIN_SIZE`` bytes with brotli or gzip, whichever the
+client's ``Accept-Encoding`` prefers (brotli needs ``pip install brotli``;
+without it only gzip is offered). Streamed bodies such as exports are
+compressed chunk by chunk and flushed as they go. Event streams
+(``text/event-stream``) are never compressed, since a compressor would hold
+back each event until it had buffered enough to emit.
+
+Levels favour speed, as every response is compressed afresh: gzip level
+``COMPRESSION_GZIP_LEVEL`` (6), brotli quality ``COMPRESSION_BROTLI_QUALITY``
+(5).
+"""
+import os
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from db import env_flag
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+COMPRESSION_ENABLED = env_flag("COMPRESSION_ENABLED", True)
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "512"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/x-ndjson",
+    "image/svg+xml",
+)
+UNCOMPRESSED_TYPES = ("text/event-stream",)
+
+
+class GzipCompressor:
+    def __init__(self):
+        self._compressor = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        out = self._compressor.compress(data)
+        return out + self._compressor.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        out = self._compressor.process(data)
+        return out + self._compressor.flush() if flush else out
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+# In order of preference when the client rates them equally
+COMPRESSORS = {"br": BrotliCompressor} if brotli is not None else {}
+COMPRESSORS["gzip"] = GzipCompressor
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """The best encoding we offer for an ``Accept-Encoding`` header, if any."""
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            weights[coding.strip().lower()] = q
+    best, best_q = None, 0.0
+    for coding in COMPRESSORS:
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compressible(headers: Headers) -> bool:
+    if "content-encoding" in headers:
+        return False
+    media_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    return media_type.startswith(COMPRESSIBLE_TYPES) and not media_type.startswith(UNCOMPRESSED_TYPES)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        encoding = choose_encoding(request_headers.get("accept-encoding", ""))
+        head = scope["method"] == "HEAD"
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, compressor, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                if message["status"] in (204, 304) or not compressible(headers):
+                    # Sent straight away: event streams must not wait for a body
+                    passthrough = True
+                    await send(message)
+                    return
+                # The representation depends on Accept-Encoding either way
+                headers.add_vary_header("Accept-Encoding")
+                if encoding is None or head:
+                    passthrough = True
+                    await send(message)
+                    return
+                # Held back until the first body chunk shows the size
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+
+                headers = MutableHeaders(scope=start)
+                compressor = COMPRESSORS[encoding]()
+                headers["Content-Encoding"] = encoding
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    # No longer byte-for-byte the tagged body
+                    headers["ETag"] = "W/" + etag
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    body = compressor.compress(body) + compressor.finish()
+                    headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send(start)
+
+            if more_body:
+                body = compressor.compress(body, flush=True)
+            else:
+                body = compressor.compress(body) + compressor.finish()
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
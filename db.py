@@ -1,14 +1,159 @@
-from sqlalchemy import create_engine
+import os
+import time
+from typing import AsyncIterator
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
 
-DATABASE_URL = "sqlite:///./app.db"
+from metrics import record_pool_wait, record_query
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False},
-)
+
+def env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def database_url() -> URL:
+    # DATABASE_URL wins; otherwise DB_BACKEND=postgresql builds the URL from
+    # the DB_* variables docker-compose exports, and SQLite is the default.
+    if os.getenv("DATABASE_URL"):
+        return make_url(os.environ["DATABASE_URL"])
+    if os.getenv("DB_BACKEND", "sqlite") == "postgresql":
+        return URL.create(
+            "postgresql+psycopg",
+            username=os.getenv("DB_USER", "postgres"),
+            password=os.getenv("DB_PASSWORD"),
+            host=os.getenv("DB_HOST", "localhost"),
+            port=int(os.getenv("DB_PORT", "5432")),
+            database=os.getenv("DB_NAME", "charity"),
+        )
+    return make_url("sqlite:///./app.db")
+
+
+# Pool settings (ignored for in-memory SQLite, which shares one connection)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = env_flag("DB_POOL_PRE_PING", True)
+
+# SQLite connection tuning
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+
+DATABASE_URL = database_url()
+
+# Drivers used by the async engine for each backend
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def async_database_url(url: URL) -> URL:
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+
+def is_sqlite(url: URL) -> bool:
+    return url.get_backend_name() == "sqlite"
+
+
+class TimedCheckout:
+    # Records how long each checkout waited for a free (or new) connection.
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            record_pool_wait(time.perf_counter() - started)
+
+
+class TimedQueuePool(TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(url: URL, is_async: bool = False) -> dict:
+    options = {"pool_pre_ping": DB_POOL_PRE_PING}
+    if is_sqlite(url):
+        options["connect_args"] = {"check_same_thread": False}
+        if url.database in (None, "", ":memory:"):
+            options["poolclass"] = StaticPool
+            return options
+    # Also replaces aiosqlite's default NullPool, which reconnects on every
+    # checkout.
+    options["poolclass"] = TimedAsyncQueuePool if is_async else TimedQueuePool
+    options.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+    return options
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    # WAL lets readers run alongside the single writer, and the busy timeout
+    # makes concurrent writers wait for the lock instead of failing with
+    # "database is locked".
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.close()
+
+
+def start_query_timer(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany) -> None:
+    record_query(time.perf_counter() - conn.info["query_started"].pop(), statement)
+
+
+def discard_query_timer(context) -> None:
+    # Failed statements never reach after_cursor_execute
+    if context.connection is not None and context.connection.info.get("query_started"):
+        context.connection.info["query_started"].pop()
+
+
+def instrument(sync_engine, url: URL) -> None:
+    if is_sqlite(url):
+        event.listen(sync_engine, "connect", set_sqlite_pragmas)
+    event.listen(sync_engine, "before_cursor_execute", start_query_timer)
+    event.listen(sync_engine, "after_cursor_execute", stop_query_timer)
+    event.listen(sync_engine, "handle_error", discard_query_timer)
+
+
+def make_async_engine(url: URL) -> AsyncEngine:
+    """Async engine for ``url`` with the app's pool settings and timers; also
+    used for read replicas (replicas.py)."""
+    async_engine = create_async_engine(
+        async_database_url(url), **engine_options(url, is_async=True)
+    )
+    instrument(async_engine.sync_engine, url)
+    return async_engine
+
+
+# The sync engine serves maintenance commands (totals.py) and DDL; request
+# handlers use the async engine.
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+instrument(engine, DATABASE_URL)
+async_engine = make_async_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Objects stay usable after commit: async sessions can't lazily refresh
+# expired attributes from a template.
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
 
 Base = declarative_base()
 
@@ -20,3 +165,7 @@ def get_db() -> Session:
     finally:
         db.close()
 
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as db:
+        yield db
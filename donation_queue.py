@@ -0,0 +1,175 @@
+"""Batched donation ingestion (DONATION_BATCHING=1).
+
+``donate`` hands each donation to ``donation_writer`` and waits for it. One
+background task collects queued donations until ``DONATION_BATCH_SIZE`` are
+waiting or ``DONATION_BATCH_WAIT_MS`` has passed since the first one, then
+records the whole batch with ``totals.record_donations`` in one transaction:
+one multi-row INSERT, one UPDATE per campaign, one commit.
+
+Durability: a donor is only answered after the batch holding their donation
+has committed, so an acknowledged donation is as durable as any other commit
+(SQLite in WAL mode with synchronous=NORMAL may lose the last commits on
+power loss, not on a process crash). Donations still queued when the process
+dies are lost, but none of them were acknowledged; clients retry with the
+same Idempotency-Key and the retry is recorded once. On shutdown the writer
+stops accepting new donations and flushes the queue before exiting.
+
+A retry can reach another worker (or the unbatched path) at the same moment
+and commit its key first; the batch then fails on the unique key, and is
+recorded again one donation at a time so that only the retried donation
+turns into a duplicate.
+"""
+import asyncio
+import logging
+import os
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy.exc import IntegrityError
+
+from db import AsyncSessionLocal, env_flag
+from live import live_hub
+from page_cache import invalidate_campaign, invalidate_listing
+from totals import DUPLICATE, RECORDED, NewDonation, record_donations
+
+logger = logging.getLogger("charity.donations")
+
+DONATION_BATCHING = env_flag("DONATION_BATCHING", False)
+# Each donation binds 5 parameters; keep batches well under driver limits.
+DONATION_BATCH_SIZE = int(os.getenv("DONATION_BATCH_SIZE", "500"))
+DONATION_BATCH_WAIT_MS = float(os.getenv("DONATION_BATCH_WAIT_MS", "10"))
+# Donations allowed to wait for a flush; beyond that donors get 503.
+DONATION_QUEUE_LIMIT = int(os.getenv("DONATION_QUEUE_LIMIT", "10000"))
+
+
+def busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server is busy, please try again shortly.",
+        headers={"Retry-After": "1"},
+    )
+
+
+class DonationWriter:
+    def __init__(self, batch_size: int, batch_wait: float, queue_limit: int):
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.queue_limit = queue_limit
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    def start(self) -> None:
+        # Also restarts after the event loop that ran the old task closed
+        if (
+            self._task is None
+            or self._task.done()
+            or self._task.get_loop() is not asyncio.get_running_loop()
+        ):
+            self._closing = False
+            self._queue = asyncio.Queue(maxsize=self.queue_limit)
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, donation: NewDonation) -> str:
+        """Queue a donation and wait until its batch has committed."""
+        if self._closing:
+            raise busy()
+        self.start()
+        done = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((donation, done))
+        except asyncio.QueueFull:
+            raise busy()
+        return await done
+
+    async def drain(self) -> None:
+        """Stop accepting donations and flush everything already queued."""
+        if self._task is None:
+            return
+        self._closing = True
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        self._queue = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.batch_wait
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _record(self, donations: list[NewDonation]) -> list[str]:
+        # Leaving the session rolls back whatever did not commit
+        async with AsyncSessionLocal() as db:
+            outcomes = await record_donations(db, donations)
+            await db.commit()
+        return outcomes
+
+    async def _record_each(self, donations: list[NewDonation]) -> list:
+        outcomes = []
+        for donation in donations:
+            try:
+                [outcome] = await self._record([donation])
+            except IntegrityError:
+                # A concurrent retry with the same key committed first
+                outcome = DUPLICATE
+            except Exception:
+                logger.exception("Donation to campaign %d failed", donation.campaign_id)
+                outcome = busy()
+            outcomes.append(outcome)
+        return outcomes
+
+    async def _flush(self, batch: list) -> None:
+        donations = [donation for donation, _ in batch]
+        try:
+            outcomes = await self._record(donations)
+        except IntegrityError:
+            outcomes = await self._record_each(donations)
+        except Exception:
+            # Nothing in the batch was recorded; donors retry with their key.
+            logger.exception("Donation batch of %d failed", len(batch))
+            outcomes = [busy() for _ in batch]
+
+        for (donation, done), outcome in zip(batch, outcomes):
+            # A donor who disconnected has a cancelled future; the donation
+            # is recorded all the same.
+            if done.done():
+                continue
+            if isinstance(outcome, HTTPException):
+                done.set_exception(outcome)
+            else:
+                done.set_result(outcome)
+        campaign_ids = {
+            donation.campaign_id
+            for (donation, _), outcome in zip(batch, outcomes)
+            if outcome == RECORDED
+        }
+        if campaign_ids:
+            invalidate_listing()
+            for campaign_id in campaign_ids:
+                invalidate_campaign(campaign_id)
+                live_hub.notify(campaign_id)
+
+
+donation_writer = DonationWriter(
+    batch_size=DONATION_BATCH_SIZE,
+    batch_wait=DONATION_BATCH_WAIT_MS / 1000,
+    queue_limit=DONATION_QUEUE_LIMIT,
+)
@@ -1,2 +1,4 @@
-pip install --no-cache-dir -r requirements.txt
-uvicorn main:app --host 0.0.0.0 --port 8080
+set -e
+# One-shot database setup, then the multi-worker server
+python -m migrations
+exec gunicorn -c gunicorn.conf.py main:app
@@ -0,0 +1,52 @@
+"""Production launcher: gunicorn managing uvicorn worker processes.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+Every setting can be overridden from the environment. The app is imported
+once in the master and forked into the workers (``preload_app``); importing
+it does no I/O, so workers share the imported code without sharing
+connections. ``kill -HUP <master>`` replaces the workers one set at a time
+after re-reading this file. New code needs a new master (``kill -USR2`` then
+``kill -WINCH``/``-QUIT`` on the old one), since preloaded code is not
+re-imported on HUP.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8080")
+# One process per core; each runs its own event loop
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+# Pending connections the kernel queues while every worker is busy
+backlog = int(os.getenv("BACKLOG", "2048"))
+# Longer than a load balancer's idle timeout (60s on most), so the balancer
+# closes idle connections first and never reuses one we just dropped.
+keepalive = int(os.getenv("KEEPALIVE", "75"))
+# Workers silent this long are restarted
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+# Time a worker gets on shutdown or reload to finish requests, flush the
+# donation queue and end event streams
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+# Recycle workers now and then; jitter keeps them from restarting together
+max_requests = int(os.getenv("MAX_REQUESTS", "50000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "5000"))
+
+accesslog = os.getenv("ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
+
+# Migrations run once before the launch (entrypoint.sh), not in every worker
+raw_env = ["MIGRATE_ON_STARTUP=0"]
+
+
+def post_fork(server, worker):
+    # Connections opened in the master must not be shared with the children
+    from db import async_engine, engine
+    from replicas import replica_set
+
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+    for replica in replica_set.replicas:
+        replica.engine.sync_engine.dispose(close=False)
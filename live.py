@@ -0,0 +1,263 @@
+"""Live campaign updates pushed to browsers over Server-Sent Events.
+
+Write paths call ``live_hub.notify(campaign_id)`` after committing; that only
+marks the campaign dirty. Every ``LIVE_PUSH_INTERVAL`` seconds one task reads
+the current totals and any new comments of all dirty campaigns (one query
+each, however many viewers there are), encodes each event once and fans the
+same bytes out to every subscriber that has seen the same comments. A burst
+of donations therefore costs each viewer at most one push per interval, and
+campaigns nobody is watching cost nothing.
+
+Each subscriber starts from the newest comment its page shows (``after``),
+which may be older than other viewers' when the page came from the page
+cache, and is only sent comments newer than the last one it was sent.
+
+Notifications are per process. Every ``LIVE_RESYNC_INTERVAL`` seconds all
+watched campaigns are re-read, so changes made through other workers reach
+viewers too, just later. A subscriber that falls too far behind is dropped;
+the browser's EventSource reconnects and starts from a fresh snapshot.
+"""
+import asyncio
+import logging
+import os
+from typing import Optional
+
+import orjson
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import joinedload
+
+from db import AsyncSessionLocal
+from models import CharityCampaign, Comment, User
+
+logger = logging.getLogger("charity.live")
+
+LIVE_PUSH_INTERVAL = float(os.getenv("LIVE_PUSH_INTERVAL", "1"))
+LIVE_RESYNC_INTERVAL = float(os.getenv("LIVE_RESYNC_INTERVAL", "15"))
+# Comment lines keep proxies from closing idle streams
+LIVE_HEARTBEAT_INTERVAL = float(os.getenv("LIVE_HEARTBEAT_INTERVAL", "20"))
+LIVE_MAX_SUBSCRIBERS = int(os.getenv("LIVE_MAX_SUBSCRIBERS", "10000"))
+# Pushes a subscriber may have pending before it is dropped
+LIVE_SUBSCRIBER_BUFFER = 32
+# New comments sent per campaign per push; the rest follow on later pushes
+LIVE_MAX_COMMENTS = 20
+
+
+def sse_event(event: str, data: dict) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+def totals_event(total_amount: int, donor_count: int) -> bytes:
+    return sse_event("totals", {"total_amount": total_amount, "donor_count": donor_count})
+
+
+def comment_event(comment: Comment) -> bytes:
+    return sse_event(
+        "comment",
+        {
+            "id": comment.id,
+            "email": comment.user.email,
+            "content": comment.content,
+            "created_at": comment.created_at.strftime("%Y-%m-%d %H:%M"),
+        },
+    )
+
+
+class Subscriber:
+    def __init__(self, campaign_id: int, last_comment_id: int):
+        self.campaign_id = campaign_id
+        # Newest comment this viewer has, from the page or a push
+        self.last_comment_id = last_comment_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=LIVE_SUBSCRIBER_BUFFER)
+
+    def push(self, payload: Optional[bytes]) -> bool:
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+
+class CampaignFeed:
+    """What was last pushed for one campaign, shared by all its subscribers."""
+
+    def __init__(self, total_amount: int, donor_count: int, last_comment_id: int):
+        self.subscribers: set[Subscriber] = set()
+        self.totals = (total_amount, donor_count)
+        # Newest comment read for any subscriber
+        self.last_comment_id = last_comment_id
+
+    def seen_by_all(self) -> int:
+        """The newest comment id every subscriber already has."""
+        return min(subscriber.last_comment_id for subscriber in self.subscribers)
+
+
+class LiveHub:
+    def __init__(self, push_interval: float, resync_interval: float, max_subscribers: int):
+        self.push_interval = push_interval
+        self.resync_interval = resync_interval
+        self.max_subscribers = max_subscribers
+        self.subscriber_count = 0
+        self._feeds: dict[int, CampaignFeed] = {}
+        self._dirty: set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def notify(self, campaign_id: int) -> None:
+        """Mark a campaign as changed; safe to call from any write path."""
+        if campaign_id in self._feeds:
+            self._dirty.add(campaign_id)
+
+    def at_capacity(self) -> bool:
+        return self.subscriber_count >= self.max_subscribers
+
+    def subscribe(
+        self, campaign: CharityCampaign, last_comment_id: int
+    ) -> Optional[Subscriber]:
+        """Register a viewer; returns None when the process is at capacity."""
+        if self.at_capacity():
+            return None
+        feed = self._feeds.get(campaign.id)
+        if feed is None:
+            feed = self._feeds[campaign.id] = CampaignFeed(
+                campaign.total_amount, campaign.donor_count, last_comment_id
+            )
+        elif last_comment_id != feed.last_comment_id:
+            # Either this viewer misses comments the others were sent, or it
+            # has comments that were not pushed to the others yet
+            self._dirty.add(campaign.id)
+        subscriber = Subscriber(campaign.id, last_comment_id)
+        feed.subscribers.add(subscriber)
+        self.subscriber_count += 1
+        # The page may have been rendered from the page cache; start from
+        # the totals the hub last pushed.
+        subscriber.push(totals_event(*feed.totals))
+        self._start()
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        feed = self._feeds.get(subscriber.campaign_id)
+        if feed is None or subscriber not in feed.subscribers:
+            return
+        feed.subscribers.discard(subscriber)
+        self.subscriber_count -= 1
+        if not feed.subscribers:
+            del self._feeds[subscriber.campaign_id]
+            self._dirty.discard(subscriber.campaign_id)
+
+    async def close(self) -> None:
+        """End every open stream, e.g. on shutdown."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for feed in list(self._feeds.values()):
+            for subscriber in list(feed.subscribers):
+                self._disconnect(subscriber)
+
+    def _start(self) -> None:
+        if (
+            self._task is None
+            or self._task.done()
+            or self._task.get_loop() is not asyncio.get_running_loop()
+        ):
+            self._task = asyncio.create_task(self._run())
+
+    def _disconnect(self, subscriber: Subscriber) -> None:
+        # None tells the stream to end; make room for it if the queue is full
+        while not subscriber.push(None):
+            subscriber.queue.get_nowait()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_resync = loop.time() + self.resync_interval
+        while self._feeds:
+            await asyncio.sleep(self.push_interval)
+            if loop.time() >= next_resync:
+                self._dirty.update(self._feeds)
+                next_resync = loop.time() + self.resync_interval
+            if not self._dirty:
+                continue
+            campaign_ids, self._dirty = self._dirty, set()
+            try:
+                await self._push(campaign_ids)
+            except Exception:
+                logger.exception("Live update for %d campaign(s) failed", len(campaign_ids))
+
+    async def _push(self, campaign_ids: set[int]) -> None:
+        campaign_ids &= self._feeds.keys()
+        if not campaign_ids:
+            return
+        async with AsyncSessionLocal() as db:
+            totals = (
+                await db.execute(
+                    select(
+                        CharityCampaign.id,
+                        CharityCampaign.total_amount,
+                        CharityCampaign.donor_count,
+                    ).where(CharityCampaign.id.in_(campaign_ids))
+                )
+            ).all()
+            # Each campaign only reads comments its furthest-behind viewer lacks
+            newer = or_(
+                *(
+                    and_(
+                        Comment.campaign_id == campaign_id,
+                        Comment.id > self._feeds[campaign_id].seen_by_all(),
+                    )
+                    for campaign_id in campaign_ids
+                )
+            )
+            comments = (
+                await db.scalars(
+                    select(Comment)
+                    .options(joinedload(Comment.user).load_only(User.email))
+                    .where(newer)
+                    .order_by(Comment.id)
+                )
+            ).all()
+
+        totals_payloads: dict[int, bytes] = {}
+        for campaign_id, total_amount, donor_count in totals:
+            feed = self._feeds.get(campaign_id)
+            if feed is not None and feed.totals != (total_amount, donor_count):
+                feed.totals = (total_amount, donor_count)
+                totals_payloads[campaign_id] = totals_event(total_amount, donor_count)
+        new_comments: dict[int, list[Comment]] = {}
+        for comment in comments:
+            new_comments.setdefault(comment.campaign_id, []).append(comment)
+        events: dict[int, bytes] = {}
+
+        for campaign_id in campaign_ids:
+            feed = self._feeds.get(campaign_id)
+            if feed is None:
+                continue
+            campaign_comments = new_comments.get(campaign_id, [])
+            if campaign_comments:
+                feed.last_comment_id = max(feed.last_comment_id, campaign_comments[-1].id)
+            # Viewers that have seen the same comments get the same bytes
+            pushes: dict[int, tuple[bytes, int]] = {}
+            for subscriber in list(feed.subscribers):
+                seen = subscriber.last_comment_id
+                if seen not in pushes:
+                    unseen = [comment for comment in campaign_comments if comment.id > seen]
+                    if len(unseen) > LIVE_MAX_COMMENTS:
+                        # The rest follow on the next push
+                        unseen = unseen[:LIVE_MAX_COMMENTS]
+                        self._dirty.add(campaign_id)
+                    for comment in unseen:
+                        if comment.id not in events:
+                            events[comment.id] = comment_event(comment)
+                    payload = totals_payloads.get(campaign_id, b"") + b"".join(
+                        events[comment.id] for comment in unseen
+                    )
+                    pushes[seen] = (payload, unseen[-1].id if unseen else seen)
+                payload, subscriber.last_comment_id = pushes[seen]
+                if payload and not subscriber.push(payload):
+                    self._disconnect(subscriber)
+                    self.unsubscribe(subscriber)
+
+
+live_hub = LiveHub(
+    push_interval=LIVE_PUSH_INTERVAL,
+    resync_interval=LIVE_RESYNC_INTERVAL,
+    max_subscribers=LIVE_MAX_SUBSCRIBERS,
+)
@@ -1,32 +1,129 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from scalar_fastapi import get_scalar_api_reference
-from starlette.middleware.sessions import SessionMiddleware
 
-from db import Base, engine
+from analytics import ANALYTICS_COMPACTOR, run_compactor
+from assets import STATIC_DIR, STATIC_URL_PREFIX, FingerprintedStaticFiles
+from auth import shutdown_hash_pool, user_cache
+from compression import CompressionMiddleware
+from db import async_engine, engine, env_flag
+from donation_queue import DONATION_BATCHING, donation_writer
+from live import live_hub
+from migrations import migrate
+from metrics import MetricsMiddleware, render_metrics
+from page_cache import page_cache
+from ratelimit import AdmissionMiddleware, admission, rate_limited_total
+from replicas import ReadYourWritesMiddleware, replica_set, run_replica_monitor
 from routes.user import router as user_router
 from routes.campaign import router as campaign_router
 from routes.donation import router as donation_router
 from routes.comment import router as comment_router
+from routes.api import router as api_router
+from routes.bulk import router as bulk_router
+from routes.analytics import router as analytics_router
+from routes.search import router as search_router
+from routes.live import router as live_router
+from sessions import ServerSessionMiddleware, run_session_sweeper, session_store
+from templating import TEMPLATE_PRECOMPILE, install_bytecode_cache, precompile_templates
+
+# Convenient for a single process. Multi-worker launches (entrypoint.sh) run
+# `python -m migrations` once beforehand and turn this off.
+MIGRATE_ON_STARTUP = env_flag("MIGRATE_ON_STARTUP", True)
 
-Base.metadata.create_all(bind=engine)
 
-app = FastAPI(
-    title="Charity Fundraising API",
-    description="API for managing charity campaigns, donations, and comments.",
-    version="1.0.0",
-)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if MIGRATE_ON_STARTUP:
+        await asyncio.to_thread(migrate, engine)
+    install_bytecode_cache()
+    if TEMPLATE_PRECOMPILE:
+        precompile_templates()
+    if DONATION_BATCHING:
+        donation_writer.start()
+    background = [asyncio.create_task(run_session_sweeper())]
+    if ANALYTICS_COMPACTOR:
+        background.append(asyncio.create_task(run_compactor()))
+    if replica_set:
+        background.append(asyncio.create_task(run_replica_monitor()))
+    yield
+    # End any event streams still open
+    await live_hub.close()
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    # Flush queued donations before the process exits
+    await donation_writer.drain()
+    shutdown_hash_pool()
+    await replica_set.dispose()
 
 
-@app.get("/scalar", include_in_schema=False)
-async def scalar_html():
+async def scalar_html(request: Request):
     return get_scalar_api_reference(
-        openapi_url=app.openapi_url,
-        title=app.title,
+        openapi_url=request.app.openapi_url,
+        title=request.app.title,
+    )
+
+
+async def metrics():
+    # Prometheus text format; counters are per worker process.
+    gauges = {
+        "live_subscribers": live_hub.subscriber_count,
+        "requests_in_flight": admission.in_flight,
+        "requests_waiting": admission.waiting,
+        "requests_shed_total": admission.shed,
+        "requests_rate_limited_total": rate_limited_total(),
+    }
+    if replica_set:
+        gauges["db_replicas_healthy"] = replica_set.healthy_count
+        if replica_set.max_lag is not None:
+            gauges["db_replica_lag_seconds"] = round(replica_set.max_lag, 3)
+    if hasattr(async_engine.pool, "checkedout"):  # not on StaticPool
+        gauges["db_pool_checked_out"] = async_engine.pool.checkedout()
+    for name, cache in (("user_cache", user_cache), ("page_cache", page_cache)):
+        for key, value in cache.stats().items():
+            if value is not None:
+                gauges[f"{name}_{key}"] = value
+    return PlainTextResponse(
+        render_metrics(gauges), media_type="text/plain; version=0.0.4"
     )
 
-app.add_middleware(SessionMiddleware, secret_key="CHANGE_ME_SECRET_KEY")
 
-app.include_router(user_router)
-app.include_router(campaign_router)
-app.include_router(donation_router)
-app.include_router(comment_router)
\ No newline at end of file
+def create_app() -> FastAPI:
+    """Build the application. Touches no database or file; that waits for
+    the lifespan, so importing this module (e.g. in a preloading server
+    before it forks workers) is cheap and safe."""
+    app = FastAPI(
+        title="Charity Fundraising API",
+        description="API for managing charity campaigns, donations, and comments.",
+        version="1.0.0",
+        lifespan=lifespan,
+    )
+    app.add_api_route("/scalar", scalar_html, methods=["GET"], include_in_schema=False)
+    app.add_api_route("/metrics", metrics, methods=["GET"], include_in_schema=False)
+
+    app.add_middleware(ServerSessionMiddleware, store=session_store)
+    if replica_set:
+        app.add_middleware(ReadYourWritesMiddleware)
+    # Shed load before a session is loaded or a handler runs
+    app.add_middleware(AdmissionMiddleware, admission=admission)
+    app.add_middleware(CompressionMiddleware)
+    app.add_middleware(MetricsMiddleware)
+
+    app.mount(STATIC_URL_PREFIX, FingerprintedStaticFiles(directory=STATIC_DIR, check_dir=False), name="static")
+
+    app.include_router(user_router)
+    app.include_router(campaign_router)
+    app.include_router(donation_router)
+    app.include_router(comment_router)
+    app.include_router(api_router)
+    app.include_router(bulk_router)
+    app.include_router(analytics_router)
+    app.include_router(search_router)
+    app.include_router(live_router)
+    return app
+
+
+app = create_app()
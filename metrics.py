@@ -0,0 +1,214 @@
+"""Per-request timing and query counting, exported in Prometheus text format.
+
+``MetricsMiddleware`` opens a ``RequestStats`` for every HTTP request; the
+SQLAlchemy hooks and pool classes in db.py and the template class in
+templating.py add to it through a context variable. Finished requests feed
+the histograms that ``GET /metrics`` renders. Numbers are per worker process.
+
+Settings:
+    SERVER_TIMING=1                 add a Server-Timing header to responses
+    QUERY_COUNT_WARN_THRESHOLD=N    log requests that run more than N queries
+"""
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Optional
+
+logger = logging.getLogger("charity.metrics")
+
+# db.py imports this module for its hooks, so parse the flag here rather
+# than borrow db.env_flag.
+SERVER_TIMING = os.getenv("SERVER_TIMING", "").strip().lower() in ("1", "true", "yes", "on")
+QUERY_COUNT_WARN_THRESHOLD = int(os.getenv("QUERY_COUNT_WARN_THRESHOLD", "0"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    sql_seconds: float = 0.0
+    template_seconds: float = 0.0
+    pool_wait_seconds: float = 0.0
+    hash_seconds: float = 0.0
+    statements: list[str] = field(default_factory=list)
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: tuple, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.labels = labels
+        # label values -> (bucket counts, sum, count)
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            series = self._series.setdefault(
+                label_values, [[0] * len(self.buckets), 0.0, 0]
+            )
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (bucket_counts, total, count) in sorted(self._series.items()):
+                labels = [f'{k}="{v}"' for k, v in zip(self.labels, label_values)]
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    cumulative += bucket_count
+                    le = ",".join(labels + [f'le="{bound}"'])
+                    lines.append(f"{self.name}_bucket{{{le}}} {cumulative}")
+                le = ",".join(labels + ['le="+Inf"'])
+                lines.append(f"{self.name}_bucket{{{le}}} {count}")
+                suffix = "{" + ",".join(labels) + "}" if labels else ""
+                lines.append(f"{self.name}_sum{suffix} {total}")
+                lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+request_latency = Histogram(
+    "http_request_duration_seconds", "Request latency by route.",
+    LATENCY_BUCKETS, ("method", "route", "status"),
+)
+request_queries = Histogram(
+    "http_request_sql_queries", "SQL statements executed per request.",
+    COUNT_BUCKETS, ("method", "route"),
+)
+request_sql_time = Histogram(
+    "http_request_sql_seconds", "Cumulative SQL time per request.",
+    LATENCY_BUCKETS, ("method", "route"),
+)
+request_template_time = Histogram(
+    "http_request_template_seconds", "Template render time per request.",
+    LATENCY_BUCKETS, ("method", "route"),
+)
+request_hash_time = Histogram(
+    "http_request_password_hash_seconds", "bcrypt time per request, including queueing.",
+    LATENCY_BUCKETS, ("method", "route"),
+)
+pool_wait_time = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.",
+    LATENCY_BUCKETS,
+)
+
+HISTOGRAMS = (
+    request_latency,
+    request_queries,
+    request_sql_time,
+    request_template_time,
+    request_hash_time,
+    pool_wait_time,
+)
+
+
+def record_query(seconds: float, statement: str) -> None:
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.sql_seconds += seconds
+        if QUERY_COUNT_WARN_THRESHOLD:
+            stats.statements.append(statement)
+
+
+def record_template(seconds: float) -> None:
+    stats = _current.get()
+    if stats is not None:
+        stats.template_seconds += seconds
+
+
+def record_hash(seconds: float) -> None:
+    stats = _current.get()
+    if stats is not None:
+        stats.hash_seconds += seconds
+
+
+def record_pool_wait(seconds: float) -> None:
+    pool_wait_time.observe(seconds)
+    stats = _current.get()
+    if stats is not None:
+        stats.pool_wait_seconds += seconds
+
+
+def server_timing(stats: RequestStats, total: float) -> str:
+    return (
+        f'sql;dur={stats.sql_seconds * 1000:.1f};desc="{stats.queries} queries", '
+        f"tpl;dur={stats.template_seconds * 1000:.1f}, "
+        f"pool;dur={stats.pool_wait_seconds * 1000:.1f}, "
+        f"hash;dur={stats.hash_seconds * 1000:.1f}, "
+        f"total;dur={total * 1000:.1f}"
+    )
+
+
+def route_label(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if SERVER_TIMING:
+                    header = server_timing(stats, time.perf_counter() - started)
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", header.encode("latin-1"))
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - started
+            method, route = scope["method"], route_label(scope)
+            request_latency.observe(elapsed, method, route, str(status_code))
+            request_queries.observe(stats.queries, method, route)
+            request_sql_time.observe(stats.sql_seconds, method, route)
+            request_template_time.observe(stats.template_seconds, method, route)
+            if stats.hash_seconds:
+                request_hash_time.observe(stats.hash_seconds, method, route)
+            if QUERY_COUNT_WARN_THRESHOLD and stats.queries > QUERY_COUNT_WARN_THRESHOLD:
+                logger.warning(
+                    "%s %s ran %d SQL queries (threshold %d):\n%s",
+                    method, scope["path"], stats.queries, QUERY_COUNT_WARN_THRESHOLD,
+                    "\n".join(stats.statements),
+                )
+
+
+def render_metrics(extra_gauges: dict[str, float]) -> str:
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    for name, value in extra_gauges.items():
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
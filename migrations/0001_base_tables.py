@@ -0,0 +1,51 @@
+"""Users, campaigns, donations and comments, as first created."""
+from sqlalchemy import Column, Connection, DateTime, ForeignKey, Integer, MetaData, String, Table, Text
+
+from migrations.ops import create_table
+
+metadata = MetaData()
+
+users = Table(
+    "users",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("email", String, unique=True, index=True, nullable=False),
+    Column("hashed_password", String, nullable=False),
+    Column("role", String, nullable=False),
+)
+
+charity_campaigns = Table(
+    "charity_campaigns",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("title", String, nullable=False),
+    Column("description", Text, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("created_by_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("status", String, nullable=False),
+)
+
+donations = Table(
+    "donations",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("campaign_id", Integer, ForeignKey("charity_campaigns.id"), nullable=False),
+    Column("amount", Integer, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+)
+
+comments = Table(
+    "comments",
+    metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("content", Text, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("campaign_id", Integer, ForeignKey("charity_campaigns.id"), nullable=False),
+)
+
+
+def upgrade(conn: Connection) -> None:
+    for table in (users, charity_campaigns, donations, comments):
+        create_table(conn, table)
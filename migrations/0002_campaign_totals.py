@@ -0,0 +1,32 @@
+"""Running donation totals on campaigns, backfilled from the ledger."""
+from sqlalchemy import Column, Connection, Integer, MetaData, Table, text
+
+from migrations.ops import add_column
+
+charity_campaigns = Table(
+    "charity_campaigns",
+    MetaData(),
+    Column("total_amount", Integer, nullable=False, server_default="0"),
+    Column("donor_count", Integer, nullable=False, server_default="0"),
+)
+
+
+def upgrade(conn: Connection) -> None:
+    added = add_column(conn, charity_campaigns.c.total_amount)
+    added = add_column(conn, charity_campaigns.c.donor_count) or added
+    if added:
+        conn.execute(
+            text(
+                """
+                UPDATE charity_campaigns SET
+                    total_amount = (
+                        SELECT COALESCE(SUM(amount), 0) FROM donations
+                        WHERE donations.campaign_id = charity_campaigns.id
+                    ),
+                    donor_count = (
+                        SELECT COUNT(DISTINCT user_id) FROM donations
+                        WHERE donations.campaign_id = charity_campaigns.id
+                    )
+                """
+            )
+        )
@@ -0,0 +1,66 @@
+"""Composite indexes for the listing, detail and history queries.
+
+- campaigns (status, created_at, id): open campaigns, newest first (``/``,
+  ``/api/v1/campaigns``)
+- campaigns (created_at, id): the admin list of all campaigns
+- donations (campaign_id, user_id): "has this user donated here before" when
+  counting donors, and per-campaign donation lookups
+- donations (user_id, created_at, id): ``/me/donations`` and the per-campaign
+  rollup of a user's donations
+- comments (campaign_id, created_at, id): a campaign's comment thread
+"""
+from sqlalchemy import Column, Connection, DateTime, Index, Integer, MetaData, String, Table
+
+from migrations.ops import create_index
+
+metadata = MetaData()
+charity_campaigns = Table(
+    "charity_campaigns",
+    metadata,
+    Column("id", Integer),
+    Column("status", String),
+    Column("created_at", DateTime),
+)
+donations = Table(
+    "donations",
+    metadata,
+    Column("id", Integer),
+    Column("user_id", Integer),
+    Column("campaign_id", Integer),
+    Column("created_at", DateTime),
+)
+comments = Table(
+    "comments",
+    metadata,
+    Column("id", Integer),
+    Column("campaign_id", Integer),
+    Column("created_at", DateTime),
+)
+
+INDEXES = [
+    Index(
+        "ix_charity_campaigns_status_created_at_id",
+        charity_campaigns.c.status,
+        charity_campaigns.c.created_at,
+        charity_campaigns.c.id,
+    ),
+    Index("ix_charity_campaigns_created_at_id", charity_campaigns.c.created_at, charity_campaigns.c.id),
+    Index("ix_donations_campaign_id_user_id", donations.c.campaign_id, donations.c.user_id),
+    Index(
+        "ix_donations_user_id_created_at_id",
+        donations.c.user_id,
+        donations.c.created_at,
+        donations.c.id,
+    ),
+    Index(
+        "ix_comments_campaign_id_created_at_id",
+        comments.c.campaign_id,
+        comments.c.created_at,
+        comments.c.id,
+    ),
+]
+
+
+def upgrade(conn: Connection) -> None:
+    for index in INDEXES:
+        create_index(conn, index)
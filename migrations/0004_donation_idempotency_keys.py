@@ -0,0 +1,24 @@
+"""Idempotency keys on donations, unique per user."""
+from sqlalchemy import Column, Connection, Index, Integer, MetaData, String, Table
+
+from migrations.ops import add_column, create_index
+
+donations = Table(
+    "donations",
+    MetaData(),
+    Column("user_id", Integer),
+    Column("idempotency_key", String(64), nullable=True),
+)
+
+
+def upgrade(conn: Connection) -> None:
+    add_column(conn, donations.c.idempotency_key)
+    create_index(
+        conn,
+        Index(
+            "ux_donations_user_id_idempotency_key",
+            donations.c.user_id,
+            donations.c.idempotency_key,
+            unique=True,
+        ),
+    )
@@ -0,0 +1,66 @@
+"""Analytics rollup tables; the compactor fills them from the ledger."""
+from sqlalchemy import (
+    Column,
+    Connection,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    MetaData,
+    PrimaryKeyConstraint,
+    String,
+    Table,
+)
+
+from migrations.ops import create_table, referenced
+
+metadata = MetaData()
+referenced(metadata, "users", "charity_campaigns")
+
+donation_rollups = Table(
+    "donation_rollups",
+    metadata,
+    Column("campaign_id", Integer, ForeignKey("charity_campaigns.id"), nullable=False),
+    Column("granularity", String(8), nullable=False),
+    Column("bucket_start", DateTime, nullable=False),
+    Column("total_amount", Integer, nullable=False),
+    Column("donation_count", Integer, nullable=False),
+    Column("donor_count", Integer, nullable=False),
+    PrimaryKeyConstraint("campaign_id", "granularity", "bucket_start"),
+)
+
+donation_rollup_donors = Table(
+    "donation_rollup_donors",
+    metadata,
+    Column("campaign_id", Integer, nullable=False),
+    Column("granularity", String(8), nullable=False),
+    Column("bucket_start", DateTime, nullable=False),
+    Column("user_id", Integer, nullable=False),
+    PrimaryKeyConstraint("campaign_id", "granularity", "bucket_start", "user_id"),
+)
+
+campaign_donors = Table(
+    "campaign_donors",
+    metadata,
+    Column("campaign_id", Integer, ForeignKey("charity_campaigns.id"), nullable=False),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("total_amount", Integer, nullable=False),
+    Column("donation_count", Integer, nullable=False),
+    Column("first_donated_at", DateTime, nullable=False),
+    Column("last_donated_at", DateTime, nullable=False),
+    PrimaryKeyConstraint("campaign_id", "user_id"),
+    Index("ix_campaign_donors_campaign_id_total_amount", "campaign_id", "total_amount"),
+)
+
+rollup_watermarks = Table(
+    "rollup_watermarks",
+    metadata,
+    Column("name", String, primary_key=True),
+    Column("last_id", Integer, nullable=False),
+    Column("seen_max_id", Integer, nullable=False),
+)
+
+
+def upgrade(conn: Connection) -> None:
+    for table in (donation_rollups, donation_rollup_donors, campaign_donors, rollup_watermarks):
+        create_table(conn, table)
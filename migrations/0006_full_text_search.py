@@ -0,0 +1,101 @@
+"""Full-text indexes over campaigns and comments; see search.py.
+
+Idempotent, and each index is backfilled the first time it is created.
+"""
+from sqlalchemy import Connection, text
+
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE campaigns_fts USING fts5(
+        title, description,
+        content='charity_campaigns', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    # Only title/description changes touch the index; totals are updated
+    # on every donation.
+    """
+    CREATE TRIGGER IF NOT EXISTS charity_campaigns_fts_insert AFTER INSERT ON charity_campaigns BEGIN
+        INSERT INTO campaigns_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS charity_campaigns_fts_delete AFTER DELETE ON charity_campaigns BEGIN
+        INSERT INTO campaigns_fts(campaigns_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS charity_campaigns_fts_update
+    AFTER UPDATE OF title, description ON charity_campaigns BEGIN
+        INSERT INTO campaigns_fts(campaigns_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO campaigns_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    "INSERT INTO campaigns_fts(campaigns_fts) VALUES ('rebuild')",
+]
+
+SQLITE_COMMENTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE comments_fts USING fts5(
+        content,
+        content='comments', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS comments_fts_insert AFTER INSERT ON comments BEGIN
+        INSERT INTO comments_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS comments_fts_delete AFTER DELETE ON comments BEGIN
+        INSERT INTO comments_fts(comments_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS comments_fts_update AFTER UPDATE OF content ON comments BEGIN
+        INSERT INTO comments_fts(comments_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO comments_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    "INSERT INTO comments_fts(comments_fts) VALUES ('rebuild')",
+]
+
+POSTGRESQL_DDL = [
+    """
+    ALTER TABLE charity_campaigns ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_charity_campaigns_search_vector "
+    "ON charity_campaigns USING GIN (search_vector)",
+    """
+    ALTER TABLE comments ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (to_tsvector('english', coalesce(content, ''))) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_comments_search_vector ON comments USING GIN (search_vector)",
+]
+
+
+def upgrade(conn: Connection) -> None:
+    if conn.dialect.name == "postgresql":
+        for statement in POSTGRESQL_DDL:
+            conn.execute(text(statement))
+        return
+    existing = set(
+        conn.scalars(
+            text("SELECT name FROM sqlite_master WHERE name IN ('campaigns_fts', 'comments_fts')")
+        )
+    )
+    # The backfill must run only when the index is new, so each index is
+    # created (and rebuilt) only when missing.
+    if "campaigns_fts" not in existing:
+        for statement in SQLITE_DDL:
+            conn.execute(text(statement))
+    if "comments_fts" not in existing:
+        for statement in SQLITE_COMMENTS_DDL:
+            conn.execute(text(statement))
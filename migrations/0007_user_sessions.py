@@ -0,0 +1,20 @@
+"""Server-side sessions; see sessions.py."""
+from sqlalchemy import Column, Connection, DateTime, ForeignKey, Integer, MetaData, String, Table, Text
+
+from migrations.ops import create_table, referenced
+
+metadata = MetaData()
+referenced(metadata, "users")
+
+user_sessions = Table(
+    "user_sessions",
+    metadata,
+    Column("id", String(64), primary_key=True),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=True, index=True),
+    Column("data", Text, nullable=False),
+    Column("expires_at", DateTime, nullable=False, index=True),
+)
+
+
+def upgrade(conn: Connection) -> None:
+    create_table(conn, user_sessions)
@@ -0,0 +1,18 @@
+"""Heartbeat row for measuring read-replica lag; see replicas.py."""
+from sqlalchemy import Column, Connection, Float, Integer, MetaData, Table, insert, select
+
+from migrations.ops import create_table
+
+replication_heartbeat = Table(
+    "replication_heartbeat",
+    MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("beat_at", Float, nullable=False),
+)
+
+
+def upgrade(conn: Connection) -> None:
+    create_table(conn, replication_heartbeat)
+    heartbeat = replication_heartbeat.c
+    if conn.scalar(select(heartbeat.id).where(heartbeat.id == 1)) is None:
+        conn.execute(insert(replication_heartbeat).values(id=1, beat_at=0))
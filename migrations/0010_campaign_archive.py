@@ -0,0 +1,72 @@
+"""Archive tables for closed campaigns' donations and comments; see archive.py.
+
+Campaigns already closed get ``closed_at`` set to now, since when they were
+closed is not recorded; they become due for archiving ``ARCHIVE_AFTER_DAYS``
+from the upgrade.
+"""
+from datetime import datetime
+
+from sqlalchemy import (
+    Column,
+    Connection,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    update,
+)
+
+from migrations.ops import add_column, create_table, referenced
+
+metadata = MetaData()
+referenced(metadata, "users")
+
+charity_campaigns = Table(
+    "charity_campaigns",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("status", String),
+    Column("closed_at", DateTime, nullable=True),
+    Column("archived_at", DateTime, nullable=True),
+)
+
+donations_archive = Table(
+    "donations_archive",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=False),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("campaign_id", Integer, ForeignKey("charity_campaigns.id"), nullable=False),
+    Column("amount", Integer, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("idempotency_key", String(64), nullable=True),
+    Column("archived_at", DateTime, nullable=False),
+    Index("ix_donations_archive_campaign_id_id", "campaign_id", "id"),
+)
+
+comments_archive = Table(
+    "comments_archive",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=False),
+    Column("content", Text, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("campaign_id", Integer, ForeignKey("charity_campaigns.id"), nullable=False),
+    Column("archived_at", DateTime, nullable=False),
+    Index("ix_comments_archive_campaign_id_created_at_id", "campaign_id", "created_at", "id"),
+)
+
+
+def upgrade(conn: Connection) -> None:
+    if add_column(conn, charity_campaigns.c.closed_at):
+        conn.execute(
+            update(charity_campaigns)
+            .where(charity_campaigns.c.status == "closed")
+            .values(closed_at=datetime.utcnow())
+        )
+    add_column(conn, charity_campaigns.c.archived_at)
+    create_table(conn, donations_archive)
+    create_table(conn, comments_archive)
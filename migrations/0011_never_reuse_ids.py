@@ -0,0 +1,97 @@
+"""Never reuse donation and comment ids on SQLite.
+
+Without ``AUTOINCREMENT`` SQLite gives a new row ``max(id) + 1`` of the rows
+left, so once the newest rows are archived or deleted a new donation or
+comment could take an id already in the archive tables. The two tables are
+rebuilt with ``AUTOINCREMENT`` (keeping their indexes and triggers) and
+their sequences start above every id in the hot and archive tables.
+PostgreSQL sequences never hand out an id twice, so there is nothing to do.
+"""
+from sqlalchemy import (
+    Column,
+    Connection,
+    DateTime,
+    ForeignKey,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    text,
+)
+
+from migrations.ops import referenced
+
+metadata = MetaData()
+referenced(metadata, "users", "charity_campaigns")
+
+# The tables as rebuilt, under a temporary name
+donations = Table(
+    "donations_rebuilt",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("campaign_id", Integer, ForeignKey("charity_campaigns.id"), nullable=False),
+    Column("amount", Integer, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("idempotency_key", String(64), nullable=True),
+    sqlite_autoincrement=True,
+)
+
+comments = Table(
+    "comments_rebuilt",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("content", Text, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("campaign_id", Integer, ForeignKey("charity_campaigns.id"), nullable=False),
+    sqlite_autoincrement=True,
+)
+
+# (table, archive table, rebuilt table)
+REBUILT = (
+    ("donations", "donations_archive", donations),
+    ("comments", "comments_archive", comments),
+)
+
+
+def rebuild(conn: Connection, name: str, rebuilt: Table) -> None:
+    table_sql = conn.scalar(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": name}
+    )
+    if "AUTOINCREMENT" in table_sql.upper():
+        return
+    # Dropping the table drops these; they are recreated as they were
+    dependents = list(
+        conn.scalars(
+            text(
+                "SELECT sql FROM sqlite_master "
+                "WHERE type IN ('index', 'trigger') AND tbl_name = :name AND sql IS NOT NULL "
+                "ORDER BY type"
+            ),
+            {"name": name},
+        )
+    )
+    rebuilt.create(conn)
+    columns = ", ".join(column.name for column in rebuilt.c)
+    conn.execute(text(f"INSERT INTO {rebuilt.name} ({columns}) SELECT {columns} FROM {name}"))
+    conn.execute(text(f"DROP TABLE {name}"))
+    conn.execute(text(f"ALTER TABLE {rebuilt.name} RENAME TO {name}"))
+    for statement in dependents:
+        conn.execute(text(statement))
+
+
+def upgrade(conn: Connection) -> None:
+    if conn.dialect.name != "sqlite":
+        return
+    for name, archive, rebuilt in REBUILT:
+        rebuild(conn, name, rebuilt)
+        highest = max(
+            conn.scalar(text(f"SELECT MAX(id) FROM {table}")) or 0 for table in (name, archive)
+        )
+        conn.execute(text("DELETE FROM sqlite_sequence WHERE name = :name"), {"name": name})
+        conn.execute(
+            text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"),
+            {"name": name, "seq": highest},
+        )
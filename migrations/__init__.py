@@ -0,0 +1,80 @@
+"""Versioned schema migrations.
+
+Each ``migrations/NNNN_name.py`` module defines ``upgrade(conn)``. ``migrate``
+applies, in order, every migration not yet recorded in the
+``schema_migrations`` table, each in its own transaction.
+
+The operations in ``migrations.ops`` skip tables, columns and indexes that
+already exist, so databases created by the old ``create_all`` at startup are
+brought up to date the same way as empty ones.
+
+    python -m migrations            # apply pending migrations
+    python -m migrations status     # list applied and pending migrations
+"""
+import importlib
+import pkgutil
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from types import ModuleType
+
+from sqlalchemy import Column, DateTime, Engine, Integer, MetaData, String, Table, insert, select
+
+MIGRATION_NAME = re.compile(r"^(\d{4})_\w+$")
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    module: ModuleType
+
+
+def discover() -> list[Migration]:
+    migrations = []
+    for info in pkgutil.iter_modules(__path__):
+        match = MIGRATION_NAME.match(info.name)
+        if match:
+            module = importlib.import_module(f"{__name__}.{info.name}")
+            migrations.append(Migration(int(match.group(1)), info.name, module))
+    migrations.sort(key=lambda migration: migration.version)
+    versions = [migration.version for migration in migrations]
+    if len(set(versions)) != len(versions):
+        raise RuntimeError(f"Duplicate migration versions: {versions}")
+    return migrations
+
+
+def applied_versions(engine: Engine) -> set[int]:
+    with engine.begin() as conn:
+        schema_migrations.create(conn, checkfirst=True)
+        return set(conn.scalars(select(schema_migrations.c.version)))
+
+
+def pending(engine: Engine) -> list[Migration]:
+    applied = applied_versions(engine)
+    return [migration for migration in discover() if migration.version not in applied]
+
+
+def migrate(engine: Engine) -> list[Migration]:
+    """Apply pending migrations; returns the ones that ran."""
+    ran = []
+    for migration in pending(engine):
+        with engine.begin() as conn:
+            migration.module.upgrade(conn)
+            conn.execute(
+                insert(schema_migrations).values(
+                    version=migration.version,
+                    name=migration.name,
+                    applied_at=datetime.utcnow(),
+                )
+            )
+        ran.append(migration)
+    return ran
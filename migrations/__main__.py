@@ -0,0 +1,27 @@
+import argparse
+
+from db import engine
+from migrations import applied_versions, discover, migrate
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Apply or list schema migrations.")
+    parser.add_argument("command", nargs="?", choices=["upgrade", "status"], default="upgrade")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        applied = applied_versions(engine)
+        for migration in discover():
+            state = "applied" if migration.version in applied else "pending"
+            print(f"{migration.name}: {state}")
+        return
+
+    ran = migrate(engine)
+    for migration in ran:
+        print(f"Applied {migration.name}")
+    if not ran:
+        print("Schema is up to date.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Idempotent schema operations for migrations.
+
+Each migration declares the tables, columns and indexes it creates as they
+were at that version, on a ``MetaData`` of its own, and never reads them from
+``models``: a later model change must not change what an old migration does.
+Anything that already exists is left alone, so databases created by the old
+``create_all`` at startup go through the same steps as empty ones.
+"""
+from sqlalchemy import Column, Connection, Index, Integer, MetaData, Table, inspect, text
+from sqlalchemy.schema import CreateColumn
+
+
+def referenced(metadata: MetaData, *names: str) -> None:
+    """Declare tables a migration's foreign keys point at, without creating them."""
+    for name in names:
+        Table(name, metadata, Column("id", Integer, primary_key=True))
+
+
+def create_table(conn: Connection, table: Table) -> None:
+    # Creates the table's indexes along with it
+    table.create(conn, checkfirst=True)
+
+
+def has_column(conn: Connection, table: str, column: str) -> bool:
+    return any(info["name"] == column for info in inspect(conn).get_columns(table))
+
+
+def add_column(conn: Connection, column: Column) -> bool:
+    """Add a column of a migration's table to the existing table; returns
+    whether it was missing."""
+    table = column.table.name
+    if has_column(conn, table, column.name):
+        return False
+    definition = CreateColumn(column).compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {definition}"))
+    return True
+
+
+def create_index(conn: Connection, index: Index) -> None:
+    index.create(conn, checkfirst=True)
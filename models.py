@@ -3,8 +3,11 @@ from datetime import datetime
 from sqlalchemy import (
     Column,
     DateTime,
+    Float,
     ForeignKey,
+    Index,
     Integer,
+    PrimaryKeyConstraint,
     String,
     Text,
 )
@@ -26,6 +29,11 @@ class User(Base):
 
 class CharityCampaign(Base):
     __tablename__ = "charity_campaigns"
+    __table_args__ = (
+        # Keyset pagination on (created_at, id) for the homepage and admin list
+        Index("ix_charity_campaigns_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_charity_campaigns_created_at_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
@@ -33,18 +41,41 @@ class CharityCampaign(Base):
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     created_by_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     status = Column(String, nullable=False, default="open")  # "open" or "closed"
+    # Running aggregates maintained by totals.record_donations; see totals.py
+    total_amount = Column(Integer, nullable=False, default=0, server_default="0")
+    donor_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Set while closed; archive.py moves the rows of long-closed campaigns
+    closed_at = Column(DateTime, nullable=True)
+    # Last time archive.py moved rows of this campaign to the archive tables
+    archived_at = Column(DateTime, nullable=True)
 
     donations = relationship("Donation", back_populates="campaign")
     comments = relationship("Comment", back_populates="campaign")
 
 class Donation(Base):
     __tablename__ = "donations"
+    __table_args__ = (
+        Index("ix_donations_campaign_id_user_id", "campaign_id", "user_id"),
+        # Per-user donation history, newest first
+        Index("ix_donations_user_id_created_at_id", "user_id", "created_at", "id"),
+        # Retries carrying the same Idempotency-Key record one donation
+        Index(
+            "ux_donations_user_id_idempotency_key",
+            "user_id",
+            "idempotency_key",
+            unique=True,
+        ),
+        # Ids are never reused, even after the newest rows are archived or
+        # deleted, so hot and archived ids can't collide
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     campaign_id = Column(Integer, ForeignKey("charity_campaigns.id"), nullable=False)
     amount = Column(Integer, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    idempotency_key = Column(String(64), nullable=True)
 
     user = relationship("User", back_populates="donations")
     campaign = relationship("CharityCampaign", back_populates="donations")
@@ -53,6 +84,12 @@ class Donation(Base):
 
 class Comment(Base):
     __tablename__ = "comments"
+    __table_args__ = (
+        # Newest-first comment thread per campaign
+        Index("ix_comments_campaign_id_created_at_id", "campaign_id", "created_at", "id"),
+        # As for donations
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     content = Column(Text, nullable=False)
@@ -61,4 +98,115 @@ class Comment(Base):
     campaign_id = Column(Integer, ForeignKey("charity_campaigns.id"), nullable=False)
 
     user = relationship("User", back_populates="comments")
-    campaign = relationship("CharityCampaign", back_populates="comments")
\ No newline at end of file
+    campaign = relationship("CharityCampaign", back_populates="comments")
+
+
+class ArchivedDonation(Base):
+    # Donations of long-closed campaigns, moved out of ``donations`` by
+    # archive.py with their ids kept
+    __tablename__ = "donations_archive"
+    __table_args__ = (
+        Index("ix_donations_archive_campaign_id_id", "campaign_id", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    campaign_id = Column(Integer, ForeignKey("charity_campaigns.id"), nullable=False)
+    amount = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    idempotency_key = Column(String(64), nullable=True)
+    archived_at = Column(DateTime, nullable=False)
+
+
+class ArchivedComment(Base):
+    # Comments of long-closed campaigns; see ArchivedDonation
+    __tablename__ = "comments_archive"
+    __table_args__ = (
+        Index("ix_comments_archive_campaign_id_created_at_id", "campaign_id", "created_at", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    campaign_id = Column(Integer, ForeignKey("charity_campaigns.id"), nullable=False)
+    archived_at = Column(DateTime, nullable=False)
+
+
+# Analytics rollups, maintained from the donations ledger by analytics.py
+
+
+class DonationRollup(Base):
+    __tablename__ = "donation_rollups"
+    __table_args__ = (
+        PrimaryKeyConstraint("campaign_id", "granularity", "bucket_start"),
+        # Top campaigns over a time range, across all campaigns
+        Index("ix_donation_rollups_granularity_bucket_start", "granularity", "bucket_start"),
+    )
+
+    campaign_id = Column(Integer, ForeignKey("charity_campaigns.id"), nullable=False)
+    granularity = Column(String(8), nullable=False)  # "hour" or "day"
+    bucket_start = Column(DateTime, nullable=False)
+    total_amount = Column(Integer, nullable=False, default=0)
+    donation_count = Column(Integer, nullable=False, default=0)
+    donor_count = Column(Integer, nullable=False, default=0)
+
+
+class DonationRollupDonor(Base):
+    # Who has donated in each bucket, so donor_count stays distinct across
+    # compaction runs
+    __tablename__ = "donation_rollup_donors"
+    __table_args__ = (
+        PrimaryKeyConstraint("campaign_id", "granularity", "bucket_start", "user_id"),
+    )
+
+    campaign_id = Column(Integer, nullable=False)
+    granularity = Column(String(8), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    user_id = Column(Integer, nullable=False)
+
+
+class CampaignDonor(Base):
+    __tablename__ = "campaign_donors"
+    __table_args__ = (
+        PrimaryKeyConstraint("campaign_id", "user_id"),
+        # Top donors per campaign
+        Index("ix_campaign_donors_campaign_id_total_amount", "campaign_id", "total_amount"),
+    )
+
+    campaign_id = Column(Integer, ForeignKey("charity_campaigns.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    total_amount = Column(Integer, nullable=False, default=0)
+    donation_count = Column(Integer, nullable=False, default=0)
+    first_donated_at = Column(DateTime, nullable=False)
+    last_donated_at = Column(DateTime, nullable=False)
+
+
+class RollupWatermark(Base):
+    __tablename__ = "rollup_watermarks"
+
+    name = Column(String, primary_key=True)
+    # Donations with id <= last_id are in the rollups
+    last_id = Column(Integer, nullable=False, default=0)
+    # Highest donation id seen by the previous run; see analytics.compact
+    seen_max_id = Column(Integer, nullable=False, default=0)
+
+class UserSession(Base):
+    # Server-side sessions (sessions.DatabaseSessionStore). The cookie holds
+    # the session token; only its SHA-256 is stored here.
+    __tablename__ = "user_sessions"
+
+    id = Column(String(64), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    data = Column(Text, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class ReplicationHeartbeat(Base):
+    # One row, stamped on the primary every REPLICA_CHECK_INTERVAL; how old it
+    # looks on a replica is that replica's lag (replicas.py).
+    __tablename__ = "replication_heartbeat"
+
+    id = Column(Integer, primary_key=True)
+    # time.time() of the writing app process, so database clocks don't matter
+    beat_at = Column(Float, nullable=False, default=0)
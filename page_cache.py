@@ -0,0 +1,87 @@
+"""Rendered-page cache for anonymous visitors.
+
+Only ``/`` and ``/campaigns/{id}`` are cached, keyed by path and query string,
+and only for requests without a logged-in user. Write routes call
+``invalidate_listing`` / ``invalidate_campaign`` after committing; the TTL
+bounds staleness for changes made by other worker processes.
+"""
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import Request, Response, status
+
+from cache import TTLCache
+
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", "30"))
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "5000"))
+PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+@dataclass(frozen=True)
+class CachedPage:
+    body: bytes
+    etag: str
+    media_type: str
+
+
+page_cache = TTLCache(
+    max_entries=PAGE_CACHE_MAX_ENTRIES,
+    ttl=PAGE_CACHE_TTL,
+    max_bytes=PAGE_CACHE_MAX_BYTES,
+    sizeof=lambda page: len(page.body),
+)
+
+
+def cache_key(request: Request) -> tuple[str, str]:
+    return request.url.path, request.url.query
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def page_response(request: Request, page: CachedPage) -> Response:
+    headers = {
+        "ETag": page.etag,
+        # Revalidate with If-None-Match every time; the body differs for
+        # logged-in users, hence Vary.
+        "Cache-Control": "no-cache",
+        "Vary": "Cookie",
+    }
+    if etag_matches(request, page.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=page.body, media_type=page.media_type, headers=headers)
+
+
+def cached_response(request: Request) -> Optional[Response]:
+    page = page_cache.get(cache_key(request))
+    if page is None:
+        return None
+    return page_response(request, page)
+
+
+def cache_response(request: Request, response: Response) -> Response:
+    if response.status_code != status.HTTP_200_OK:
+        return response
+    page = CachedPage(
+        body=response.body,
+        etag='"' + hashlib.sha1(response.body).hexdigest() + '"',
+        media_type=response.media_type or "text/html",
+    )
+    page_cache.set(cache_key(request), page)
+    return page_response(request, page)
+
+
+def invalidate_listing() -> None:
+    page_cache.delete_where(lambda key: key[0] == "/")
+
+
+def invalidate_campaign(campaign_id: int) -> None:
+    path = f"/campaigns/{campaign_id}"
+    page_cache.delete_where(lambda key: key[0] == path)
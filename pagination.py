@@ -0,0 +1,77 @@
+import base64
+import binascii
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Optional
+from urllib.parse import urlencode
+
+from fastapi import HTTPException, Request, status
+from sqlalchemy import Select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+MAX_PAGE_SIZE = 100
+
+
+@dataclass
+class Page:
+    items: list
+    next_cursor: Optional[str]
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid page cursor."
+        )
+
+
+async def keyset_page(
+    db: AsyncSession,
+    stmt: Select,
+    created_col,
+    id_col,
+    cursor: Optional[str],
+    limit: int,
+    key: Callable[[Any], tuple[datetime, int]] = lambda row: (row.created_at, row.id),
+    scalars: bool = False,
+) -> Page:
+    """Newest-first page of ``stmt`` ordered by ``(created_col, id_col)``.
+
+    ``key`` extracts the ``(created_at, id)`` pair from a result row so the
+    same helper works for entity and column/tuple selects; pass
+    ``scalars=True`` to get entities rather than rows back.
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        stmt = stmt.where(
+            or_(
+                created_col < created_at,
+                and_(created_col == created_at, id_col < row_id),
+            )
+        )
+
+    stmt = stmt.order_by(created_col.desc(), id_col.desc()).limit(limit + 1)
+    result = await db.execute(stmt)
+    rows = list(result.scalars() if scalars else result.all())
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(*key(rows[-1]))
+    return Page(items=rows, next_cursor=next_cursor)
+
+
+def next_page_url(request: Request, page: Page, param: str = "cursor") -> Optional[str]:
+    if page.next_cursor is None:
+        return None
+    params = dict(request.query_params)
+    params[param] = page.next_cursor
+    return f"{request.url.path}?{urlencode(params)}"
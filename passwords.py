@@ -0,0 +1,22 @@
+import bcrypt
+
+# Runs inside the hashing worker processes (see auth.py), so keep this module
+# free of app imports.
+
+
+def hash_password_sync(password: str, rounds: int) -> str:
+    hashed = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=rounds))
+    return hashed.decode("ascii")
+
+
+def verify_password_sync(plain_password: str, hashed_password: str | bytes) -> bool:
+    if isinstance(hashed_password, str):
+        hashed_password = hashed_password.encode("ascii")
+    return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password)
+
+
+def hash_rounds(hashed_password: str | bytes) -> int:
+    # "$2b$12$<salt+hash>" -> 12
+    if isinstance(hashed_password, bytes):
+        hashed_password = hashed_password.decode("ascii")
+    return int(hashed_password.split("$")[2])
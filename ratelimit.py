@@ -0,0 +1,208 @@
+"""Rate limiting and admission control.
+
+``rate_limit`` builds a route dependency with token buckets per client IP
+and per logged-in user. A limit such as ``"20/minute"`` lets a client burst
+20 requests and then refills one token every 3 seconds; the defaults in the
+routers can be overridden with ``RATE_LIMIT_<NAME>_IP`` /
+``RATE_LIMIT_<NAME>_USER`` (``0`` turns one off). Buckets live in process
+memory; a bucket left alone long enough to refill is indistinguishable from
+a new one, so it is dropped.
+
+``AdmissionMiddleware`` caps the requests a worker handles at once. Beyond
+``MAX_CONCURRENT_REQUESTS`` requests wait for a slot, at most
+``ADMISSION_QUEUE_LIMIT`` of them for up to ``ADMISSION_QUEUE_TIMEOUT``
+seconds; the rest are answered 503 straight away instead of piling up.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+from fastapi import HTTPException, Request, status
+from fastapi.responses import JSONResponse
+
+from db import env_flag
+
+RATE_LIMIT_ENABLED = env_flag("RATE_LIMIT_ENABLED", True)
+# Buckets kept per limiter; the least recently used go first beyond this
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Take the client address from X-Forwarded-For (only behind a trusted proxy)
+RATE_LIMIT_TRUST_FORWARDED = env_flag("RATE_LIMIT_TRUST_FORWARDED", False)
+
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "256"))
+ADMISSION_QUEUE_LIMIT = int(os.getenv("ADMISSION_QUEUE_LIMIT", "512"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600}
+
+rate_limited_requests = 0
+
+
+class TokenBucketLimiter:
+    def __init__(self, capacity: int, period: float, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[Hashable, tuple[float, float]] = OrderedDict()
+
+    def acquire(self, key: Hashable) -> float:
+        """Take a token; returns 0 if one was free, else seconds until one is."""
+        now = time.monotonic()
+        self._evict(now)
+        tokens, updated = self._buckets.pop(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            return 0.0
+        self._buckets[key] = (tokens, now)
+        return (1 - tokens) / self.rate
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _evict(self, now: float) -> None:
+        # Buckets are ordered by last use, so idle ones are at the front
+        full_after = self.capacity / self.rate
+        while self._buckets:
+            key, (_, updated) = next(iter(self._buckets.items()))
+            if now - updated < full_after and len(self._buckets) < self.max_keys:
+                break
+            del self._buckets[key]
+
+
+def parse_limit(value: str) -> Optional[TokenBucketLimiter]:
+    """``"20/minute"`` -> limiter; ``""`` or ``"0"`` -> no limit."""
+    value = value.strip()
+    if value in ("", "0"):
+        return None
+    count, _, period = value.partition("/")
+    if period not in PERIODS or not count.isdigit():
+        raise ValueError(f"Invalid rate limit {value!r}; use e.g. '20/minute'")
+    return TokenBucketLimiter(int(count), PERIODS[period])
+
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def too_many_requests(retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many requests, please slow down.",
+        headers={"Retry-After": str(math.ceil(retry_after))},
+    )
+
+
+def rate_limit(name: str, per_ip: str = "", per_user: str = ""):
+    """Dependency limiting one route per client IP and per logged-in user."""
+    ip_limiter = parse_limit(os.getenv(f"RATE_LIMIT_{name.upper()}_IP", per_ip))
+    user_limiter = parse_limit(os.getenv(f"RATE_LIMIT_{name.upper()}_USER", per_user))
+
+    async def check(request: Request) -> None:
+        global rate_limited_requests
+        if not RATE_LIMIT_ENABLED:
+            return
+        retry_after = 0.0
+        if ip_limiter is not None:
+            retry_after = ip_limiter.acquire(client_ip(request))
+        user_id = request.session.get("user_id")
+        if not retry_after and user_limiter is not None and user_id is not None:
+            retry_after = user_limiter.acquire(user_id)
+        if retry_after:
+            rate_limited_requests += 1
+            raise too_many_requests(retry_after)
+
+    return check
+
+
+def rate_limited_total() -> int:
+    return rate_limited_requests
+
+
+def admission_exempt(path: str) -> bool:
+    # Event streams stay open for minutes; metrics must answer under load
+    return path == "/metrics" or path.endswith("/live")
+
+
+class Admission:
+    def __init__(self, max_concurrent: int, queue_limit: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.queue_limit = queue_limit
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self.shed = 0
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+            self._loop = loop
+        return self._slots
+
+    async def enter(self) -> bool:
+        """Wait for a slot; False if the request should be shed instead."""
+        slots = self.slots()
+        if slots.locked():
+            if self.waiting >= self.queue_limit:
+                self.shed += 1
+                return False
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.shed += 1
+                return False
+            finally:
+                self.waiting -= 1
+        else:
+            await slots.acquire()
+        self.in_flight += 1
+        return True
+
+    def leave(self) -> None:
+        self.in_flight -= 1
+        self._slots.release()
+
+
+admission = Admission(
+    max_concurrent=MAX_CONCURRENT_REQUESTS,
+    queue_limit=ADMISSION_QUEUE_LIMIT,
+    queue_timeout=ADMISSION_QUEUE_TIMEOUT,
+)
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, admission: Admission):
+        self.app = app
+        self.admission = admission
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not self.admission.max_concurrent
+            or admission_exempt(scope["path"])
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        if not await self.admission.enter():
+            response = JSONResponse(
+                {"detail": "Server is busy, please try again shortly."},
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.admission.leave()
@@ -0,0 +1,206 @@
+"""Read replicas.
+
+With ``DB_REPLICA_URLS`` set (comma-separated database URLs), routes that
+take their session from ``get_read_db`` run on a replica, picked round-robin
+among the healthy ones. Everything else, and every request that is not a
+GET or HEAD, stays on the primary.
+
+Read-your-writes: ``ReadYourWritesMiddleware`` pins a browser to the primary
+for ``REPLICA_PIN_SECONDS`` after any successful write request (a short-lived
+cookie), so the page a donation redirects to shows the new total. Keep it
+above ``REPLICA_MAX_LAG_SECONDS`` plus ``REPLICA_CHECK_INTERVAL``, the most a
+replica in use can be behind.
+
+Health: every ``REPLICA_CHECK_INTERVAL`` seconds each worker stamps the
+``replication_heartbeat`` row on the primary and reads it back from every
+replica. A replica is used only while that read succeeds and the stamp it
+returns is at most ``REPLICA_MAX_LAG_SECONDS`` old; a dropped connection
+takes it out at once. With no replica healthy, reads go to the primary.
+
+To try it locally, point ``DB_REPLICA_URLS`` at the primary's own SQLite
+file (a replica with no lag), or at a copy of it: nothing replicates into a
+copy, so its heartbeat goes stale and it is ejected, as a stuck replica
+would be.
+"""
+import asyncio
+import itertools
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+from fastapi import Request
+from sqlalchemy import event, select, update
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from starlette.requests import HTTPConnection
+
+from db import AsyncSessionLocal, make_async_engine
+from models import ReplicationHeartbeat
+
+logger = logging.getLogger("charity.replicas")
+
+DB_REPLICA_URLS = [url.strip() for url in os.getenv("DB_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "1"))
+REPLICA_CHECK_TIMEOUT = float(os.getenv("REPLICA_CHECK_TIMEOUT", "2"))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", "10"))
+REPLICA_PIN_COOKIE = os.getenv("REPLICA_PIN_COOKIE", "primary_until")
+
+SAFE_METHODS = ("GET", "HEAD")
+
+
+@dataclass
+class Replica:
+    url: URL
+    engine: AsyncEngine
+    sessionmaker: async_sessionmaker
+    # Out of rotation until the first check passes
+    healthy: bool = False
+    lag: Optional[float] = None
+    error: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return self.url.render_as_string(hide_password=True)
+
+
+class ReplicaSet:
+    def __init__(self, urls: list[str]):
+        self.replicas = [self._connect(make_url(url)) for url in urls]
+        self._turn = itertools.count()
+
+    def _connect(self, url: URL) -> Replica:
+        engine = make_async_engine(url)
+        replica = Replica(
+            url=url,
+            engine=engine,
+            sessionmaker=async_sessionmaker(engine, autoflush=False, expire_on_commit=False),
+        )
+
+        def on_error(context) -> None:
+            # Don't wait for the next check to stop sending reads to a dead server
+            if context.is_disconnect and replica.healthy:
+                replica.healthy = False
+                replica.error = "disconnected"
+                logger.warning("Replica %s disconnected; reading from the others", replica.name)
+
+        event.listen(engine.sync_engine, "handle_error", on_error)
+        return replica
+
+    def __bool__(self) -> bool:
+        return bool(self.replicas)
+
+    @property
+    def healthy_count(self) -> int:
+        return sum(replica.healthy for replica in self.replicas)
+
+    @property
+    def max_lag(self) -> Optional[float]:
+        lags = [replica.lag for replica in self.replicas if replica.healthy]
+        return max(lags) if lags else None
+
+    def pick(self) -> Optional[Replica]:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._turn) % len(healthy)]
+
+    def sessionmaker_for(self, request: Request) -> async_sessionmaker:
+        if self.replicas and request.method in SAFE_METHODS and not pinned_to_primary(request):
+            replica = self.pick()
+            if replica is not None:
+                return replica.sessionmaker
+        return AsyncSessionLocal
+
+    async def check(self) -> None:
+        await stamp_heartbeat()
+        await asyncio.gather(*(self._check(replica) for replica in self.replicas))
+
+    async def _check(self, replica: Replica) -> None:
+        try:
+            async with replica.sessionmaker() as db:
+                beat_at = await asyncio.wait_for(
+                    db.scalar(select(ReplicationHeartbeat.beat_at).where(ReplicationHeartbeat.id == 1)),
+                    REPLICA_CHECK_TIMEOUT,
+                )
+        except Exception as exc:
+            replica.lag, error = None, f"{type(exc).__name__}: {exc}"
+        else:
+            if beat_at is None:
+                replica.lag, error = None, "no heartbeat row"
+            else:
+                replica.lag = max(0.0, time.time() - beat_at)
+                error = None if replica.lag <= REPLICA_MAX_LAG_SECONDS else f"lagging {replica.lag:.1f}s"
+        healthy = error is None
+        if healthy != replica.healthy:
+            if healthy:
+                logger.info("Replica %s back in rotation", replica.name)
+            else:
+                logger.warning("Replica %s out of rotation: %s", replica.name, error)
+        replica.healthy, replica.error = healthy, error
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+
+async def stamp_heartbeat() -> None:
+    now = time.time()
+    async with AsyncSessionLocal() as db:
+        # Every worker runs this; skip the write if another one just did
+        await db.execute(
+            update(ReplicationHeartbeat)
+            .where(ReplicationHeartbeat.id == 1, ReplicationHeartbeat.beat_at < now - REPLICA_CHECK_INTERVAL / 2)
+            .values(beat_at=now)
+        )
+        await db.commit()
+
+
+replica_set = ReplicaSet(DB_REPLICA_URLS)
+
+
+async def run_replica_monitor() -> None:
+    while True:
+        try:
+            await replica_set.check()
+        except Exception:
+            logger.exception("Replica check failed")
+        await asyncio.sleep(REPLICA_CHECK_INTERVAL)
+
+
+def pinned_to_primary(connection: HTTPConnection) -> bool:
+    try:
+        return float(connection.cookies.get(REPLICA_PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+async def get_read_db(request: Request) -> AsyncIterator[AsyncSession]:
+    """Like ``db.get_async_db``, but may be served by a replica."""
+    async with replica_set.sessionmaker_for(request)() as db:
+        yield db
+
+
+class ReadYourWritesMiddleware:
+    """Pins the client to the primary for a while after a successful write."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = int(time.time()) + REPLICA_PIN_SECONDS
+                cookie = f"{REPLICA_PIN_COOKIE}={until}; path=/; Max-Age={REPLICA_PIN_SECONDS}; httponly; samesite=lax"
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"set-cookie", cookie.encode("latin-1"))
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
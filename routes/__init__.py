@@ -2,5 +2,10 @@ from routes.user import router as user_router
 from routes.campaign import router as campaign_router
 from routes.donation import router as donation_router
 from routes.comment import router as comment_router
+from routes.api import router as api_router
+from routes.bulk import router as bulk_router
+from routes.analytics import router as analytics_router
+from routes.search import router as search_router
+from routes.live import router as live_router
 
-__all__ = ["user_router", "campaign_router", "donation_router", "comment_router"]
+__all__ = ["user_router", "campaign_router", "donation_router", "comment_router", "api_router", "bulk_router", "analytics_router", "search_router", "live_router"]
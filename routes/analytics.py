@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import HTMLResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from analytics import (
+    GRANULARITIES,
+    campaign_series,
+    rollup_progress,
+    top_campaigns,
+    top_donors,
+)
+from auth import Principal, require_admin
+from models import CharityCampaign
+from replicas import get_read_db
+from templating import templates
+
+TOP_DONORS_LIMIT = 20
+TOP_CAMPAIGNS_LIMIT = 20
+# Longest range per granularity, in days; bounds the rows a page reads
+MAX_RANGE_DAYS = {"hour": 14, "day": 730}
+
+router = APIRouter(tags=["analytics"])
+
+
+@router.get("/admin/analytics", response_class=HTMLResponse, summary="Admin: donation analytics")
+async def analytics_page(
+    request: Request,
+    campaign_id: Optional[int] = None,
+    granularity: str = "day",
+    days: int = Query(30, ge=1),
+    current_user: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_read_db),
+):
+    if granularity not in GRANULARITIES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Granularity must be one of: {', '.join(GRANULARITIES)}.",
+        )
+    days = min(days, MAX_RANGE_DAYS[granularity])
+    until = datetime.utcnow()
+    since = until - timedelta(days=days)
+
+    campaign = series = donors = None
+    if campaign_id is not None:
+        campaign = await db.get(CharityCampaign, campaign_id)
+        if campaign is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Campaign not found."
+            )
+        series = await campaign_series(db, campaign_id, granularity, since, until)
+        donors = await top_donors(db, campaign_id, TOP_DONORS_LIMIT)
+    campaigns = await top_campaigns(db, since, until, TOP_CAMPAIGNS_LIMIT)
+    folded_through, latest_id = await rollup_progress(db)
+
+    return templates.TemplateResponse(
+        "admin_analytics.html",
+        {
+            "request": request,
+            "user": current_user,
+            "campaign": campaign,
+            "granularity": granularity,
+            "granularities": GRANULARITIES,
+            "days": days,
+            "series": series,
+            "peak": max((row.total_amount for row in series or []), default=0),
+            "donors": donors,
+            "campaigns": campaigns,
+            "folded_through": folded_through,
+            "latest_id": latest_id,
+        },
+    )
@@ -0,0 +1,141 @@
+from typing import Any, Callable, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth import Principal, get_current_user, get_current_user_optional
+from pagination import MAX_PAGE_SIZE, Page
+from replicas import get_read_db
+from routes.campaign import (
+    CAMPAIGNS_PAGE_SIZE,
+    COMMENTS_PAGE_SIZE,
+    comments_page,
+    get_visible_campaign,
+    open_campaigns_page,
+)
+from routes.donation import DONATIONS_PAGE_SIZE, donations_page
+
+router = APIRouter(
+    prefix="/api/v1", tags=["api"], default_response_class=ORJSONResponse
+)
+
+# Field name -> getter, per resource. ?fields= picks a subset of these keys.
+# Handlers return ORJSONResponse directly to skip FastAPI's jsonable_encoder
+# pass; orjson serializes datetimes itself.
+Fields = dict[str, Callable[[Any], Any]]
+
+CAMPAIGN_LIST_FIELDS: Fields = {
+    "id": lambda row: row[0].id,
+    "title": lambda row: row[0].title,
+    "excerpt": lambda row: row[1],
+    "status": lambda row: row[0].status,
+    "created_at": lambda row: row[0].created_at,
+    "total": lambda row: row[0].total_amount,
+    "donor_count": lambda row: row[0].donor_count,
+}
+
+CAMPAIGN_FIELDS: Fields = {
+    "id": lambda c: c.id,
+    "title": lambda c: c.title,
+    "description": lambda c: c.description,
+    "status": lambda c: c.status,
+    "created_at": lambda c: c.created_at,
+    "total": lambda c: c.total_amount,
+    "donor_count": lambda c: c.donor_count,
+}
+
+COMMENT_FIELDS: Fields = {
+    "id": lambda c: c.id,
+    "content": lambda c: c.content,
+    "created_at": lambda c: c.created_at,
+    "user_id": lambda c: c.user_id,
+    "author": lambda c: c.user.email,
+}
+
+DONATION_FIELDS: Fields = {
+    "id": lambda d: d.id,
+    "amount": lambda d: d.amount,
+    "created_at": lambda d: d.created_at,
+    "campaign_id": lambda d: d.campaign_id,
+    "campaign_title": lambda d: d.campaign_title,
+}
+
+
+def pick_fields(fields: Optional[str], available: Fields) -> Fields:
+    if not fields:
+        return available
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown field(s): {', '.join(unknown)}. "
+            f"Available: {', '.join(available)}.",
+        )
+    return {name: available[name] for name in names}
+
+
+def serialize(item: Any, fields: Fields) -> dict:
+    return {name: getter(item) for name, getter in fields.items()}
+
+
+def page_response(page: Page, fields: Fields) -> ORJSONResponse:
+    return ORJSONResponse(
+        {
+            "items": [serialize(item, fields) for item in page.items],
+            "next_cursor": page.next_cursor,
+        }
+    )
+
+
+@router.get("/campaigns", summary="List open campaigns")
+async def list_campaigns(
+    cursor: Optional[str] = None,
+    limit: int = Query(CAMPAIGNS_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    selected = pick_fields(fields, CAMPAIGN_LIST_FIELDS)
+    page = await open_campaigns_page(db, cursor, limit)
+    return page_response(page, selected)
+
+
+@router.get("/campaigns/{campaign_id}", summary="Campaign with totals")
+async def get_campaign(
+    campaign_id: int,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Optional[Principal] = Depends(get_current_user_optional),
+):
+    selected = pick_fields(fields, CAMPAIGN_FIELDS)
+    campaign = await get_visible_campaign(db, campaign_id, current_user)
+    return ORJSONResponse(serialize(campaign, selected))
+
+
+@router.get("/campaigns/{campaign_id}/comments", summary="Campaign comments, newest first")
+async def list_comments(
+    campaign_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(COMMENTS_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Optional[Principal] = Depends(get_current_user_optional),
+):
+    selected = pick_fields(fields, COMMENT_FIELDS)
+    campaign = await get_visible_campaign(db, campaign_id, current_user)
+    page = await comments_page(db, campaign.id, cursor, limit)
+    return page_response(page, selected)
+
+
+@router.get("/me/donations", summary="Current user's donations, newest first")
+async def list_my_donations(
+    cursor: Optional[str] = None,
+    limit: int = Query(DONATIONS_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    selected = pick_fields(fields, DONATION_FIELDS)
+    page = await donations_page(db, current_user.id, cursor, limit)
+    return page_response(page, selected)
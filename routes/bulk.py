@@ -0,0 +1,426 @@
+"""Admin bulk import and export.
+
+Imports read an uploaded CSV (with a header row) or NDJSON file row by row
+and insert valid rows in chunks of IMPORT_CHUNK_SIZE, one transaction per
+chunk; invalid rows are skipped and reported by line number. Exports stream
+rows from a server-side cursor, so memory use stays flat however many rows
+match.
+
+Campaign columns: title, description, status (open/closed, default open),
+created_at. Donation columns: campaign_id, user_email or user_id, amount,
+created_at (ISO 8601, default now), idempotency_key. The donation export
+writes these columns too, so its output can be imported again; with
+``archived=1`` it includes donations archive.py has moved out.
+"""
+import csv
+import io
+import itertools
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import IO, Any, AsyncIterator, Awaitable, Callable, Iterator, Optional
+
+import orjson
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from archive import donation_source
+from auth import Principal, require_admin
+from db import AsyncSessionLocal, get_async_db
+from live import live_hub
+from models import CharityCampaign, User
+from page_cache import invalidate_campaign, invalidate_listing
+from routes.campaign import CAMPAIGN_DESCRIPTION_MAX_LENGTH, CAMPAIGN_TITLE_MAX_LENGTH
+from routes.donation import (
+    DONATION_AMOUNT_MAX,
+    DONATION_AMOUNT_MIN,
+    IDEMPOTENCY_KEY_MAX_LENGTH,
+)
+from routes.user import EMAIL_MAX_LENGTH
+from totals import DUPLICATE, RECORDED, UNAVAILABLE, NewDonation, record_donations
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+IMPORT_MAX_REPORTED_ERRORS = 1000
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+INVALID_UTF8 = "Not valid UTF-8."
+
+router = APIRouter(prefix="/admin", tags=["bulk"])
+
+
+class RowError(ValueError):
+    pass
+
+
+@dataclass
+class ImportReport:
+    inserted: int = 0
+    duplicates: int = 0
+    failed: int = 0
+    # At most IMPORT_MAX_REPORTED_ERRORS; `failed` has the full count
+    errors: list[dict] = field(default_factory=list)
+
+    def error(self, line: int, message: str) -> None:
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+
+def check_format(fmt: str) -> str:
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Format must be one of: {', '.join(MEDIA_TYPES)}.",
+        )
+    return fmt
+
+
+def file_format(upload: UploadFile, requested: Optional[str]) -> str:
+    name = (upload.filename or "").lower()
+    return check_format(
+        requested or ("ndjson" if name.endswith((".ndjson", ".jsonl")) else "csv")
+    )
+
+
+def naive_utc(moment: datetime) -> datetime:
+    # Stored timestamps are naive UTC
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def decoded_lines(file: IO[bytes], invalid: set[int]) -> Iterator[str]:
+    # Decoded line by line, so a line that isn't UTF-8 fails only its own
+    # row; its number goes into ``invalid``.
+    for line_number, line in enumerate(file, start=1):
+        try:
+            yield line.decode("utf-8-sig" if line_number == 1 else "utf-8")
+        except UnicodeDecodeError:
+            invalid.add(line_number)
+            yield line.decode("utf-8", errors="replace")
+
+
+def read_rows(upload: UploadFile, fmt: str) -> Iterator[tuple[int, Optional[dict], Optional[str]]]:
+    """Yield (line number, row, parse error) without loading the whole file."""
+    invalid: set[int] = set()
+    lines = decoded_lines(upload.file, invalid)
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        # DictReader only updates its own line_num after a good row
+        source = reader.reader
+        while True:
+            first_line = source.line_num + 1
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as exc:
+                yield source.line_num, None, f"Invalid CSV: {exc}"
+                if source.line_num < first_line:
+                    return
+                continue
+            # A quoted field may span lines
+            if invalid.intersection(range(first_line, source.line_num + 1)):
+                yield source.line_num, None, INVALID_UTF8
+            else:
+                yield source.line_num, row, None
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        if line_number in invalid:
+            yield line_number, None, INVALID_UTF8
+            continue
+        try:
+            row = orjson.loads(line)
+        except orjson.JSONDecodeError as exc:
+            yield line_number, None, f"Invalid JSON: {exc}"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, "Expected a JSON object."
+            continue
+        yield line_number, row, None
+
+
+def next_rows(rows: Iterator, count: int) -> list:
+    return list(itertools.islice(rows, count))
+
+
+def text_field(row: dict, name: str, max_length: int, required: bool = True) -> Optional[str]:
+    value = row.get(name)
+    value = str(value).strip() if value is not None else ""
+    if not value:
+        if required:
+            raise RowError(f"{name} is required.")
+        return None
+    if len(value) > max_length:
+        raise RowError(f"{name} must be at most {max_length} characters.")
+    return value
+
+
+def int_field(row: dict, name: str) -> Optional[int]:
+    value = row.get(name)
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        raise RowError(f"{name} must be an integer.")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RowError(f"{name} must be an integer.")
+
+
+def datetime_field(row: dict, name: str) -> Optional[datetime]:
+    value = row.get(name)
+    if value is None or value == "":
+        return None
+    try:
+        return naive_utc(datetime.fromisoformat(str(value)))
+    except ValueError:
+        raise RowError(f"{name} must be an ISO 8601 date/time.")
+
+
+def campaign_values(row: dict, created_by_id: int) -> dict:
+    target_status = text_field(row, "status", 10, required=False) or "open"
+    if target_status not in ("open", "closed"):
+        raise RowError("status must be open or closed.")
+    return {
+        "title": text_field(row, "title", CAMPAIGN_TITLE_MAX_LENGTH),
+        "description": text_field(row, "description", CAMPAIGN_DESCRIPTION_MAX_LENGTH),
+        "status": target_status,
+        "closed_at": datetime.utcnow() if target_status == "closed" else None,
+        "created_by_id": created_by_id,
+        "created_at": datetime_field(row, "created_at") or datetime.utcnow(),
+    }
+
+
+def donation_values(row: dict) -> dict:
+    campaign_id = int_field(row, "campaign_id")
+    if campaign_id is None:
+        raise RowError("campaign_id is required.")
+    user_email = text_field(row, "user_email", EMAIL_MAX_LENGTH, required=False)
+    user_id = int_field(row, "user_id")
+    if user_email is None and user_id is None:
+        raise RowError("user_email or user_id is required.")
+    amount = int_field(row, "amount")
+    if amount is None or amount < DONATION_AMOUNT_MIN or amount > DONATION_AMOUNT_MAX:
+        raise RowError(f"amount must be between {DONATION_AMOUNT_MIN} and {DONATION_AMOUNT_MAX}.")
+    return {
+        "campaign_id": campaign_id,
+        "user_email": user_email.lower() if user_email else None,
+        "user_id": user_id,
+        "amount": amount,
+        "created_at": datetime_field(row, "created_at") or datetime.utcnow(),
+        "idempotency_key": text_field(
+            row, "idempotency_key", IDEMPOTENCY_KEY_MAX_LENGTH, required=False
+        ),
+    }
+
+
+Chunk = list[tuple[int, dict]]
+
+
+async def run_import(
+    upload: UploadFile,
+    fmt: str,
+    parse_row: Callable[[dict], dict],
+    flush: Callable[[Chunk, ImportReport], Awaitable[None]],
+) -> ImportReport:
+    report = ImportReport()
+    chunk: Chunk = []
+    rows = read_rows(upload, fmt)
+    while True:
+        # Reading and parsing the spooled upload blocks, so it runs in the
+        # threadpool, a chunk's worth of rows at a time
+        parsed = await run_in_threadpool(next_rows, rows, IMPORT_CHUNK_SIZE)
+        if not parsed:
+            break
+        for line, row, error in parsed:
+            if error is None:
+                try:
+                    chunk.append((line, parse_row(row)))
+                except RowError as exc:
+                    error = str(exc)
+            if error is not None:
+                report.error(line, error)
+            elif len(chunk) >= IMPORT_CHUNK_SIZE:
+                await flush(chunk, report)
+                chunk = []
+    if chunk:
+        await flush(chunk, report)
+    report.errors.sort(key=lambda error: error["line"])
+    return report
+
+
+@router.post("/import/campaigns", summary="Admin: import campaigns from CSV or NDJSON")
+async def import_campaigns(
+    file: UploadFile = File(...),
+    fmt: Optional[str] = Query(None, alias="format"),
+    current_user: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_db),
+):
+    async def flush(chunk: Chunk, report: ImportReport) -> None:
+        await db.execute(insert(CharityCampaign), [values for _, values in chunk])
+        await db.commit()
+        report.inserted += len(chunk)
+
+    report = await run_import(
+        file,
+        file_format(file, fmt),
+        lambda row: campaign_values(row, current_user.id),
+        flush,
+    )
+    if report.inserted:
+        invalidate_listing()
+    return report
+
+
+@router.post("/import/donations", summary="Admin: import donations from CSV or NDJSON")
+async def import_donations(
+    file: UploadFile = File(...),
+    fmt: Optional[str] = Query(None, alias="format"),
+    current_user: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_db),
+):
+    touched_campaigns: set[int] = set()
+
+    async def record_one(donation: NewDonation) -> str:
+        try:
+            [outcome] = await record_donations(db, [donation], require_open=False)
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            return DUPLICATE
+        return outcome
+
+    async def flush(chunk: Chunk, report: ImportReport) -> None:
+        emails = {values["user_email"] for _, values in chunk if values["user_email"]}
+        ids = {values["user_id"] for _, values in chunk if not values["user_email"]}
+        known = (
+            await db.execute(
+                select(User.email, User.id).where(
+                    (User.email.in_(emails)) | (User.id.in_(ids))
+                )
+            )
+        ).all()
+        id_by_email = {email: user_id for email, user_id in known}
+        known_ids = {user_id for _, user_id in known}
+
+        lines = []
+        donations = []
+        for line, values in chunk:
+            user_id = (
+                id_by_email.get(values["user_email"])
+                if values["user_email"]
+                else values["user_id"]
+            )
+            if user_id is None or user_id not in known_ids:
+                report.error(line, f"Unknown user {values['user_email'] or values['user_id']}.")
+                continue
+            lines.append(line)
+            donations.append(
+                NewDonation(
+                    user_id=user_id,
+                    campaign_id=values["campaign_id"],
+                    amount=values["amount"],
+                    idempotency_key=values["idempotency_key"],
+                    created_at=values["created_at"],
+                )
+            )
+        if not donations:
+            return
+
+        try:
+            outcomes = await record_donations(db, donations, require_open=False)
+            await db.commit()
+        except IntegrityError:
+            # A donation with one of these keys was committed concurrently;
+            # record them one at a time so that only it is a duplicate
+            await db.rollback()
+            outcomes = [await record_one(donation) for donation in donations]
+
+        for line, donation, outcome in zip(lines, donations, outcomes):
+            if outcome == RECORDED:
+                report.inserted += 1
+                touched_campaigns.add(donation.campaign_id)
+            elif outcome == DUPLICATE:
+                report.duplicates += 1
+            elif outcome == UNAVAILABLE:
+                report.error(line, f"Unknown campaign {donation.campaign_id}.")
+
+    report = await run_import(file, file_format(file, fmt), donation_values, flush)
+    if touched_campaigns:
+        invalidate_listing()
+        for campaign_id in touched_campaigns:
+            invalidate_campaign(campaign_id)
+            live_hub.notify(campaign_id)
+    return report
+
+
+def export_value(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+async def stream_rows(stmt, fmt: str) -> AsyncIterator[bytes]:
+    # The request's session is closed before the body streams, so the
+    # generator opens its own.
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        columns = list(result.keys())
+        if fmt == "csv":
+            buffer = io.StringIO()
+            csv.writer(buffer).writerow(columns)
+            yield buffer.getvalue().encode()
+        async for rows in result.partitions():
+            if fmt == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                for row in rows:
+                    writer.writerow([export_value(value) for value in row])
+                yield buffer.getvalue().encode()
+            else:
+                yield b"".join(
+                    orjson.dumps(dict(zip(columns, row))) + b"\n" for row in rows
+                )
+
+
+@router.get("/export/donations", summary="Admin: stream donations as CSV or NDJSON")
+async def export_donations(
+    campaign_id: Optional[int] = None,
+    since: Optional[datetime] = Query(None, description="Inclusive, ISO 8601 (UTC)"),
+    until: Optional[datetime] = Query(None, description="Exclusive, ISO 8601 (UTC)"),
+    fmt: str = Query("csv", alias="format"),
+    archived: bool = Query(False, description="Include donations moved to the archive"),
+    current_user: Principal = Depends(require_admin),
+):
+    check_format(fmt)
+    donations = donation_source(include_archived=archived)
+    stmt = (
+        select(
+            donations.c.id,
+            donations.c.campaign_id,
+            donations.c.user_id,
+            User.email.label("user_email"),
+            donations.c.amount,
+            donations.c.created_at,
+            donations.c.idempotency_key,
+        )
+        .join(User, User.id == donations.c.user_id)
+        .order_by(donations.c.id)
+    )
+    if campaign_id is not None:
+        stmt = stmt.where(donations.c.campaign_id == campaign_id)
+    if since is not None:
+        stmt = stmt.where(donations.c.created_at >= naive_utc(since))
+    if until is not None:
+        stmt = stmt.where(donations.c.created_at < naive_utc(until))
+
+    return StreamingResponse(
+        stream_rows(stmt, fmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="donations.{fmt}"'},
+    )
@@ -1,61 +1,100 @@
+import os
+import uuid
+from datetime import datetime
 from typing import Optional
 
-from fastapi import APIRouter, Depends, Form, HTTPException, Request, status
+from fastapi import APIRouter, Depends, Form, HTTPException, Query, Request, status
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased, defer, joinedload
 
-from auth import get_current_user, get_current_user_optional, require_admin
-from db import get_db
-from models import CharityCampaign, Donation, User
+from archive import comment_source
+from auth import Principal, get_current_user, get_current_user_optional, require_admin
+from db import get_async_db
+from models import CharityCampaign, Comment, User
+from page_cache import cache_response, cached_response, invalidate_campaign, invalidate_listing
+from pagination import MAX_PAGE_SIZE, Page, keyset_page, next_page_url
+from replicas import get_read_db
+from templating import fragment_response, templates
 
 # Validation limits
 CAMPAIGN_TITLE_MAX_LENGTH = 200
 CAMPAIGN_DESCRIPTION_MAX_LENGTH = 5000
 
+# Listing
+CAMPAIGNS_PAGE_SIZE = int(os.getenv("CAMPAIGNS_PAGE_SIZE", "20"))
+DESCRIPTION_EXCERPT_LENGTH = 300
+COMMENTS_PAGE_SIZE = int(os.getenv("COMMENTS_PAGE_SIZE", "20"))
+
 router = APIRouter(tags=["campaign"])
-templates = Jinja2Templates(directory="templates")
+
+
+async def open_campaigns_page(
+    db: AsyncSession, cursor: Optional[str], limit: int
+) -> Page:
+    # The list only shows an excerpt, so let the database cut the description
+    # and keep the full column out of the hydrated rows.
+    stmt = (
+        select(
+            CharityCampaign,
+            func.substr(
+                CharityCampaign.description, 1, DESCRIPTION_EXCERPT_LENGTH + 1
+            ).label("excerpt"),
+        )
+        .options(defer(CharityCampaign.description))
+        .where(CharityCampaign.status == "open")
+    )
+    page = await keyset_page(
+        db,
+        stmt,
+        CharityCampaign.created_at,
+        CharityCampaign.id,
+        cursor,
+        limit,
+        key=lambda row: (row[0].created_at, row[0].id),
+    )
+    page.items = [
+        (campaign, excerpt_text(excerpt)) for campaign, excerpt in page.items
+    ]
+    return page
+
+
+def excerpt_text(text: str) -> str:
+    if len(text) <= DESCRIPTION_EXCERPT_LENGTH:
+        return text
+    return text[:DESCRIPTION_EXCERPT_LENGTH].rstrip() + "…"
 
 
 @router.get("/", response_class=HTMLResponse)
-def index(
+async def index(
     request: Request,
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user_optional),
+    cursor: Optional[str] = None,
+    limit: int = Query(CAMPAIGNS_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Optional[Principal] = Depends(get_current_user_optional),
 ):
-    campaigns = (
-        db.query(CharityCampaign)
-        .filter(CharityCampaign.status == "open")
-        .order_by(CharityCampaign.created_at.desc())
-        .all()
-    )
-    totals = (
-        db.query(Donation.campaign_id, func.coalesce(func.sum(Donation.amount), 0))
-        .group_by(Donation.campaign_id)
-        .all()
-    )
-    totals_map = {cid: total for cid, total in totals}
+    if current_user is None and (cached := cached_response(request)):
+        return cached
 
-    return templates.TemplateResponse(
+    page = await open_campaigns_page(db, cursor, limit)
+
+    response = templates.TemplateResponse(
         "campaigns_list.html",
         {
             "request": request,
             "user": current_user,
-            "campaigns": campaigns,
-            "totals": totals_map,
+            "campaigns": page.items,
+            "next_url": next_page_url(request, page),
         },
     )
+    return cache_response(request, response) if current_user is None else response
 
 
-@router.get("/campaigns/{campaign_id}", response_class=HTMLResponse, summary="Campaign details")
-def campaign_detail(
-    campaign_id: int,
-    request: Request,
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user_optional),
-):
-    campaign = db.get(CharityCampaign, campaign_id)
+async def get_visible_campaign(
+    db: AsyncSession, campaign_id: int, current_user: Optional[Principal]
+) -> CharityCampaign:
+    campaign = await db.get(CharityCampaign, campaign_id)
     if campaign is None or (
         campaign.status != "open"
         and (not current_user or current_user.role != "admin")
@@ -63,49 +102,154 @@ def campaign_detail(
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Campaign not found"
         )
+    return campaign
+
 
-    total = (
-        db.query(func.coalesce(func.sum(Donation.amount), 0))
-        .filter(Donation.campaign_id == campaign.id)
-        .scalar()
+async def comments_page(
+    db: AsyncSession,
+    campaign_id: int,
+    cursor: Optional[str],
+    limit: int,
+    include_archived: bool = False,
+) -> Page:
+    # Archived comments are read as Comment objects over both tables
+    entity = (
+        aliased(Comment, comment_source(include_archived=True))
+        if include_archived
+        else Comment
+    )
+    # Authors are joined into the same SELECT so the template's
+    # comment.user.email doesn't issue a query per comment.
+    stmt = (
+        select(entity)
+        .options(joinedload(entity.user).load_only(User.email))
+        .where(entity.campaign_id == campaign_id)
+    )
+    return await keyset_page(
+        db, stmt, entity.created_at, entity.id, cursor, limit, scalars=True
     )
 
-    return templates.TemplateResponse(
+
+def wants_archive(archived: bool, current_user: Optional[Principal]) -> bool:
+    return archived and current_user is not None and current_user.role == "admin"
+
+
+@router.get("/campaigns/{campaign_id}", response_class=HTMLResponse, summary="Campaign details")
+async def campaign_detail(
+    campaign_id: int,
+    request: Request,
+    comments_cursor: Optional[str] = None,
+    archived: bool = Query(False, description="Admins: include archived comments"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Optional[Principal] = Depends(get_current_user_optional),
+):
+    if current_user is None and (cached := cached_response(request)):
+        return cached
+
+    campaign = await get_visible_campaign(db, campaign_id, current_user)
+    include_archived = wants_archive(archived, current_user)
+    comments = await comments_page(
+        db, campaign.id, comments_cursor, COMMENTS_PAGE_SIZE, include_archived
+    )
+
+    response = templates.TemplateResponse(
+        "campaign_detail.html",
+        {
+            "request": request,
+            "user": current_user,
+            "campaign": campaign,
+            "comments": comments.items,
+            "next_comments_cursor": comments.next_cursor,
+            "include_archived": include_archived,
+            # Newest comment shown, so the live stream sends only later ones
+            "live_after": comments.items[0].id if comments.items and comments_cursor is None else None,
+            # One key per rendered form, so a resubmitted form donates once.
+            # Anonymous pages (cached, no form) skip it to keep ETags stable.
+            "donation_key": uuid.uuid4().hex if current_user else None,
+        },
+    )
+    return cache_response(request, response) if current_user is None else response
+
+
+@router.get("/campaigns/{campaign_id}/comments", response_class=HTMLResponse, summary="Load more comments")
+async def campaign_comments(
+    campaign_id: int,
+    request: Request,
+    cursor: Optional[str] = None,
+    archived: bool = Query(False, description="Admins: include archived comments"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Optional[Principal] = Depends(get_current_user_optional),
+):
+    campaign = await get_visible_campaign(db, campaign_id, current_user)
+    include_archived = wants_archive(archived, current_user)
+    comments = await comments_page(
+        db, campaign.id, cursor, COMMENTS_PAGE_SIZE, include_archived
+    )
+
+    # Only the comment items and the next "load more" link; the detail page
+    # swaps this in for the link that requested it.
+    return fragment_response(
         "campaign_detail.html",
+        "comments",
         {
             "request": request,
             "user": current_user,
             "campaign": campaign,
-            "total": total,
+            "comments": comments.items,
+            "next_comments_cursor": comments.next_cursor,
+            "include_archived": include_archived,
         },
     )
 
 
+@router.get("/campaigns/{campaign_id}/totals", response_class=HTMLResponse, summary="Campaign totals fragment")
+async def campaign_totals(
+    campaign_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Optional[Principal] = Depends(get_current_user_optional),
+):
+    # For clients that poll instead of keeping the live stream open
+    campaign = await get_visible_campaign(db, campaign_id, current_user)
+    return fragment_response(
+        "campaign_detail.html",
+        "totals",
+        {"request": request, "user": current_user, "campaign": campaign},
+    )
+
+
 @router.get("/admin/campaigns", response_class=HTMLResponse, summary="Admin: list all campaigns")
-def admin_campaigns(
+async def admin_campaigns(
     request: Request,
-    current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(CAMPAIGNS_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    campaigns = (
-        db.query(CharityCampaign)
-        .order_by(CharityCampaign.created_at.desc())
-        .all()
+    page = await keyset_page(
+        db,
+        select(CharityCampaign).options(defer(CharityCampaign.description)),
+        CharityCampaign.created_at,
+        CharityCampaign.id,
+        cursor,
+        limit,
+        scalars=True,
     )
     return templates.TemplateResponse(
         "admin_campaigns.html",
         {
             "request": request,
             "user": current_user,
-            "campaigns": campaigns,
+            "campaigns": page.items,
+            "next_url": next_page_url(request, page),
         },
     )
 
 
 @router.get("/admin/campaigns/new", response_class=HTMLResponse, summary="Admin: new campaign form")
-def new_campaign_form(
+async def new_campaign_form(
     request: Request,
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
 ):
     return templates.TemplateResponse(
         "new_campaign.html",
@@ -114,15 +258,15 @@ def new_campaign_form(
 
 
 @router.post("/admin/campaigns", summary="Admin: create campaign")
-def create_campaign(
+async def create_campaign(
     request: Request,
     title: str = Form(..., min_length=1, max_length=CAMPAIGN_TITLE_MAX_LENGTH),
     description: str = Form(
         ..., min_length=1, max_length=CAMPAIGN_DESCRIPTION_MAX_LENGTH
     ),
     target_status: str = Form("open"),
-    current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_db),
 ):
     title = title.strip()
     description = description.strip()
@@ -144,9 +288,11 @@ def create_campaign(
         description=description,
         created_by_id=current_user.id,
         status=target_status,
+        closed_at=datetime.utcnow() if target_status == "closed" else None,
     )
     db.add(campaign)
-    db.commit()
+    await db.commit()
+    invalidate_listing()
 
     return RedirectResponse(
         url="/admin/campaigns",
@@ -155,13 +301,13 @@ def create_campaign(
 
 
 @router.get("/admin/campaigns/{campaign_id}/edit", response_class=HTMLResponse, summary="Admin: edit campaign form")
-def edit_campaign_form(
+async def edit_campaign_form(
     campaign_id: int,
     request: Request,
-    current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    campaign = db.get(CharityCampaign, campaign_id)
+    campaign = await db.get(CharityCampaign, campaign_id)
     if campaign is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Campaign not found"
@@ -178,7 +324,7 @@ def edit_campaign_form(
 
 
 @router.post("/admin/campaigns/{campaign_id}/edit", summary="Admin: update campaign")
-def update_campaign(
+async def update_campaign(
     campaign_id: int,
     request: Request,
     title: str = Form(..., min_length=1, max_length=CAMPAIGN_TITLE_MAX_LENGTH),
@@ -186,8 +332,8 @@ def update_campaign(
         ..., min_length=1, max_length=CAMPAIGN_DESCRIPTION_MAX_LENGTH
     ),
     status_value: str = Form(...),
-    current_user: User = Depends(require_admin),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(require_admin),
+    db: AsyncSession = Depends(get_async_db),
 ):
     title = title.strip()
     description = description.strip()
@@ -203,7 +349,7 @@ def update_campaign(
     if status_value not in ("open", "closed"):
         status_value = "open"
 
-    campaign = db.get(CharityCampaign, campaign_id)
+    campaign = await db.get(CharityCampaign, campaign_id)
     if campaign is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Campaign not found"
@@ -211,9 +357,14 @@ def update_campaign(
 
     campaign.title = title
     campaign.description = description
+    if status_value != campaign.status:
+        # Starts (or stops) the clock for archive.py
+        campaign.closed_at = datetime.utcnow() if status_value == "closed" else None
     campaign.status = status_value
 
-    db.commit()
+    await db.commit()
+    invalidate_listing()
+    invalidate_campaign(campaign.id)
 
     return RedirectResponse(
         url="/admin/campaigns",
@@ -1,29 +1,34 @@
 from fastapi import APIRouter, Depends, Form, HTTPException, Request, status
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from auth import get_current_user
-from db import get_db
-from models import Comment, CharityCampaign, User
+from auth import Principal, get_current_user, is_admin
+from db import get_async_db
+from live import live_hub
+from models import Comment, CharityCampaign
+from page_cache import invalidate_campaign
+from ratelimit import rate_limit
+from templating import templates
 
 # Validation limits
 COMMENT_CONTENT_MAX_LENGTH = 1000
 COMMENT_CONTENT_MIN_LENGTH = 1
 
 router = APIRouter(tags=["comment"])
-templates = Jinja2Templates(directory="templates")
 
 
-@router.post("/campaigns/{campaign_id}/comments")
-def create_comment(
+@router.post(
+    "/campaigns/{campaign_id}/comments",
+    dependencies=[Depends(rate_limit("comment", per_ip="60/minute", per_user="10/minute"))],
+)
+async def create_comment(
     campaign_id: int,
     request: Request,
     content: str = Form(..., min_length=COMMENT_CONTENT_MIN_LENGTH, max_length=COMMENT_CONTENT_MAX_LENGTH),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
 ):
-    campaign = db.get(CharityCampaign, campaign_id)
+    campaign = await db.get(CharityCampaign, campaign_id)
     if campaign is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -43,8 +48,10 @@ def create_comment(
         campaign_id=campaign_id
     )
     db.add(comment)
-    db.commit()
-    db.refresh(comment)
+    await db.commit()
+    await db.refresh(comment)
+    invalidate_campaign(campaign_id)
+    live_hub.notify(campaign_id)
 
     return RedirectResponse(
         url=f"/campaigns/{campaign_id}",
@@ -53,20 +60,20 @@ def create_comment(
 
 
 @router.post("/comments/{comment_id}/delete", summary="Delete comment")
-def delete_comment(
+async def delete_comment(
     comment_id: int,
     request: Request,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
 ):
-    comment = db.get(Comment, comment_id)
+    comment = await db.get(Comment, comment_id)
     if comment is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Comment not found"
         )
 
-    if comment.user_id != current_user.id and current_user.role != "admin":
+    if comment.user_id != current_user.id and not await is_admin(db, current_user):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You don't have permission to delete this comment"
@@ -74,8 +81,9 @@ def delete_comment(
 
     campaign_id = comment.campaign_id
 
-    db.delete(comment)
-    db.commit()
+    await db.delete(comment)
+    await db.commit()
+    invalidate_campaign(campaign_id)
 
     return RedirectResponse(
         url=f"/campaigns/{campaign_id}",
@@ -84,20 +92,20 @@ def delete_comment(
 
 
 @router.get("/comments/{comment_id}/edit", response_class=HTMLResponse, summary="Edit comment form")
-def edit_comment_form(
+async def edit_comment_form(
     comment_id: int,
     request: Request,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
 ):
-    comment = db.get(Comment, comment_id)
+    comment = await db.get(Comment, comment_id)
     if comment is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Comment not found"
         )
 
-    if comment.user_id != current_user.id and current_user.role != "admin":
+    if comment.user_id != current_user.id and not await is_admin(db, current_user):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You don't have permission to edit this comment"
@@ -114,22 +122,22 @@ def edit_comment_form(
 
 
 @router.post("/comments/{comment_id}/edit", summary="Update comment")
-def update_comment(
+async def update_comment(
     comment_id: int,
     request: Request,
     content: str = Form(..., min_length=COMMENT_CONTENT_MIN_LENGTH, max_length=COMMENT_CONTENT_MAX_LENGTH),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
 ):
 
-    comment = db.get(Comment, comment_id)
+    comment = await db.get(Comment, comment_id)
     if comment is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Comment not found"
         )
 
-    if comment.user_id != current_user.id and current_user.role != "admin":
+    if comment.user_id != current_user.id and not await is_admin(db, current_user):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You don't have permission to edit this comment"
@@ -143,8 +151,9 @@ def update_comment(
         )
 
     comment.content = content
-    db.commit()
-    db.refresh(comment)
+    await db.commit()
+    await db.refresh(comment)
+    invalidate_campaign(comment.campaign_id)
 
     return RedirectResponse(
         url=f"/campaigns/{comment.campaign_id}",
@@ -1,49 +1,116 @@
-from fastapi import APIRouter, Depends, Form, HTTPException, Request, status
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Form, HTTPException, Query, Request, status
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from auth import get_current_user
-from db import get_db
-from models import CharityCampaign, Donation, User
+from auth import Principal, get_current_user
+from db import get_async_db
+from donation_queue import DONATION_BATCHING, donation_writer
+from live import live_hub
+from models import CharityCampaign, Donation
+from page_cache import invalidate_campaign, invalidate_listing
+from pagination import MAX_PAGE_SIZE, Page, keyset_page, next_page_url
+from ratelimit import rate_limit
+from replicas import get_read_db
+from templating import templates
+from totals import DUPLICATE, RECORDED, UNAVAILABLE, NewDonation, record_donations
 
 # Validation limits
 DONATION_AMOUNT_MIN = 1
 DONATION_AMOUNT_MAX = 999_999_999
+IDEMPOTENCY_KEY_MAX_LENGTH = 64
+
+# Listing
+DONATIONS_PAGE_SIZE = int(os.getenv("DONATIONS_PAGE_SIZE", "50"))
 
 router = APIRouter(tags=["donation"])
-templates = Jinja2Templates(directory="templates")
+
+
+async def donations_page(
+    db: AsyncSession, user_id: int, cursor: Optional[str], limit: int
+) -> Page:
+    stmt = (
+        select(
+            Donation.id,
+            Donation.amount,
+            Donation.created_at,
+            Donation.campaign_id,
+            CharityCampaign.title.label("campaign_title"),
+        )
+        .join(CharityCampaign, CharityCampaign.id == Donation.campaign_id)
+        .where(Donation.user_id == user_id)
+    )
+    return await keyset_page(db, stmt, Donation.created_at, Donation.id, cursor, limit)
 
 
 @router.get("/me/donations", response_class=HTMLResponse)
-def my_donations(
+async def my_donations(
     request: Request,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(DONATIONS_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    donations = (
-        db.query(Donation)
-        .filter(Donation.user_id == current_user.id)
-        .order_by(Donation.created_at.desc())
-        .all()
-    )
+    page = await donations_page(db, current_user.id, cursor, limit)
+
     return templates.TemplateResponse(
         "my_donations.html",
         {
             "request": request,
             "user": current_user,
-            "donations": donations,
+            "donations": page.items,
+            "next_url": next_page_url(request, page),
         },
     )
 
 
-@router.post("/campaigns/{campaign_id}/donate", summary="Donate to campaign")
-def donate(
+@router.get("/me/donations/by-campaign", response_class=HTMLResponse, summary="My donations per campaign")
+async def my_donations_by_campaign(
+    request: Request,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    rollup = (
+        await db.execute(
+            select(
+                CharityCampaign.id,
+                CharityCampaign.title,
+                func.sum(Donation.amount).label("total"),
+                func.count(Donation.id).label("donation_count"),
+                func.max(Donation.created_at).label("last_donated_at"),
+            )
+            .join(Donation, Donation.campaign_id == CharityCampaign.id)
+            .where(Donation.user_id == current_user.id)
+            .group_by(CharityCampaign.id, CharityCampaign.title)
+            .order_by(func.sum(Donation.amount).desc())
+        )
+    ).all()
+    return templates.TemplateResponse(
+        "my_donations_by_campaign.html",
+        {
+            "request": request,
+            "user": current_user,
+            "rollup": rollup,
+        },
+    )
+
+
+@router.post(
+    "/campaigns/{campaign_id}/donate",
+    summary="Donate to campaign",
+    dependencies=[Depends(rate_limit("donate", per_ip="300/minute", per_user="30/minute"))],
+)
+async def donate(
     campaign_id: int,
     request: Request,
     amount: int = Form(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Form(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user),
 ):
     if amount < DONATION_AMOUNT_MIN or amount > DONATION_AMOUNT_MAX:
         raise HTTPException(
@@ -51,20 +118,41 @@ def donate(
             detail=f"Amount must be between {DONATION_AMOUNT_MIN} and {DONATION_AMOUNT_MAX}.",
         )
 
-    campaign = db.get(CharityCampaign, campaign_id)
-    if campaign is None or campaign.status != "open":
+    # Clients retrying a donation send the same key (header or form field)
+    # and it is recorded only once.
+    key = request.headers.get("Idempotency-Key") or idempotency_key or None
+    if key is not None and len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="This campaign is not available for donations.",
+            detail=f"Idempotency key must be at most {IDEMPOTENCY_KEY_MAX_LENGTH} characters.",
         )
-
-    donation = Donation(
+    donation = NewDonation(
         user_id=current_user.id,
-        campaign_id=campaign.id,
+        campaign_id=campaign_id,
         amount=amount,
+        idempotency_key=key,
     )
-    db.add(donation)
-    db.commit()
+
+    if DONATION_BATCHING:
+        outcome = await donation_writer.submit(donation)
+    else:
+        try:
+            [outcome] = await record_donations(db, [donation])
+            await db.commit()
+        except IntegrityError:
+            # A concurrent retry with the same key committed first
+            await db.rollback()
+            outcome = DUPLICATE
+        if outcome == RECORDED:
+            invalidate_listing()
+            invalidate_campaign(campaign_id)
+            live_hub.notify(campaign_id)
+
+    if outcome == UNAVAILABLE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="This campaign is not available for donations.",
+        )
 
     return RedirectResponse(
         url=f"/campaigns/{campaign_id}",
@@ -0,0 +1,74 @@
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth import Principal, get_current_user_optional
+from db import get_async_db
+from live import LIVE_HEARTBEAT_INTERVAL, live_hub
+from models import CharityCampaign, Comment
+from routes.campaign import get_visible_campaign
+
+# How long browsers wait before reconnecting a dropped stream
+LIVE_RETRY_MS = 5000
+
+router = APIRouter(tags=["live"])
+
+
+async def event_stream(campaign: CharityCampaign, after: int):
+    yield f"retry: {LIVE_RETRY_MS}\n\n".encode()
+    # Subscribed here rather than in the handler: a client that disconnects
+    # before the body starts never runs this generator, and so would never
+    # reach the unsubscribe below.
+    subscriber = live_hub.subscribe(campaign, after)
+    if subscriber is None:
+        # Another stream took the last free place; the browser retries
+        return
+    try:
+        while True:
+            try:
+                payload = await asyncio.wait_for(
+                    subscriber.queue.get(), LIVE_HEARTBEAT_INTERVAL
+                )
+            except asyncio.TimeoutError:
+                yield b": ping\n\n"
+                continue
+            if payload is None:
+                return
+            yield payload
+    finally:
+        live_hub.unsubscribe(subscriber)
+
+
+@router.get("/campaigns/{campaign_id}/live", summary="Live campaign updates (Server-Sent Events)")
+async def campaign_live(
+    campaign_id: int,
+    after: Optional[int] = Query(None, ge=0),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[Principal] = Depends(get_current_user_optional),
+):
+    # ``after`` is the newest comment id the page already shows
+    campaign = await get_visible_campaign(db, campaign_id, current_user)
+    if after is None:
+        after = await db.scalar(
+            select(func.coalesce(func.max(Comment.id), 0)).where(
+                Comment.campaign_id == campaign_id
+            )
+        )
+    # The session goes back to the pool here, not when the stream ends
+    await db.close()
+
+    if live_hub.at_capacity():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many live viewers, please reload later.",
+            headers={"Retry-After": "30"},
+        )
+    return StreamingResponse(
+        event_stream(campaign, after),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,90 @@
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import HTMLResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import contains_eager, defer, joinedload
+
+from auth import Principal, get_current_user_optional
+from models import CharityCampaign, Comment, User
+from replicas import get_read_db
+from routes.campaign import DESCRIPTION_EXCERPT_LENGTH, excerpt_text
+from search import match_campaigns, match_comments, query_terms
+from templating import templates
+
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "20"))
+# Offset pagination; ranked results can't use keyset cursors, so cap the depth
+SEARCH_MAX_PAGE = 50
+SEARCH_COMMENT_RESULTS = 10
+
+router = APIRouter(tags=["search"])
+
+
+async def search_campaigns(
+    db: AsyncSession, terms: list[str], include_closed: bool, page: int
+) -> tuple[list, bool]:
+    stmt = select(
+        CharityCampaign,
+        func.substr(CharityCampaign.description, 1, DESCRIPTION_EXCERPT_LENGTH + 1).label("excerpt"),
+    ).options(defer(CharityCampaign.description))
+    if not include_closed:
+        stmt = stmt.where(CharityCampaign.status == "open")
+    stmt = (
+        match_campaigns(stmt, db.bind.dialect.name, terms)
+        .offset((page - 1) * SEARCH_PAGE_SIZE)
+        .limit(SEARCH_PAGE_SIZE + 1)
+    )
+    rows = (await db.execute(stmt)).all()
+    items = [(campaign, excerpt_text(excerpt)) for campaign, excerpt in rows[:SEARCH_PAGE_SIZE]]
+    return items, len(rows) > SEARCH_PAGE_SIZE
+
+
+async def search_comments(
+    db: AsyncSession, terms: list[str], include_closed: bool
+) -> list[Comment]:
+    stmt = (
+        select(Comment)
+        .join(Comment.campaign)
+        .options(
+            contains_eager(Comment.campaign).load_only(CharityCampaign.id, CharityCampaign.title),
+            joinedload(Comment.user).load_only(User.email),
+        )
+    )
+    if not include_closed:
+        stmt = stmt.where(CharityCampaign.status == "open")
+    stmt = match_comments(stmt, db.bind.dialect.name, terms).limit(SEARCH_COMMENT_RESULTS)
+    return list(await db.scalars(stmt))
+
+
+@router.get("/search", response_class=HTMLResponse, summary="Search campaigns and comments")
+async def search(
+    request: Request,
+    q: str = "",
+    page: int = Query(1, ge=1, le=SEARCH_MAX_PAGE),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Optional[Principal] = Depends(get_current_user_optional),
+):
+    terms = query_terms(q)
+    include_closed = current_user is not None and current_user.role == "admin"
+    campaigns, has_next = [], False
+    comments = []
+    if terms:
+        campaigns, has_next = await search_campaigns(db, terms, include_closed, page)
+        if page == 1:
+            comments = await search_comments(db, terms, include_closed)
+
+    return templates.TemplateResponse(
+        "search.html",
+        {
+            "request": request,
+            "user": current_user,
+            "q": q,
+            "searched": bool(terms),
+            "campaigns": campaigns,
+            "comments": comments,
+            "page": page,
+            "has_next": has_next and page < SEARCH_MAX_PAGE,
+        },
+    )
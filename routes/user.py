@@ -1,35 +1,49 @@
 from fastapi import APIRouter, Depends, Form, Request, status
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy import func
-from sqlalchemy.orm import Session
-
-from auth import get_current_user, get_password_hash, get_current_user_optional, verify_password
-from db import get_db
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth import (
+    Principal,
+    check_password,
+    get_current_user,
+    hash_password,
+    password_needs_rehash,
+    require_admin,
+    user_cache,
+)
+from db import get_async_db
 from models import User
+from page_cache import page_cache
+from ratelimit import rate_limit
+from sessions import revoke_user_sessions
+from templating import templates
 
 # Validation limits
 EMAIL_MAX_LENGTH = 64
 PASSWORD_MAX_LENGTH = 255
 
 router = APIRouter(tags=["user"])
-templates = Jinja2Templates(directory="templates")
 
 
 @router.get("/register", response_class=HTMLResponse)
-def register_form(request: Request):
+async def register_form(request: Request):
     return templates.TemplateResponse(
         "register.html",
         {"request": request},
     )
 
 
-@router.post("/register", summary="Create new user account")
-def register(
+@router.post(
+    "/register",
+    summary="Create new user account",
+    dependencies=[Depends(rate_limit("register", per_ip="5/minute"))],
+)
+async def register(
     request: Request,
     email: str = Form(..., max_length=EMAIL_MAX_LENGTH),
     password: str = Form(..., min_length=1, max_length=PASSWORD_MAX_LENGTH),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     email = email.strip().lower()
     if not email:
@@ -39,7 +53,7 @@ def register(
             status_code=status.HTTP_400_BAD_REQUEST,
         )
 
-    existing = db.query(User).filter(User.email == email).first()
+    existing = await db.scalar(select(User).where(User.email == email))
     if existing:
         return templates.TemplateResponse(
             "register.html",
@@ -50,40 +64,44 @@ def register(
             status_code=status.HTTP_400_BAD_REQUEST,
         )
 
-    is_first_user = db.query(func.count(User.id)).scalar() == 0
+    is_first_user = await db.scalar(select(func.count(User.id))) == 0
     role = "admin" if is_first_user else "user"
 
     user = User(
         email=email,
-        hashed_password=get_password_hash(password),
+        hashed_password=await hash_password(password),
         role=role,
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
 
     request.session["user_id"] = user.id
     return RedirectResponse(url="/", status_code=status.HTTP_303_SEE_OTHER)
 
 
 @router.get("/login", response_class=HTMLResponse, summary="Login form")
-def login_form(request: Request):
+async def login_form(request: Request):
     return templates.TemplateResponse(
         "login.html",
         {"request": request},
     )
 
 
-@router.post("/login", summary="Authenticate user")
-def login(
+@router.post(
+    "/login",
+    summary="Authenticate user",
+    dependencies=[Depends(rate_limit("login", per_ip="20/minute"))],
+)
+async def login(
     request: Request,
     email: str = Form(..., max_length=EMAIL_MAX_LENGTH),
     password: str = Form(..., max_length=PASSWORD_MAX_LENGTH),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     email = email.strip().lower()
-    user = db.query(User).filter(User.email == email).first()
-    if not user or not verify_password(password, user.hashed_password):
+    user = await db.scalar(select(User).where(User.email == email))
+    if not user or not await check_password(password, user.hashed_password):
         return templates.TemplateResponse(
             "login.html",
             {
@@ -93,11 +111,32 @@ def login(
             status_code=status.HTTP_400_BAD_REQUEST,
         )
 
+    # The password is at hand only now, so upgrade hashes made with an old
+    # BCRYPT_ROUNDS setting here.
+    if password_needs_rehash(user.hashed_password):
+        user.hashed_password = await hash_password(password)
+        await db.commit()
+
     request.session["user_id"] = user.id
     return RedirectResponse(url="/", status_code=status.HTTP_303_SEE_OTHER)
 
 
 @router.post("/logout", summary="End user session")
-def logout(request: Request):
+async def logout(request: Request):
+    request.session.clear()
+    return RedirectResponse(url="/", status_code=status.HTTP_303_SEE_OTHER)
+
+
+@router.post("/logout/all", summary="End all sessions of the current user")
+async def logout_everywhere(
+    request: Request,
+    current_user: Principal = Depends(get_current_user),
+):
+    await revoke_user_sessions(current_user.id)
     request.session.clear()
     return RedirectResponse(url="/", status_code=status.HTTP_303_SEE_OTHER)
+
+
+@router.get("/admin/cache-stats", summary="Admin: in-process cache statistics")
+async def cache_stats(current_user: Principal = Depends(require_admin)):
+    return {"user_cache": user_cache.stats(), "page_cache": page_cache.stats()}
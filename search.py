@@ -0,0 +1,68 @@
+"""Full-text search over campaigns and comments.
+
+SQLite: FTS5 external-content tables (``campaigns_fts``, ``comments_fts``)
+index the base tables and triggers keep them in step with every write,
+including bulk imports. PostgreSQL: generated ``search_vector`` tsvector
+columns with GIN indexes. Migration 0006 creates whichever applies.
+
+Every word of the query must match, and each word also matches as a prefix
+("chari" finds "charity"). Results are ranked best first, with title matches
+weighted above description matches.
+"""
+import re
+
+from sqlalchemy import Select, column, func, literal_column, table
+
+from models import CharityCampaign, Comment
+
+SEARCH_MAX_TERMS = 8
+# bm25 column weights (title, description); FTS5 ranks lower = better
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+
+def query_terms(q: str) -> list[str]:
+    # Letters and digits only, so user input can't inject query syntax
+    return re.findall(r"[^\W_]+", q.lower())[:SEARCH_MAX_TERMS]
+
+
+def fts_query(terms: list[str]) -> str:
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def tsquery(terms: list[str]):
+    return func.to_tsquery("english", " & ".join(f"{term}:*" for term in terms))
+
+
+def match_campaigns(stmt: Select, dialect: str, terms: list[str]) -> Select:
+    """Restrict a campaign select to matches of every term, best first."""
+    if dialect == "postgresql":
+        vector = literal_column("charity_campaigns.search_vector")
+        query = tsquery(terms)
+        return stmt.where(vector.op("@@")(query)).order_by(
+            func.ts_rank(vector, query).desc(), CharityCampaign.id
+        )
+    fts = table("campaigns_fts", column("rowid"))
+    index = literal_column("campaigns_fts")
+    return (
+        stmt.join(fts, fts.c.rowid == CharityCampaign.id)
+        .where(index.match(fts_query(terms)))
+        .order_by(func.bm25(index, TITLE_WEIGHT, DESCRIPTION_WEIGHT), CharityCampaign.id)
+    )
+
+
+def match_comments(stmt: Select, dialect: str, terms: list[str]) -> Select:
+    """Restrict a comment select to matches of every term, best first."""
+    if dialect == "postgresql":
+        vector = literal_column("comments.search_vector")
+        query = tsquery(terms)
+        return stmt.where(vector.op("@@")(query)).order_by(
+            func.ts_rank(vector, query).desc(), Comment.id.desc()
+        )
+    fts = table("comments_fts", column("rowid"))
+    index = literal_column("comments_fts")
+    return (
+        stmt.join(fts, fts.c.rowid == Comment.id)
+        .where(index.match(fts_query(terms)))
+        .order_by(func.bm25(index), Comment.id.desc())
+    )
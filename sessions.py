@@ -0,0 +1,336 @@
+"""Server-side sessions.
+
+The session cookie carries only a random token. The session data lives in a
+store chosen by ``SESSION_BACKEND``:
+
+- ``database`` (default): the ``user_sessions`` table, shared by all workers.
+- ``memory``: an LRU dict in the process; for a single worker or development.
+- ``redis``: a Redis server at ``SESSION_REDIS_URL`` (needs ``pip install redis``).
+
+Stores key sessions by the token's SHA-256, so a leaked table or dump does
+not hand out usable cookies. Requests without a cookie, and static files,
+never touch the store.
+Sessions expire ``SESSION_MAX_AGE`` seconds after their last use; the new
+expiry is written back at most once per ``SESSION_REFRESH_INTERVAL``. The
+token changes whenever the session data does (log in, log out), and
+``revoke_user_sessions`` ends every session of a user at once.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import secrets
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+import orjson
+from sqlalchemy import delete, select, update
+from starlette.requests import HTTPConnection
+
+from assets import STATIC_URL_PREFIX
+from db import AsyncSessionLocal, env_flag
+from models import UserSession
+
+logger = logging.getLogger("charity.sessions")
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "database")
+SESSION_COOKIE = os.getenv("SESSION_COOKIE", "session")
+SESSION_MAX_AGE = int(os.getenv("SESSION_MAX_AGE", str(14 * 24 * 3600)))
+SESSION_REFRESH_INTERVAL = int(os.getenv("SESSION_REFRESH_INTERVAL", "3600"))
+SESSION_HTTPS_ONLY = env_flag("SESSION_HTTPS_ONLY", False)
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "300"))
+SESSION_MEMORY_MAX_ENTRIES = int(os.getenv("SESSION_MEMORY_MAX_ENTRIES", "100000"))
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+
+
+@dataclass
+class StoredSession:
+    data: dict[str, Any]
+    expires_at: datetime
+
+
+def token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class SessionStore(ABC):
+    # Abstract, so a store missing a method fails when it is created
+    # rather than in the middle of a request.
+
+    @abstractmethod
+    async def load(self, key: str) -> Optional[StoredSession]: ...
+
+    @abstractmethod
+    async def save(self, key: str, data: dict[str, Any], expires_at: datetime) -> None: ...
+
+    @abstractmethod
+    async def touch(self, key: str, expires_at: datetime) -> None: ...
+
+    @abstractmethod
+    async def delete(self, key: str) -> None: ...
+
+    @abstractmethod
+    async def delete_user(self, user_id: int) -> int: ...
+
+    @abstractmethod
+    async def sweep(self) -> int:
+        """Drop expired sessions; returns how many were removed."""
+
+
+class MemorySessionStore(SessionStore):
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._sessions: OrderedDict[str, StoredSession] = OrderedDict()
+        self._by_user: dict[int, set[str]] = {}
+
+    async def load(self, key: str) -> Optional[StoredSession]:
+        stored = self._sessions.get(key)
+        if stored is None:
+            return None
+        if stored.expires_at <= datetime.utcnow():
+            self._remove(key)
+            return None
+        self._sessions.move_to_end(key)
+        return stored
+
+    async def save(self, key: str, data: dict[str, Any], expires_at: datetime) -> None:
+        self._remove(key)
+        self._sessions[key] = StoredSession(data, expires_at)
+        user_id = data.get("user_id")
+        if user_id is not None:
+            self._by_user.setdefault(user_id, set()).add(key)
+        # Least recently used sessions go first once the store is full
+        while len(self._sessions) > self.max_entries:
+            self._remove(next(iter(self._sessions)))
+
+    async def touch(self, key: str, expires_at: datetime) -> None:
+        stored = self._sessions.get(key)
+        if stored is not None:
+            stored.expires_at = expires_at
+            self._sessions.move_to_end(key)
+
+    async def delete(self, key: str) -> None:
+        self._remove(key)
+
+    async def delete_user(self, user_id: int) -> int:
+        keys = self._by_user.pop(user_id, set())
+        for key in keys:
+            self._sessions.pop(key, None)
+        return len(keys)
+
+    async def sweep(self) -> int:
+        now = datetime.utcnow()
+        expired = [key for key, stored in self._sessions.items() if stored.expires_at <= now]
+        for key in expired:
+            self._remove(key)
+        return len(expired)
+
+    def _remove(self, key: str) -> None:
+        stored = self._sessions.pop(key, None)
+        if stored is None:
+            return
+        user_id = stored.data.get("user_id")
+        keys = self._by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[user_id]
+
+
+class DatabaseSessionStore(SessionStore):
+    async def load(self, key: str) -> Optional[StoredSession]:
+        async with AsyncSessionLocal() as db:
+            row = (
+                await db.execute(
+                    select(UserSession.data, UserSession.expires_at).where(
+                        UserSession.id == key, UserSession.expires_at > datetime.utcnow()
+                    )
+                )
+            ).first()
+        if row is None:
+            return None
+        return StoredSession(orjson.loads(row.data), row.expires_at)
+
+    async def save(self, key: str, data: dict[str, Any], expires_at: datetime) -> None:
+        async with AsyncSessionLocal() as db:
+            await db.merge(
+                UserSession(
+                    id=key,
+                    user_id=data.get("user_id"),
+                    data=orjson.dumps(data).decode(),
+                    expires_at=expires_at,
+                )
+            )
+            await db.commit()
+
+    async def touch(self, key: str, expires_at: datetime) -> None:
+        await self._execute(
+            update(UserSession).where(UserSession.id == key).values(expires_at=expires_at)
+        )
+
+    async def delete(self, key: str) -> None:
+        await self._execute(delete(UserSession).where(UserSession.id == key))
+
+    async def delete_user(self, user_id: int) -> int:
+        return await self._execute(delete(UserSession).where(UserSession.user_id == user_id))
+
+    async def sweep(self) -> int:
+        return await self._execute(
+            delete(UserSession).where(UserSession.expires_at <= datetime.utcnow())
+        )
+
+    async def _execute(self, statement) -> int:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(statement)
+            await db.commit()
+        return result.rowcount
+
+
+class RedisSessionStore(SessionStore):
+    # Redis expires keys itself; a set per user tracks their session keys.
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError(
+                "SESSION_BACKEND=redis needs the redis package (pip install redis)"
+            ) from None
+        self._redis = redis.from_url(url)
+
+    async def load(self, key: str) -> Optional[StoredSession]:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            raw, ttl = await pipe.get(f"session:{key}").ttl(f"session:{key}").execute()
+        if raw is None or ttl < 0:
+            return None
+        return StoredSession(orjson.loads(raw), datetime.utcnow() + timedelta(seconds=ttl))
+
+    async def save(self, key: str, data: dict[str, Any], expires_at: datetime) -> None:
+        ttl = self._ttl(expires_at)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.set(f"session:{key}", orjson.dumps(data), ex=ttl)
+            user_id = data.get("user_id")
+            if user_id is not None:
+                pipe.sadd(f"user-sessions:{user_id}", key)
+                pipe.expire(f"user-sessions:{user_id}", SESSION_MAX_AGE)
+            await pipe.execute()
+
+    async def touch(self, key: str, expires_at: datetime) -> None:
+        await self._redis.expire(f"session:{key}", self._ttl(expires_at))
+
+    async def delete(self, key: str) -> None:
+        await self._redis.delete(f"session:{key}")
+
+    async def delete_user(self, user_id: int) -> int:
+        keys = await self._redis.smembers(f"user-sessions:{user_id}")
+        names = [f"session:{key.decode()}" for key in keys]
+        removed = await self._redis.delete(*names) if names else 0
+        await self._redis.delete(f"user-sessions:{user_id}")
+        return removed
+
+    async def sweep(self) -> int:
+        return 0
+
+    @staticmethod
+    def _ttl(expires_at: datetime) -> int:
+        return max(1, int((expires_at - datetime.utcnow()).total_seconds()))
+
+
+def create_store(backend: str) -> SessionStore:
+    if backend == "memory":
+        return MemorySessionStore(SESSION_MEMORY_MAX_ENTRIES)
+    if backend == "database":
+        return DatabaseSessionStore()
+    if backend == "redis":
+        return RedisSessionStore(SESSION_REDIS_URL)
+    raise ValueError(f"Unknown SESSION_BACKEND {backend!r}; use memory, database or redis")
+
+
+session_store = create_store(SESSION_BACKEND)
+
+
+async def revoke_user_sessions(user_id: int) -> int:
+    """Log a user out everywhere; returns the number of sessions ended."""
+    return await session_store.delete_user(user_id)
+
+
+async def run_session_sweeper() -> None:
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+        try:
+            removed = await session_store.sweep()
+        except Exception:
+            logger.exception("Session sweep failed")
+        else:
+            if removed:
+                logger.info("Swept %d expired sessions", removed)
+
+
+def session_cookie(token: str, max_age: int) -> bytes:
+    cookie = f"{SESSION_COOKIE}={token}; path=/; Max-Age={max_age}; httponly; samesite=lax"
+    if SESSION_HTTPS_ONLY:
+        cookie += "; secure"
+    return cookie.encode("latin-1")
+
+
+def is_static(path: str) -> bool:
+    # Assets never read the session; loading it would cost a store round trip
+    return path == STATIC_URL_PREFIX or path.startswith(f"{STATIC_URL_PREFIX}/")
+
+
+class ServerSessionMiddleware:
+    """Provides ``request.session``, backed by ``session_store``."""
+
+    def __init__(self, app, store: SessionStore):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket") or is_static(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        token = HTTPConnection(scope).cookies.get(SESSION_COOKIE)
+        stored = await self.store.load(token_key(token)) if token else None
+        initial = dict(stored.data) if stored is not None else {}
+        scope["session"] = dict(initial)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                cookie = await self._commit(token, stored, initial, scope["session"])
+                if cookie is not None:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"set-cookie", cookie)
+                    ]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _commit(
+        self,
+        token: Optional[str],
+        stored: Optional[StoredSession],
+        initial: dict[str, Any],
+        session: dict[str, Any],
+    ) -> Optional[bytes]:
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=SESSION_MAX_AGE)
+        if session == initial:
+            if stored is None:
+                # Drop a cookie whose session expired or was revoked
+                return session_cookie("", 0) if token else None
+            if (expires_at - stored.expires_at).total_seconds() < SESSION_REFRESH_INTERVAL:
+                return None
+            await self.store.touch(token_key(token), expires_at)
+            return session_cookie(token, SESSION_MAX_AGE)
+
+        if stored is not None:
+            await self.store.delete(token_key(token))
+        if not session:
+            return session_cookie("", 0)
+        # A fresh token on every change, so one seen before login is useless after it
+        token = secrets.token_urlsafe(32)
+        await self.store.save(token_key(token), session, expires_at)
+        return session_cookie(token, SESSION_MAX_AGE)
@@ -0,0 +1,79 @@
+"""The one Jinja2 environment every router renders with.
+
+Compiled templates are kept in memory and, as bytecode, on disk in
+``TEMPLATE_CACHE_DIR`` (the system temp directory by default), so a new
+worker loads them instead of parsing the sources again. Templates are only
+re-read from disk when they change if ``TEMPLATE_AUTO_RELOAD=1``, which is
+meant for development. ``install_bytecode_cache`` attaches the on-disk
+cache at startup (creating it touches the file system, so importing this
+module doesn't), and ``precompile_templates`` then compiles them all up front.
+"""
+import os
+import time
+from typing import Any
+
+from fastapi.responses import HTMLResponse
+from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template
+
+from assets import static_url
+from db import env_flag
+from metrics import record_template
+
+TEMPLATE_DIR = "templates"
+TEMPLATE_AUTO_RELOAD = env_flag("TEMPLATE_AUTO_RELOAD", False)
+TEMPLATE_PRECOMPILE = env_flag("TEMPLATE_PRECOMPILE", True)
+TEMPLATE_BYTECODE_CACHE = env_flag("TEMPLATE_BYTECODE_CACHE", True)
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR") or None
+
+
+class TimedTemplate(Template):
+    def render(self, *args, **kwargs) -> str:
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            record_template(time.perf_counter() - started)
+
+
+env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=True,
+    auto_reload=TEMPLATE_AUTO_RELOAD,
+    # Every template stays compiled; the default of 400 would be plenty too
+    cache_size=-1,
+)
+env.template_class = TimedTemplate
+env.globals["static_url"] = static_url
+templates = Jinja2Templates(env=env)
+
+
+def install_bytecode_cache() -> None:
+    if not TEMPLATE_BYTECODE_CACHE or env.bytecode_cache is not None:
+        return
+    if TEMPLATE_CACHE_DIR is not None:
+        os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+    # Creates the default directory under the system temp directory
+    env.bytecode_cache = FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+
+
+def precompile_templates() -> int:
+    """Compile every template now rather than on its first request."""
+    names = env.list_templates(extensions=["html"])
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+
+def render_fragment(name: str, block: str, context: dict[str, Any]) -> str:
+    """Render one ``{% block %}`` of a template, without the rest of the page."""
+    started = time.perf_counter()
+    try:
+        template = env.get_template(name)
+        return "".join(template.blocks[block](template.new_context(context)))
+    finally:
+        record_template(time.perf_counter() - started)
+
+
+def fragment_response(name: str, block: str, context: dict[str, Any]) -> HTMLResponse:
+    return HTMLResponse(render_fragment(name, block, context))
@@ -0,0 +1,45 @@
+"""Shared fixtures.
+
+The app reads its settings at import, so the test database (a throwaway
+SQLite file) and settings are fixed here, before any test imports it.
+"""
+import os
+import shutil
+import tempfile
+
+TEST_DIR = tempfile.mkdtemp(prefix="charity-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEST_DIR, 'app.db')}"
+os.environ["MIGRATE_ON_STARTUP"] = "0"
+os.environ["RATE_LIMIT_ENABLED"] = "0"
+os.environ["ANALYTICS_COMPACTOR"] = "0"
+os.environ["BCRYPT_ROUNDS"] = "4"
+
+import pytest
+from sqlalchemy import delete
+
+from db import Base, SessionLocal, engine
+from migrations import migrate
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    migrate(engine)
+    yield
+    engine.dispose()
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    yield session
+    session.close()
+    # Every test starts from empty tables
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(delete(table))
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
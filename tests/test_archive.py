@@ -0,0 +1,149 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, select, text
+
+from archive import archive_closed, comment_source, donation_source
+from models import ArchivedComment, ArchivedDonation, CharityCampaign, Comment, Donation, User
+
+
+def make_campaign(db, user, status="open", closed_days_ago=None):
+    now = datetime.utcnow()
+    campaign = CharityCampaign(
+        title="Wells",
+        description="Clean water",
+        created_by_id=user.id,
+        status=status,
+        closed_at=now - timedelta(days=closed_days_ago) if closed_days_ago is not None else None,
+    )
+    db.add(campaign)
+    db.flush()
+    return campaign
+
+
+def add_rows(db, user, campaign, count):
+    for i in range(count):
+        db.add(Donation(user_id=user.id, campaign_id=campaign.id, amount=i + 1))
+        db.add(Comment(user_id=user.id, campaign_id=campaign.id, content=f"comment {i}"))
+    db.flush()
+
+
+def make_user(db):
+    user = User(email="donor@example.com", hashed_password="x", role="user")
+    db.add(user)
+    db.flush()
+    return user
+
+
+def test_archive_moves_rows_of_long_closed_campaigns(db):
+    user = make_user(db)
+    old = make_campaign(db, user, "closed", closed_days_ago=100)
+    recent = make_campaign(db, user, "closed", closed_days_ago=1)
+    active = make_campaign(db, user)
+    for campaign in (old, recent, active):
+        add_rows(db, user, campaign, 3)
+    db.commit()
+
+    report = archive_closed(db, after_days=90)
+
+    assert (report.campaigns, report.donations, report.comments) == (1, 3, 3)
+    assert db.scalar(select(func.count()).where(Donation.campaign_id == old.id)) == 0
+    assert db.scalar(select(func.count()).where(ArchivedDonation.campaign_id == old.id)) == 3
+    assert db.scalar(select(func.count()).where(ArchivedComment.campaign_id == old.id)) == 3
+    assert db.scalar(select(func.count()).select_from(Donation)) == 6
+    db.refresh(old)
+    assert old.archived_at is not None
+    assert archive_closed(db, after_days=90).campaigns == 0
+
+
+def test_union_sources_read_both_tables(db):
+    user = make_user(db)
+    closed = make_campaign(db, user, "closed", closed_days_ago=100)
+    add_rows(db, user, closed, 2)
+    db.commit()
+    before = db.execute(select(Donation.id, Donation.amount).order_by(Donation.id)).all()
+    archive_closed(db, after_days=0)
+
+    donations = donation_source(include_archived=True)
+    assert db.execute(select(donations.c.id, donations.c.amount).order_by(donations.c.id)).all() == before
+    assert db.scalar(select(func.count()).select_from(donation_source(include_archived=False))) == 0
+    comments = comment_source(include_archived=True)
+    assert db.scalar(select(func.count()).where(comments.c.campaign_id == closed.id)) == 2
+
+
+def test_ids_are_not_reused_after_archiving(db):
+    user = make_user(db)
+    closed = make_campaign(db, user, "closed", closed_days_ago=100)
+    active = make_campaign(db, user)
+    add_rows(db, user, closed, 2)
+    add_rows(db, user, active, 1)
+    db.commit()
+    archive_closed(db, after_days=0)
+    archived_ids = set(db.scalars(select(ArchivedComment.id))) | set(db.scalars(select(ArchivedDonation.id)))
+
+    # Delete the newest hot rows, then write new ones
+    newest_comment = db.scalar(select(Comment).where(Comment.campaign_id == active.id))
+    newest_donation = db.scalar(select(Donation).where(Donation.campaign_id == active.id))
+    db.delete(newest_comment)
+    db.delete(newest_donation)
+    db.commit()
+    add_rows(db, user, active, 1)
+    db.commit()
+
+    comment = db.scalar(select(Comment).where(Comment.campaign_id == active.id))
+    donation = db.scalar(select(Donation).where(Donation.campaign_id == active.id))
+    assert comment.id > newest_comment.id and comment.id not in archived_ids
+    assert donation.id > newest_donation.id and donation.id not in archived_ids
+
+    # Archiving them later does not collide
+    active.status = "closed"
+    active.closed_at = datetime.utcnow()
+    db.commit()
+    assert archive_closed(db, after_days=0).comments == 1
+
+
+def test_rebuilt_comments_stay_searchable(db):
+    user = make_user(db)
+    campaign = make_campaign(db, user)
+    db.add(Comment(user_id=user.id, campaign_id=campaign.id, content="lovely boreholes"))
+    db.commit()
+    matches = db.scalars(text("SELECT rowid FROM comments_fts WHERE comments_fts MATCH 'borehole'")).all()
+    assert matches == list(db.scalars(select(Comment.id)))
+
+
+def test_row_written_during_a_batch_is_not_lost(db, monkeypatch):
+    user = make_user(db)
+    closed = make_campaign(db, user, "closed", closed_days_ago=100)
+    add_rows(db, user, closed, 3)
+    db.commit()
+    # Leave a gap inside the batch's id range
+    first, gap, last = db.scalars(select(Donation.id).order_by(Donation.id)).all()
+    db.execute(delete(Donation.__table__).where(Donation.id == gap))
+    db.commit()
+
+    execute = db.execute
+    written = []
+
+    def execute_with_a_concurrent_write(statement, *args, **kwargs):
+        result = execute(statement, *args, **kwargs)
+        if not written and getattr(statement, "table", None) is ArchivedDonation.__table__:
+            # Another writer's row, inside the range, mid-batch
+            written.append(
+                execute(
+                    insert(Donation.__table__).values(
+                        id=gap,
+                        user_id=user.id,
+                        campaign_id=closed.id,
+                        amount=50,
+                        created_at=datetime.utcnow(),
+                    )
+                )
+            )
+        return result
+
+    monkeypatch.setattr(db, "execute", execute_with_a_concurrent_write)
+    report = archive_closed(db, after_days=0)
+
+    assert written
+    assert report.donations == 3
+    assert sorted(db.scalars(select(ArchivedDonation.id))) == [first, gap, last]
+    assert db.scalar(select(ArchivedDonation.amount).where(ArchivedDonation.id == gap)) == 50
@@ -0,0 +1,36 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import update
+
+from auth import load_principal, require_admin, user_cache
+from db import AsyncSessionLocal, async_engine
+from models import User
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def session():
+    async with AsyncSessionLocal() as session:
+        yield session
+    await async_engine.dispose()
+    # User ids are reused once the tables are emptied
+    user_cache.clear()
+
+
+async def test_demoted_admin_is_refused_despite_cached_role(db, session):
+    admin = User(email="admin@example.com", hashed_password="x", role="admin")
+    db.add(admin)
+    db.commit()
+    cached = await load_principal(session, admin.id)
+    assert (await require_admin(cached, session)).role == "admin"
+
+    # As another worker would: the change never reaches this worker's cache
+    db.execute(update(User).where(User.id == admin.id).values(role="user"))
+    db.commit()
+    assert (await load_principal(session, admin.id)).role == "admin"
+
+    with pytest.raises(HTTPException) as refused:
+        await require_admin(cached, session)
+    assert refused.value.status_code == 403
+    assert (await load_principal(session, admin.id)).role == "user"
@@ -0,0 +1,91 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+import main
+import routes.bulk
+from auth import user_cache
+from models import CharityCampaign, Donation, User
+
+
+@pytest.fixture
+def admin(db):
+    client = TestClient(main.app)
+    # The first user to register is an admin
+    response = client.post("/register", data={"email": "admin@example.com", "password": "pw123456"})
+    assert response.status_code == 200
+    yield client
+    client.close()
+    user_cache.clear()
+
+
+@pytest.fixture
+def campaign_id(db, admin):
+    admin_id = db.scalar(select(User.id))
+    campaign = CharityCampaign(title="Wells", description="", created_by_id=admin_id, status="open")
+    db.add(campaign)
+    db.commit()
+    return campaign.id
+
+
+def import_donations(client, body: str, filename: str = "donations.csv"):
+    response = client.post("/admin/import/donations", files={"file": (filename, body, "text/csv")})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_conflicting_key_fails_only_its_row(db, admin, campaign_id, monkeypatch):
+    record_donations = routes.bulk.record_donations
+
+    async def racing_record_donations(session, donations, require_open=True):
+        # Another request commits key "raced" after the import's key check
+        if any(donation.idempotency_key == "raced" for donation in donations):
+            raise IntegrityError("INSERT INTO donations", {}, Exception("UNIQUE constraint failed"))
+        return await record_donations(session, donations, require_open=require_open)
+
+    monkeypatch.setattr(routes.bulk, "record_donations", racing_record_donations)
+    report = import_donations(
+        admin,
+        "campaign_id,user_email,amount,idempotency_key\n"
+        f"{campaign_id},admin@example.com,5,first\n"
+        f"{campaign_id},admin@example.com,6,raced\n"
+        f"{campaign_id},admin@example.com,7,\n",
+    )
+
+    assert (report["inserted"], report["duplicates"], report["failed"]) == (2, 1, 0)
+    assert db.scalar(select(func.sum(Donation.amount))) == 12
+
+
+def test_bad_lines_are_reported_and_the_rest_imported(db, admin, campaign_id):
+    body = (
+        f"campaign_id,user_email,amount\n{campaign_id},admin@example.com,5\n".encode()
+        # Latin-1, not UTF-8
+        + f"{campaign_id},admin\xe9@example.com,6\n".encode("latin-1")
+        # Over the csv module's field size limit
+        + f'{campaign_id},"{"x" * 200_000}",7\n'.encode()
+        + f"{campaign_id},admin@example.com,8\n".encode()
+    )
+    response = admin.post("/admin/import/donations", files={"file": ("donations.csv", body, "text/csv")})
+
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert report["inserted"] == 2
+    assert [error["line"] for error in report["errors"]] == [3, 4]
+    assert report["errors"][0]["error"] == "Not valid UTF-8."
+    assert report["errors"][1]["error"].startswith("Invalid CSV")
+
+
+def test_ndjson_line_that_is_not_utf8_fails_only_itself(db, admin, campaign_id):
+    body = (
+        f'{{"campaign_id": {campaign_id}, "user_email": "admin@example.com", "amount": 5}}\n'.encode()
+        + b'{"campaign_id": 1, "user_email": "\xff", "amount": 6}\n'
+        + f'{{"campaign_id": {campaign_id}, "user_email": "admin@example.com", "amount": 7}}\n'.encode()
+    )
+    response = admin.post(
+        "/admin/import/donations", files={"file": ("donations.ndjson", body, "application/x-ndjson")}
+    )
+
+    assert response.status_code == 200, response.text
+    assert response.json()["inserted"] == 2
+    assert response.json()["errors"] == [{"line": 2, "error": "Not valid UTF-8."}]
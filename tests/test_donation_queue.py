@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+import donation_queue
+from db import async_engine
+from donation_queue import DonationWriter
+from models import CharityCampaign, Donation, User
+from totals import DUPLICATE, RECORDED, UNAVAILABLE, NewDonation
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def campaigns(db):
+    user = User(email="donor@example.com", hashed_password="x", role="user")
+    db.add(user)
+    db.flush()
+    open_campaign = CharityCampaign(title="Open", description="", created_by_id=user.id, status="open")
+    closed_campaign = CharityCampaign(title="Closed", description="", created_by_id=user.id, status="closed")
+    db.add_all([open_campaign, closed_campaign])
+    db.commit()
+    return user.id, open_campaign.id, closed_campaign.id
+
+
+@pytest.fixture
+async def writer():
+    writer = DonationWriter(batch_size=50, batch_wait=0.05, queue_limit=100)
+    yield writer
+    await writer.drain()
+    await async_engine.dispose()
+
+
+async def submit_together(writer, donations):
+    # Submitted within one batch window, so they are flushed together
+    return await asyncio.gather(*(writer.submit(donation) for donation in donations))
+
+
+def totals(db, campaign_id):
+    db.expire_all()
+    campaign = db.get(CharityCampaign, campaign_id)
+    return campaign.total_amount, campaign.donor_count
+
+
+async def test_batch_outcomes(db, campaigns, writer):
+    user_id, open_id, closed_id = campaigns
+    outcomes = await submit_together(
+        writer,
+        [
+            NewDonation(user_id, open_id, 5, idempotency_key="a"),
+            NewDonation(user_id, open_id, 5, idempotency_key="a"),
+            NewDonation(user_id, open_id, 7),
+            NewDonation(user_id, closed_id, 9),
+        ],
+    )
+
+    assert outcomes == [RECORDED, DUPLICATE, RECORDED, UNAVAILABLE]
+    assert totals(db, open_id) == (12, 1)
+    assert totals(db, closed_id) == (0, 0)
+
+
+async def test_unique_key_conflict_fails_only_the_conflicting_donation(db, campaigns, writer, monkeypatch):
+    user_id, open_id, _ = campaigns
+    record_donations = donation_queue.record_donations
+
+    async def racing_record_donations(session, donations):
+        # Another worker commits a retry with key "raced" after the key check
+        if any(donation.idempotency_key == "raced" for donation in donations):
+            raise IntegrityError("INSERT INTO donations", {}, Exception("UNIQUE constraint failed"))
+        return await record_donations(session, donations)
+
+    monkeypatch.setattr(donation_queue, "record_donations", racing_record_donations)
+    outcomes = await submit_together(
+        writer,
+        [
+            NewDonation(user_id, open_id, 5, idempotency_key="first"),
+            NewDonation(user_id, open_id, 6, idempotency_key="raced"),
+            NewDonation(user_id, open_id, 7),
+        ],
+    )
+
+    assert outcomes == [RECORDED, DUPLICATE, RECORDED]
+    assert db.scalar(select(func.count()).select_from(Donation)) == 2
+    assert totals(db, open_id) == (12, 1)
+
+
+async def test_failed_batch_answers_busy(db, campaigns, writer, monkeypatch):
+    user_id, open_id, _ = campaigns
+
+    async def failing_record_donations(session, donations):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(donation_queue, "record_donations", failing_record_donations)
+    results = await asyncio.gather(
+        writer.submit(NewDonation(user_id, open_id, 5)),
+        writer.submit(NewDonation(user_id, open_id, 6)),
+        return_exceptions=True,
+    )
+
+    assert [result.status_code for result in results] == [503, 503]
+    assert totals(db, open_id) == (0, 0)
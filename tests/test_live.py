@@ -0,0 +1,99 @@
+import orjson
+import pytest
+
+from db import async_engine
+from live import LiveHub, live_hub
+from models import CharityCampaign, Comment, User
+from routes.live import event_stream
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def campaign(db):
+    user = User(email="viewer@example.com", hashed_password="x", role="user")
+    db.add(user)
+    db.flush()
+    campaign = CharityCampaign(title="Wells", description="", created_by_id=user.id, status="open")
+    db.add(campaign)
+    db.commit()
+    return campaign
+
+
+@pytest.fixture
+async def hub():
+    # Pushes are driven by the tests, not the background task
+    hub = LiveHub(push_interval=3600, resync_interval=3600, max_subscribers=10)
+    yield hub
+    await hub.close()
+    await async_engine.dispose()
+
+
+def post_comments(db, campaign, count):
+    comments = [Comment(user_id=campaign.created_by_id, campaign_id=campaign.id, content="hi") for _ in range(count)]
+    db.add_all(comments)
+    db.commit()
+    return [comment.id for comment in comments]
+
+
+def received_comment_ids(subscriber) -> list[int]:
+    ids = []
+    while not subscriber.queue.empty():
+        for event in subscriber.queue.get_nowait().split(b"\n\n"):
+            if event.startswith(b"event: comment\n"):
+                ids.append(orjson.loads(event.split(b"data: ", 1)[1])["id"])
+    return ids
+
+
+async def test_each_viewer_gets_only_comments_it_lacks(db, campaign, hub):
+    first, second, third = post_comments(db, campaign, 3)
+    fresh = hub.subscribe(campaign, third)
+    # Rendered from the page cache before the last two comments
+    cached = hub.subscribe(campaign, first)
+    await hub._push({campaign.id})
+
+    assert received_comment_ids(fresh) == []
+    assert received_comment_ids(cached) == [second, third]
+
+    [fourth] = post_comments(db, campaign, 1)
+    hub.notify(campaign.id)
+    await hub._push({campaign.id})
+
+    assert received_comment_ids(fresh) == [fourth]
+    assert received_comment_ids(cached) == [fourth]
+
+
+async def test_viewer_ahead_of_the_feed_is_not_resent_its_comments(db, campaign, hub):
+    [first] = post_comments(db, campaign, 1)
+    earlier = hub.subscribe(campaign, first)
+    second, third = post_comments(db, campaign, 2)
+    # Its page already shows both new comments, which were never pushed
+    later = hub.subscribe(campaign, third)
+    await hub._push({campaign.id})
+
+    assert received_comment_ids(earlier) == [second, third]
+    assert received_comment_ids(later) == []
+
+
+async def test_unsubscribe_releases_the_feed(campaign, hub):
+    subscriber = hub.subscribe(campaign, 0)
+    assert hub.subscriber_count == 1
+    hub.unsubscribe(subscriber)
+    hub.unsubscribe(subscriber)
+    assert hub.subscriber_count == 0
+    hub.notify(campaign.id)
+    assert not hub._dirty
+
+
+async def test_stream_subscribes_only_while_it_runs(campaign):
+    stream = event_stream(campaign, 0)
+    # A client gone before the body starts never runs the stream
+    assert live_hub.subscriber_count == 0
+    try:
+        await stream.__anext__()
+        await stream.__anext__()  # the initial totals
+        assert live_hub.subscriber_count == 1
+    finally:
+        await stream.aclose()
+        await live_hub.close()
+    assert live_hub.subscriber_count == 0
@@ -0,0 +1,123 @@
+import importlib
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, inspect, select, text
+
+import models  # noqa: F401  registers the tables on Base.metadata
+from db import Base
+from migrations import discover, migrate
+
+# Not described by the models
+UNMODELLED_TABLES = {"schema_migrations", "sqlite_sequence"}
+FTS_TABLE_PREFIXES = ("campaigns_fts", "comments_fts")
+
+
+def schema_of(engine) -> dict:
+    inspector = inspect(engine)
+    with engine.connect() as conn:
+        autoincrement = set(
+            conn.scalars(text("SELECT name FROM sqlite_master WHERE type = 'table' AND sql LIKE '%AUTOINCREMENT%'"))
+        )
+    schema = {}
+    for table in inspector.get_table_names():
+        if table in UNMODELLED_TABLES or table.startswith(FTS_TABLE_PREFIXES):
+            continue
+        schema[table] = {
+            "columns": {
+                column["name"]: (str(column["type"]), column["nullable"], column["default"])
+                for column in inspector.get_columns(table)
+            },
+            "primary_key": inspector.get_pk_constraint(table)["constrained_columns"],
+            "autoincrement": table in autoincrement,
+            "indexes": {
+                index["name"]: (tuple(index["column_names"]), bool(index["unique"]))
+                for index in inspector.get_indexes(table)
+            },
+        }
+    return schema
+
+
+@pytest.fixture
+def make_engine(tmp_path):
+    engines = []
+
+    def make(name: str):
+        engine = create_engine(f"sqlite:///{tmp_path / name}")
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.dispose()
+
+
+def test_empty_database_matches_models(make_engine):
+    migrated = make_engine("migrated.db")
+    migrate(migrated)
+    expected = make_engine("expected.db")
+    Base.metadata.create_all(expected)
+
+    assert schema_of(migrated) == schema_of(expected)
+
+
+def test_each_migration_has_work_on_an_empty_database(make_engine):
+    # Later migrations must not find their changes already made by earlier
+    # ones, as happens when they read definitions from the current models.
+    engine = make_engine("steps.db")
+    before = schema_of(engine)
+    for migration in discover():
+        with engine.begin() as conn:
+            migration.module.upgrade(conn)
+        after = schema_of(engine)
+        if migration.name != "0006_full_text_search":
+            assert after != before, migration.name
+        before = after
+
+
+def test_create_all_era_database_is_upgraded(make_engine):
+    engine = make_engine("old.db")
+    # As created by create_all before migrations existed
+    base = importlib.import_module("migrations.0001_base_tables")
+    base.metadata.create_all(engine)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, email, hashed_password, role) VALUES (1, 'a@a', 'x', 'admin')"))
+        conn.execute(
+            text(
+                "INSERT INTO charity_campaigns (id, title, description, created_at, created_by_id, status) "
+                "VALUES (1, 'Wells', 'Water', :now, 1, 'closed'), (2, 'Books', 'Read', :now, 1, 'open')"
+            ),
+            {"now": now},
+        )
+        conn.execute(
+            text(
+                "INSERT INTO donations (user_id, campaign_id, amount, created_at) "
+                "VALUES (1, 1, 5, :now), (1, 1, 7, :now)"
+            ),
+            {"now": now},
+        )
+
+    migrate(engine)
+
+    expected = make_engine("expected.db")
+    Base.metadata.create_all(expected)
+    assert schema_of(engine) == schema_of(expected)
+    with engine.connect() as conn:
+        campaigns = conn.execute(
+            text("SELECT id, total_amount, donor_count, closed_at FROM charity_campaigns ORDER BY id")
+        ).all()
+        assert [(id, total, donors) for id, total, donors, _ in campaigns] == [(1, 12, 1), (2, 0, 0)]
+        assert campaigns[0].closed_at is not None and campaigns[1].closed_at is None
+        assert conn.scalar(text("SELECT SUM(amount) FROM donations")) == 12
+        matches = conn.scalars(text("SELECT rowid FROM campaigns_fts WHERE campaigns_fts MATCH 'wells'"))
+        assert list(matches) == [1]
+
+
+def test_migrate_is_idempotent(make_engine):
+    engine = make_engine("twice.db")
+    assert [migration.name for migration in migrate(engine)] == [migration.name for migration in discover()]
+    assert migrate(engine) == []
+    with engine.connect() as conn:
+        assert conn.scalar(text("SELECT COUNT(*) FROM replication_heartbeat")) == 1
+        assert conn.scalar(select(text("COUNT(*)")).select_from(text("schema_migrations"))) == len(discover())
@@ -0,0 +1,95 @@
+import os
+import sqlite3
+import time
+
+import anyio
+import pytest
+from fastapi.testclient import TestClient
+import main
+import replicas
+from db import async_engine, engine
+from models import CharityCampaign, ReplicationHeartbeat, User
+from replicas import REPLICA_MAX_LAG_SECONDS, REPLICA_PIN_COOKIE, ReplicaSet
+
+
+def copy_primary(db, beat_at: float) -> str:
+    """Stamp the heartbeat and copy the primary to a ``.backup`` file; nothing
+    replicates into the copy afterwards."""
+    db.merge(ReplicationHeartbeat(id=1, beat_at=beat_at))
+    db.commit()
+    path = f"{engine.url.database}.backup"
+    primary, backup = sqlite3.connect(engine.url.database), sqlite3.connect(path)
+    primary.backup(backup)
+    primary.close()
+    backup.close()
+    return path
+
+
+@pytest.fixture
+def replica_copy(db, monkeypatch):
+    paths = []
+
+    def make(beat_at: float) -> ReplicaSet:
+        paths.append(copy_primary(db, beat_at))
+        replica_set = ReplicaSet([f"sqlite:///{paths[-1]}"])
+        monkeypatch.setattr(replicas, "replica_set", replica_set)
+        # create_app adds ReadYourWritesMiddleware only with replicas configured
+        monkeypatch.setattr(main, "replica_set", replica_set)
+        anyio.run(replica_set.check)
+        return replica_set
+
+    yield make
+    anyio.run(replicas.replica_set.dispose)
+    anyio.run(async_engine.dispose)
+    for path in paths:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+@pytest.fixture
+def campaign_id(db):
+    user = User(email="owner@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    campaign = CharityCampaign(title="Wells", description="", created_by_id=user.id, status="open")
+    db.add(campaign)
+    db.commit()
+    return campaign.id
+
+
+def rename(db, campaign_id: int, title: str) -> None:
+    db.get(CharityCampaign, campaign_id).title = title
+    db.commit()
+
+
+def campaign_title(client, campaign_id: int) -> str:
+    response = client.get(f"/api/v1/campaigns/{campaign_id}", params={"fields": "title"})
+    assert response.status_code == 200, response.text
+    return response.json()["title"]
+
+
+def test_reads_use_the_replica_until_a_write_pins_the_client(db, campaign_id, replica_copy):
+    replica_set = replica_copy(time.time())
+    assert replica_set.healthy_count == 1
+    # Only the primary sees this
+    rename(db, campaign_id, "Wells (primary)")
+
+    client = TestClient(main.create_app())
+    assert campaign_title(client, campaign_id) == "Wells"
+
+    response = client.post("/logout", follow_redirects=False)
+    assert response.status_code < 400
+    assert float(response.cookies[REPLICA_PIN_COOKIE]) > time.time()
+
+    assert campaign_title(client, campaign_id) == "Wells (primary)"
+
+
+def test_stale_heartbeat_ejects_the_replica(db, campaign_id, replica_copy):
+    replica_set = replica_copy(time.time() - REPLICA_MAX_LAG_SECONDS - 60)
+    assert replica_set.healthy_count == 0
+    assert replica_set.replicas[0].error.startswith("lagging")
+    rename(db, campaign_id, "Wells (primary)")
+
+    client = TestClient(main.create_app())
+    assert campaign_title(client, campaign_id) == "Wells (primary)"
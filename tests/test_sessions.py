@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from fastapi.testclient import TestClient
+from starlette.responses import PlainTextResponse
+
+from sessions import SESSION_COOKIE, MemorySessionStore, ServerSessionMiddleware, SessionStore
+
+
+def test_store_missing_a_method_fails_when_created():
+    class IncompleteStore(SessionStore):
+        async def load(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        IncompleteStore()
+
+
+@pytest.mark.anyio
+async def test_memory_store_round_trip():
+    store = MemorySessionStore(max_entries=2)
+    expires_at = datetime.utcnow() + timedelta(hours=1)
+    await store.save("a", {"user_id": 1}, expires_at)
+    await store.save("b", {"user_id": 1}, expires_at)
+    assert (await store.load("a")).data == {"user_id": 1}
+    assert await store.delete_user(1) == 2
+    assert await store.load("a") is None
+
+
+@pytest.mark.anyio
+async def test_memory_store_touch_keeps_a_session_from_eviction():
+    store = MemorySessionStore(max_entries=2)
+    expires_at = datetime.utcnow() + timedelta(hours=1)
+    await store.save("a", {"user_id": 1}, expires_at)
+    await store.save("b", {"user_id": 2}, expires_at)
+    await store.touch("a", expires_at + timedelta(hours=1))
+    await store.save("c", {"user_id": 3}, expires_at)
+    assert await store.load("a") is not None
+    assert await store.load("b") is None
+
+
+def test_static_files_skip_the_store():
+    class CountingStore(MemorySessionStore):
+        loads = 0
+
+        async def load(self, key):
+            self.loads += 1
+            return await super().load(key)
+
+    async def app(scope, receive, send):
+        await PlainTextResponse("ok")(scope, receive, send)
+
+    store = CountingStore(max_entries=10)
+    client = TestClient(ServerSessionMiddleware(app, store=store), cookies={SESSION_COOKIE: "token"})
+    client.get("/static/css/app.css")
+    assert store.loads == 0
+    client.get("/campaigns")
+    assert store.loads == 1
@@ -0,0 +1,12 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importing_the_app_touches_no_files(tmp_path):
+    # gunicorn imports the app once in the master, before forking workers
+    env = dict(os.environ, TMPDIR=str(tmp_path), DATABASE_URL=f"sqlite:///{tmp_path / 'app.db'}")
+    subprocess.run([sys.executable, "-c", "import main"], cwd=ROOT, env=env, check=True)
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+from db import AsyncSessionLocal, async_engine
+from models import CharityCampaign, User
+from totals import NewDonation, find_drift, record_donations
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def campaign(db):
+    user = User(email="donor@example.com", hashed_password="x", role="user")
+    db.add(user)
+    db.flush()
+    campaign = CharityCampaign(title="Wells", description="", created_by_id=user.id, status="open")
+    db.add(campaign)
+    db.commit()
+    yield campaign
+    db.expire_all()
+
+
+@pytest.fixture
+async def sessions():
+    async with AsyncSessionLocal() as first, AsyncSessionLocal() as second:
+        yield first, second
+    await async_engine.dispose()
+
+
+async def test_concurrent_first_donations_count_the_donor_once(db, campaign, sessions):
+    first, second = sessions
+    donation = NewDonation(campaign.created_by_id, campaign.id, 5)
+    await record_donations(first, [donation])
+
+    async def record_and_commit():
+        await record_donations(second, [donation])
+        await second.commit()
+
+    # The second writer checks for known donors while the first is uncommitted
+    racing = asyncio.create_task(record_and_commit())
+    await asyncio.sleep(0.2)
+    await first.commit()
+    await racing
+
+    db.refresh(campaign)
+    assert (campaign.total_amount, campaign.donor_count) == (10, 1)
+    assert find_drift(db) == []
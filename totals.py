@@ -0,0 +1,233 @@
+"""Running per-campaign donation totals.
+
+``CharityCampaign.total_amount`` and ``CharityCampaign.donor_count`` are kept
+in step with the ``donations`` ledger by ``record_donations``, which inserts
+the donations and bumps the totals in the caller's transaction. The ledger
+stays the source of truth, together with the donations archive.py has moved
+out of it; run this module to compare the stored totals against both:
+
+    python totals.py verify     # report drift, exit 1 if any
+    python totals.py rebuild    # report drift and overwrite stored totals
+"""
+import argparse
+import sys
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import bindparam, func, insert, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from archive import donation_source
+from db import SessionLocal
+from models import ArchivedDonation, CharityCampaign, Donation
+
+
+@dataclass
+class Drift:
+    campaign_id: int
+    stored_total: int
+    actual_total: int
+    stored_donors: int
+    actual_donors: int
+
+
+# Outcomes of record_donations, one per submitted donation
+RECORDED = "recorded"
+DUPLICATE = "duplicate"  # idempotency key already used by this user
+UNAVAILABLE = "unavailable"  # campaign missing or not open
+
+
+@dataclass
+class NewDonation:
+    user_id: int
+    campaign_id: int
+    amount: int
+    idempotency_key: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+
+
+async def record_donations(
+    db: AsyncSession, donations: list[NewDonation], require_open: bool = True
+) -> list[str]:
+    # require_open=False lets imports of historic donations target closed
+    # campaigns; missing campaigns are always unavailable.
+    campaign_ids = {d.campaign_id for d in donations}
+    campaigns = CharityCampaign.__table__
+    # Writers to the same campaigns take turns from here to commit, so the
+    # known-donor check below sees every donation committed before it and a
+    # donor's first two donations can't both count them as new.
+    if db.bind.dialect.name == "sqlite":
+        # No row locks; this no-op write takes SQLite's single write lock
+        # now rather than at the insert
+        await db.execute(
+            update(campaigns).where(campaigns.c.id.in_(campaign_ids)).values(id=campaigns.c.id)
+        )
+    available = (
+        select(CharityCampaign.id, CharityCampaign.archived_at)
+        .where(CharityCampaign.id.in_(campaign_ids))
+        # Fixed lock order across concurrent writers
+        .order_by(CharityCampaign.id)
+        .with_for_update()
+    )
+    if require_open:
+        available = available.where(CharityCampaign.status == "open")
+    available_rows = (await db.execute(available)).all()
+    available_ids = {row.id for row in available_rows}
+    archived_ids = {row.id for row in available_rows if row.archived_at is not None}
+
+    keys = {(d.user_id, d.idempotency_key) for d in donations if d.idempotency_key}
+    seen_keys = set()
+    if keys:
+        seen_keys = set(
+            (await db.execute(
+                select(Donation.user_id, Donation.idempotency_key).where(
+                    tuple_(Donation.user_id, Donation.idempotency_key).in_(keys)
+                )
+            )).all()
+        )
+
+    outcomes = []
+    accepted = []
+    for donation in donations:
+        key = (donation.user_id, donation.idempotency_key)
+        if donation.campaign_id not in available_ids:
+            outcomes.append(UNAVAILABLE)
+        elif donation.idempotency_key and key in seen_keys:
+            outcomes.append(DUPLICATE)
+        else:
+            seen_keys.add(key)
+            accepted.append(donation)
+            outcomes.append(RECORDED)
+    if not accepted:
+        return outcomes
+
+    pairs = {(d.campaign_id, d.user_id) for d in accepted}
+    known_donors = set(
+        (await db.execute(
+            select(Donation.campaign_id, Donation.user_id)
+            .where(tuple_(Donation.campaign_id, Donation.user_id).in_(pairs))
+            .distinct()
+        )).all()
+    )
+    archived_pairs = {pair for pair in pairs if pair[0] in archived_ids}
+    if archived_pairs:
+        # Reopened or imported into after archive.py moved earlier donations
+        known_donors |= set(
+            (await db.execute(
+                select(ArchivedDonation.campaign_id, ArchivedDonation.user_id)
+                .where(tuple_(ArchivedDonation.campaign_id, ArchivedDonation.user_id).in_(archived_pairs))
+                .distinct()
+            )).all()
+        )
+
+    await db.execute(
+        insert(Donation),
+        [
+            {
+                "user_id": d.user_id,
+                "campaign_id": d.campaign_id,
+                "amount": d.amount,
+                "idempotency_key": d.idempotency_key,
+                "created_at": d.created_at,
+            }
+            for d in accepted
+        ],
+    )
+
+    added_total = defaultdict(int)
+    added_donors = defaultdict(int)
+    for d in accepted:
+        added_total[d.campaign_id] += d.amount
+    for campaign_id, user_id in pairs - known_donors:
+        added_donors[campaign_id] += 1
+    # One UPDATE per campaign with column arithmetic, so concurrent writers
+    # never overwrite each other's increments.
+    await db.execute(
+        update(campaigns)
+        .where(campaigns.c.id == bindparam("campaign_id"))
+        .values(
+            total_amount=campaigns.c.total_amount + bindparam("added_total"),
+            donor_count=campaigns.c.donor_count + bindparam("added_donors"),
+        ),
+        [
+            {
+                "campaign_id": campaign_id,
+                "added_total": total,
+                "added_donors": added_donors[campaign_id],
+            }
+            # Fixed lock order across concurrent writers
+            for campaign_id, total in sorted(added_total.items())
+        ],
+    )
+    return outcomes
+
+
+def find_drift(db: Session) -> list[Drift]:
+    donations = donation_source(include_archived=True)
+    ledger = (
+        db.query(
+            donations.c.campaign_id,
+            func.sum(donations.c.amount).label("total"),
+            func.count(func.distinct(donations.c.user_id)).label("donors"),
+        )
+        .group_by(donations.c.campaign_id)
+        .subquery()
+    )
+    rows = (
+        db.query(
+            CharityCampaign.id,
+            CharityCampaign.total_amount,
+            func.coalesce(ledger.c.total, 0),
+            CharityCampaign.donor_count,
+            func.coalesce(ledger.c.donors, 0),
+        )
+        .outerjoin(ledger, ledger.c.campaign_id == CharityCampaign.id)
+        .order_by(CharityCampaign.id)
+        .all()
+    )
+    return [
+        Drift(cid, stored_total, actual_total, stored_donors, actual_donors)
+        for cid, stored_total, actual_total, stored_donors, actual_donors in rows
+        if stored_total != actual_total or stored_donors != actual_donors
+    ]
+
+
+def rebuild_totals(db: Session) -> list[Drift]:
+    drift = find_drift(db)
+    for d in drift:
+        db.query(CharityCampaign).filter(CharityCampaign.id == d.campaign_id).update(
+            {
+                CharityCampaign.total_amount: d.actual_total,
+                CharityCampaign.donor_count: d.actual_donors,
+            },
+            synchronize_session=False,
+        )
+    db.commit()
+    return drift
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Verify or rebuild campaign donation totals.")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        drift = rebuild_totals(db) if args.command == "rebuild" else find_drift(db)
+    finally:
+        db.close()
+
+    for d in drift:
+        print(
+            f"campaign {d.campaign_id}: total {d.stored_total} -> {d.actual_total}, "
+            f"donors {d.stored_donors} -> {d.actual_donors}"
+        )
+    print(f"{len(drift)} campaign(s) with drift" + (" fixed." if args.command == "rebuild" and drift else "."))
+    return 1 if drift and args.command == "verify" else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())